@@ -0,0 +1,223 @@
+"""
+Benchmarks de baixar_livros, consultar_livros, registrar_livros e
+baixar_e_registrar_livros contra o
+ServidorDeBusca local. Mede vazão, percentis de latência e pico de memória
+e grava os resultados em JSON, para comparar execuções.
+Uso, a partir da raiz do repositório:
+
+    python -m benchmarks.bench_livros --paginas 200 --latencia 0.01 --saida atual.json
+    python -m benchmarks.bench_livros --paginas 200 --latencia 0.01 --comparar anterior.json
+"""
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+from benchmarks.servidor import ServidorDeBusca
+from colecao import livros
+from colecao.base_sqlite import BaseSQLite
+from colecao.conexoes import PoolDeConexoes
+from colecao.tentativas import PoliticaDeTentativas
+
+CENARIOS = ('baixar_livros', 'consultar_livros', 'registrar_livros', 'baixar_e_registrar_livros')
+
+
+class Cronometro:
+    """
+    Envolve uma função guardando a latência de cada chamada
+    """
+
+    def __init__(self, funcao):
+        self._funcao = funcao
+        self.latencias = []
+
+    def __call__(self, *args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return self._funcao(*args, **kwargs)
+        finally:
+            self.latencias.append(time.perf_counter() - inicio)
+
+
+def percentis(latencias):
+    # latências em milissegundos
+    if not latencias:
+        return {}
+    ordenadas = sorted(latencias)
+
+    def percentil(fracao):
+        return round(ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * fracao))] * 1000, 3)
+
+    return {'p50': percentil(0.5), 'p90': percentil(0.9), 'p95': percentil(0.95),
+            'p99': percentil(0.99), 'max': round(ordenadas[-1] * 1000, 3)}
+
+
+def baixar(diretorio, argumentos):
+    arquivos = [f'{diretorio}/pagina{pagina}.json' for pagina in range(1, argumentos.paginas + 1)]
+    cronometro = Cronometro(livros.executar_requisicao)
+    with patch.object(livros, 'executar_requisicao', cronometro):
+        livros.baixar_livros(arquivos, livre='python', max_workers=argumentos.workers)
+    return len(cronometro.latencias), cronometro.latencias
+
+
+def consultar(diretorio, argumentos):
+    cronometro = Cronometro(livros.consultar_livros)
+    for indice in range(argumentos.consultas):
+        cronometro(f'Autor {indice % argumentos.autores}')
+    return argumentos.consultas, cronometro.latencias
+
+
+def registrar(diretorio, argumentos):
+    arquivos = [f'{diretorio}/pagina{pagina}.json' for pagina in range(1, argumentos.paginas + 1)]
+    instantes = [time.perf_counter()]
+    base = None
+    if argumentos.sqlite:
+        # uma base nova a cada execução do cenário
+        base = BaseSQLite(f'{diretorio}/livros-{time.perf_counter_ns()}.db')
+
+    def inserir_registros(documentos):
+        quantidade = base.inserir_registros(documentos) if base is not None else len(documentos)
+        instantes.append(time.perf_counter())
+        return quantidade
+
+    try:
+        quantidade = livros.registrar_livros(arquivos, inserir_registros, processos=argumentos.processos)
+    finally:
+        if base is not None:
+            base.fechar()
+    # intervalo entre inserções: leitura, interpretação e inserção de cada arquivo
+    return quantidade, [fim - inicio for inicio, fim in zip(instantes, instantes[1:])]
+
+
+def baixar_e_registrar(diretorio, argumentos):
+    cronometro = Cronometro(livros.executar_requisicao)
+    with patch.object(livros, 'executar_requisicao', cronometro):
+        quantidade = livros.baixar_e_registrar_livros(lambda documentos: len(documentos), livre='python',
+                                                      trabalhadores={'requisicao': argumentos.workers or 1})
+    return quantidade, cronometro.latencias
+
+
+def executar_cenario(cenario, diretorio, argumentos):
+    funcao = {'baixar_livros': baixar, 'consultar_livros': consultar, 'registrar_livros': registrar,
+              'baixar_e_registrar_livros': baixar_e_registrar}[cenario]
+    inicio = time.perf_counter()
+    quantidade, latencias = funcao(diretorio, argumentos)
+    duracao = time.perf_counter() - inicio
+    resultado = {
+        'quantidade': quantidade,
+        'duracao': round(duracao, 4),
+        'por_segundo': round(quantidade / duracao, 2) if duracao else None,
+        'latencia_ms': percentis(latencias),
+    }
+    if argumentos.memoria:
+        # uma segunda execução, pois o tracemalloc deixa o código bem mais lento
+        tracemalloc.start()
+        try:
+            funcao(diretorio, argumentos)
+            resultado['memoria_pico_bytes'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return resultado
+
+
+def executar(argumentos):
+    servidor = ServidorDeBusca(
+        num_docs=argumentos.paginas * argumentos.documentos_por_pagina,
+        documentos_por_pagina=argumentos.documentos_por_pagina,
+        latencia=argumentos.latencia,
+        taxa_de_erro=argumentos.taxa_de_erro,
+        autores=argumentos.autores,
+    )
+    cenarios = {}
+    with servidor, tempfile.TemporaryDirectory() as diretorio, \
+            patch.object(livros.Consulta, 'url', servidor.url), \
+            patch.object(livros, 'URL_BUSCADOR', servidor.url), \
+            patch.object(livros.Resposta, 'quantidade_documentos_por_pagina', argumentos.documentos_por_pagina):
+        pool = PoolDeConexoes(tamanho_maximo=argumentos.workers or 1) if argumentos.pool else None
+        livros.configurar_pool_de_conexoes(pool)
+        if argumentos.tentativas:
+            livros.configurar_tentativas(PoliticaDeTentativas(tentativas=argumentos.tentativas, espera_base=0.01))
+        try:
+            # registrar_livros lê os arquivos gravados por baixar_livros
+            for cenario in CENARIOS:
+                if cenario in argumentos.cenarios:
+                    cenarios[cenario] = executar_cenario(cenario, diretorio, argumentos)
+        finally:
+            livros.configurar_pool_de_conexoes(None)
+            livros.configurar_tentativas(None)
+            if pool is not None:
+                pool.fechar()
+
+    return {
+        'data': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'parametros': {
+            chave: valor for chave, valor in vars(argumentos).items() if chave not in ('saida', 'comparar')
+        },
+        'cenarios': cenarios,
+    }
+
+
+def comparar(atual, anterior, tolerancia):
+    """
+    Imprime a vazão de cada cenário nas duas execuções e
+    retorna os cenários que ficaram mais lentos que a tolerância
+    """
+    regressoes = []
+    for cenario, resultado in atual['cenarios'].items():
+        referencia = anterior.get('cenarios', {}).get(cenario)
+        if not referencia or not referencia.get('por_segundo') or not resultado.get('por_segundo'):
+            continue
+        razao = resultado['por_segundo'] / referencia['por_segundo']
+        print(f'{cenario}: {referencia["por_segundo"]} -> {resultado["por_segundo"]} por segundo ({razao:.2f}x)')
+        if razao < 1 - tolerancia:
+            regressoes.append(cenario)
+    return regressoes
+
+
+def criar_parser():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--paginas', type=int, default=100)
+    parser.add_argument('--documentos-por-pagina', type=int, default=50)
+    parser.add_argument('--latencia', type=float, default=0.0, help='segundos por resposta do servidor')
+    parser.add_argument('--taxa-de-erro', type=float, default=0.0, help='fração de respostas 503')
+    parser.add_argument('--autores', type=int, default=100)
+    parser.add_argument('--consultas', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=None, help='max_workers de baixar_livros')
+    parser.add_argument('--processos', type=int, default=None, help='processos de registrar_livros')
+    parser.add_argument('--pool', action='store_true', help='usa PoolDeConexoes')
+    parser.add_argument('--sqlite', action='store_true', help='registrar_livros insere em uma BaseSQLite')
+    parser.add_argument('--tentativas', type=int, default=0, help='repete páginas com erros transitórios')
+    parser.add_argument('--sem-memoria', dest='memoria', action='store_false', help='não mede o pico de memória')
+    parser.add_argument('--cenarios', nargs='+', choices=CENARIOS, default=list(CENARIOS))
+    parser.add_argument('--saida', help='arquivo JSON com os resultados')
+    parser.add_argument('--comparar', help='resultados anteriores, para detectar regressões')
+    parser.add_argument('--tolerancia', type=float, default=0.1, help='perda de vazão aceita ao comparar')
+    return parser
+
+
+def main(argv=None):
+    argumentos = criar_parser().parse_args(argv)
+    resultados = executar(argumentos)
+    texto = json.dumps(resultados, indent=2, ensure_ascii=False)
+    if argumentos.saida:
+        with open(argumentos.saida, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(texto)
+    else:
+        print(texto)
+    if argumentos.comparar:
+        with open(argumentos.comparar, encoding='utf-8') as arquivo:
+            regressoes = comparar(resultados, json.load(arquivo), argumentos.tolerancia)
+        if regressoes:
+            print(f'Regressões: {", ".join(regressoes)}')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,118 @@
+"""
+Servidor HTTP local que imita o buscador de livros, para os benchmarks.
+Responde qualquer GET com uma página sintética {"num_docs", "docs"},
+usando o parâmetro page da url
+"""
+import gzip
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from math import ceil
+from urllib.parse import parse_qs, urlsplit
+
+
+class ServidorDeBusca:
+    """
+    - num_docs: total de documentos de cada consulta
+    - documentos_por_pagina: documentos em cada página
+    - latencia: segundos de espera antes de cada resposta
+    - taxa_de_erro: fração das respostas que retornam 503
+    - autores: quantidade de autores distintos nos documentos gerados
+    - comprimir: responde em gzip quando o cliente aceita (Accept-Encoding)
+    """
+
+    def __init__(self, num_docs=1000, documentos_por_pagina=50, latencia=0.0, taxa_de_erro=0.0,
+                 autores=100, semente=0, comprimir=True):
+        self.num_docs = num_docs
+        self.documentos_por_pagina = documentos_por_pagina
+        self.latencia = latencia
+        self.taxa_de_erro = taxa_de_erro
+        self.autores = autores
+        self.comprimir = comprimir
+        # bytes de corpo enviados, para comparar com e sem compressão
+        self.bytes_enviados = 0
+        self._aleatorio = random.Random(semente)
+        self._lock = threading.Lock()
+        self.requisicoes = 0
+        self._servidor = ThreadingHTTPServer(('127.0.0.1', 0), self._criar_tratador())
+        self._servidor.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, porta = self._servidor.server_address
+        return f'http://{host}:{porta}/'
+
+    @property
+    def total_de_paginas(self):
+        return ceil(self.num_docs / self.documentos_por_pagina)
+
+    def pagina(self, numero):
+        inicio = (numero - 1) * self.documentos_por_pagina
+        fim = min(self.num_docs, inicio + self.documentos_por_pagina)
+        return {
+            'num_docs': self.num_docs,
+            'docs': [
+                {'author': f'Autor {indice % self.autores}', 'title': f'Livro {indice}'}
+                for indice in range(inicio, fim)
+            ],
+        }
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self._servidor.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+        return self
+
+    def parar(self):
+        self._servidor.shutdown()
+        self._servidor.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.parar()
+
+    def _sortear_erro(self):
+        with self._lock:
+            self.requisicoes += 1
+            return self._aleatorio.random() < self.taxa_de_erro
+
+    def _criar_tratador(self):
+        servidor = self
+
+        class Tratador(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # cabeçalhos e corpo saem juntos, sem o atraso de Nagle nas conexões keep-alive
+            wbufsize = -1
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                if servidor.latencia:
+                    time.sleep(servidor.latencia)
+                if servidor._sortear_erro():
+                    self._responder(503, b'')
+                    return
+                parametros = parse_qs(urlsplit(self.path).query)
+                numero = int(parametros.get('page', ['1'])[0])
+                self._responder(200, json.dumps(servidor.pagina(numero)).encode('utf-8'))
+
+            def _responder(self, status, corpo):
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                if corpo and servidor.comprimir and 'gzip' in self.headers.get('Accept-Encoding', ''):
+                    corpo = gzip.compress(corpo, compresslevel=6)
+                    self.send_header('Content-Encoding', 'gzip')
+                self.send_header('Content-Length', str(len(corpo)))
+                self.end_headers()
+                self.wfile.write(corpo)
+                with servidor._lock:
+                    servidor.bytes_enviados += len(corpo)
+
+            def log_message(self, formato, *args):
+                pass
+
+        return Tratador
@@ -0,0 +1,96 @@
+import json
+import sqlite3
+import threading
+
+from colecao.livros import Livro
+
+# chave natural usada no upsert
+CHAVE_NATURAL = ('author', 'title')
+
+
+class BaseSQLite:
+    """
+    Base SQLite local para registrar_livros: inserir_registros grava cada lote
+    com executemany em uma transação explícita e retorna a quantidade de registros gravados.
+    - synchronous e cache_kib: pragmas do SQLite; com WAL, NORMAL não perde
+      consistência, só as últimas transações em caso de queda do sistema
+    - upsert: com a chave natural (autor e título), um documento repetido
+      atualiza o registro existente em vez de criar outro
+    """
+
+    def __init__(self, caminho, tabela='livros', upsert=False, synchronous='NORMAL', cache_kib=64 * 1024,
+                 wal=True):
+        if not tabela.isidentifier():
+            raise ValueError(f'Nome de tabela inválido: {tabela}')
+        if synchronous.upper() not in ('OFF', 'NORMAL', 'FULL', 'EXTRA'):
+            raise ValueError(f'Valor inválido de synchronous: {synchronous}')
+        self.tabela = tabela
+        self.upsert = upsert
+        # isolation_level=None: as transações são abertas e fechadas explicitamente
+        self._conexao = sqlite3.connect(caminho, isolation_level=None, check_same_thread=False)
+        # a mesma base pode receber lotes de várias threads (ver baixar_e_registrar_livros)
+        self._lock = threading.Lock()
+        if wal:
+            self._conexao.execute('PRAGMA journal_mode=WAL')
+        self._conexao.execute(f'PRAGMA synchronous={synchronous}')
+        self._conexao.execute(f'PRAGMA cache_size={-int(cache_kib)}')
+        self._conexao.execute('PRAGMA temp_store=MEMORY')
+        self._conexao.execute(
+            f'CREATE TABLE IF NOT EXISTS {tabela} '
+            '(id INTEGER PRIMARY KEY, author TEXT, title TEXT, extras TEXT)'
+        )
+        comando = f'INSERT INTO {tabela} (author, title, extras) VALUES (?, ?, ?)'
+        if upsert:
+            # coalesce: para o SQLite, NULL nunca é igual a NULL em um índice único;
+            # autor e título que não são texto ficam em extras e entram na chave em JSON
+            chave = ', '.join(
+                f"coalesce({campo}, json_extract(extras, '$.{campo}'), '')" for campo in CHAVE_NATURAL
+            )
+            self._conexao.execute(
+                f'CREATE UNIQUE INDEX IF NOT EXISTS {tabela}_chave_natural ON {tabela} ({chave})'
+            )
+            comando += f' ON CONFLICT ({chave}) DO UPDATE SET extras = excluded.extras'
+
+        self._comando = comando
+
+    def inserir_registros(self, documentos):
+        linhas = [_linha(documento) for documento in documentos]
+        with self._lock:
+            self._conexao.execute('BEGIN')
+            try:
+                cursor = self._conexao.executemany(self._comando, linhas)
+            except BaseException:
+                self._conexao.execute('ROLLBACK')
+                raise
+            self._conexao.execute('COMMIT')
+        return cursor.rowcount
+
+    def quantidade(self):
+        with self._lock:
+            return self._conexao.execute(f'SELECT count(*) FROM {self.tabela}').fetchone()[0]
+
+    def livros(self, autor=None):
+        comando = f'SELECT author, title, extras FROM {self.tabela}'
+        parametros = ()
+        if autor is not None:
+            comando += ' WHERE author = ?'
+            parametros = (autor,)
+        with self._lock:
+            linhas = self._conexao.execute(comando + ' ORDER BY id', parametros).fetchall()
+        return [Livro.de_colunas(author, title, json.loads(extras) if extras else None)
+                for author, title, extras in linhas]
+
+    def fechar(self):
+        self._conexao.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.fechar()
+
+
+def _linha(documento):
+    # autor e título que não são texto (listas de autores) vão intactos para os extras
+    autor, titulo, extras = Livro.colunas_de_texto(documento)
+    return autor, titulo, json.dumps(extras, ensure_ascii=False) if extras else None
@@ -0,0 +1,201 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class CacheEmDisco:
+    """
+    Cache de respostas em disco, indexado pela url completa da página:
+    - diretorio: onde as entradas são gravadas
+    - ttl: validade padrão de cada entrada, em segundos
+    - limite_bytes: espaço total; ao ultrapassá-lo, as entradas
+      usadas há mais tempo são removidas (LRU)
+    """
+    sufixo = '.cache'
+
+    def __init__(self, diretorio, ttl=3600, limite_bytes=256 * 1024 * 1024):
+        self._diretorio = diretorio
+        self._ttl = ttl
+        self._limite_bytes = limite_bytes
+        # chave -> tamanho em bytes, da entrada usada há mais tempo para a mais recente
+        self._entradas = OrderedDict()
+        self._total_bytes = 0
+        self._acertos = 0
+        self._falhas = 0
+        self._remocoes = 0
+        self._lock = threading.Lock()
+        os.makedirs(diretorio, exist_ok=True)
+        self._carregar_indice()
+
+    @property
+    def estatisticas(self):
+        with self._lock:
+            return {
+                'acertos': self._acertos,
+                'falhas': self._falhas,
+                'remocoes': self._remocoes,
+                'entradas': len(self._entradas),
+                'bytes': self._total_bytes,
+            }
+
+    def obter(self, url):
+        """
+        Retorna o conteúdo guardado para url ou None se não houver entrada válida
+        """
+        chave = self._chave(url)
+        with self._lock:
+            existe = chave in self._entradas
+        conteudo = None
+        if existe:
+            try:
+                with open(self._caminho(chave), 'rb') as arquivo:
+                    expira_em = float(arquivo.readline())
+                    if expira_em > time.time():
+                        conteudo = arquivo.read().decode('utf-8')
+            except (OSError, ValueError):
+                pass
+
+        with self._lock:
+            if conteudo is None:
+                self._falhas += 1
+                if existe:
+                    self._remover(chave)
+                return None
+            self._acertos += 1
+            if chave in self._entradas:
+                self._entradas.move_to_end(chave)
+        # o mtime guarda a ordem LRU entre execuções
+        try:
+            os.utime(self._caminho(chave))
+        except OSError:
+            pass
+        return conteudo
+
+    def guardar(self, url, conteudo, ttl=None):
+        chave = self._chave(url)
+        expira_em = time.time() + (self._ttl if ttl is None else ttl)
+        dados = f'{expira_em}\n'.encode('ascii') + conteudo.encode('utf-8')
+        if len(dados) > self._limite_bytes:
+            return
+        caminho = self._caminho(chave)
+        temporario = f'{caminho}.{threading.get_ident()}.tmp'
+        with open(temporario, 'wb') as arquivo:
+            arquivo.write(dados)
+        os.replace(temporario, caminho)
+
+        with self._lock:
+            self._total_bytes += len(dados) - self._entradas.pop(chave, 0)
+            self._entradas[chave] = len(dados)
+            while self._total_bytes > self._limite_bytes:
+                self._remover(next(iter(self._entradas)))
+
+    def limpar(self):
+        with self._lock:
+            for chave in list(self._entradas):
+                self._remover(chave)
+
+    def _remover(self, chave):
+        # deve ser chamado com o lock adquirido
+        self._total_bytes -= self._entradas.pop(chave, 0)
+        self._remocoes += 1
+        try:
+            os.remove(self._caminho(chave))
+        except OSError:
+            pass
+
+    def _carregar_indice(self):
+        entradas = [
+            entrada for entrada in os.scandir(self._diretorio)
+            if entrada.name.endswith(self.sufixo) and entrada.is_file()
+        ]
+        for entrada in sorted(entradas, key=lambda entrada: entrada.stat().st_mtime):
+            tamanho = entrada.stat().st_size
+            self._entradas[entrada.name[:-len(self.sufixo)]] = tamanho
+            self._total_bytes += tamanho
+
+    def _caminho(self, chave):
+        return os.path.join(self._diretorio, chave + self.sufixo)
+
+    @staticmethod
+    def _chave(url):
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+
+class CacheEmMemoria:
+    """
+    Cache LRU em memória, thread-safe, com validade (ttl) por entrada.
+    Threads que pedem a mesma chave enquanto ela está sendo calculada
+    esperam pelo mesmo cálculo, em vez de cada uma disparar o seu.
+    Resultados None não são guardados.
+    """
+
+    def __init__(self, capacidade=1024, ttl=60):
+        self._capacidade = capacidade
+        self._ttl = ttl
+        # chave -> (expira_em, valor), da entrada usada há mais tempo para a mais recente
+        self._entradas = OrderedDict()
+        # chave -> Future do cálculo em andamento
+        self._em_andamento = {}
+        self._acertos = 0
+        self._falhas = 0
+        self._agrupadas = 0
+        self._remocoes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def estatisticas(self):
+        with self._lock:
+            return {
+                'acertos': self._acertos,
+                'falhas': self._falhas,
+                'agrupadas': self._agrupadas,
+                'remocoes': self._remocoes,
+                'entradas': len(self._entradas),
+            }
+
+    def obter_ou_calcular(self, chave, calcular):
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is not None:
+                expira_em, valor = entrada
+                if expira_em > time.monotonic():
+                    self._acertos += 1
+                    self._entradas.move_to_end(chave)
+                    return valor
+                del self._entradas[chave]
+                self._remocoes += 1
+
+            futuro = self._em_andamento.get(chave)
+            responsavel = futuro is None
+            if responsavel:
+                self._falhas += 1
+                futuro = self._em_andamento[chave] = Future()
+            else:
+                self._agrupadas += 1
+        if not responsavel:
+            return futuro.result()
+
+        try:
+            valor = calcular()
+        except BaseException as error:
+            with self._lock:
+                del self._em_andamento[chave]
+            futuro.set_exception(error)
+            raise
+
+        with self._lock:
+            del self._em_andamento[chave]
+            if valor is not None:
+                self._entradas[chave] = (time.monotonic() + self._ttl, valor)
+                while len(self._entradas) > self._capacidade:
+                    self._entradas.popitem(last=False)
+                    self._remocoes += 1
+        futuro.set_result(valor)
+        return valor
+
+    def limpar(self):
+        with self._lock:
+            self._entradas.clear()
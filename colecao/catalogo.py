@@ -0,0 +1,233 @@
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from colecao.livros import Livro, registrar_livros
+
+# identificação e versão do formato
+ASSINATURA = b'CLIV'
+VERSAO = 1
+# assinatura, versão, colunas do dicionário, registros
+CABECALHO = struct.Struct('<4sHHQ')
+# cada seção: tamanho em bytes, seguido dos dados alinhados a 8 bytes
+TAMANHO_SECAO = struct.Struct('<Q')
+# colunas com dicionário; os demais campos vão, em JSON, na coluna extras
+COLUNAS = ('author', 'title')
+# código de registro sem valor na coluna
+SEM_VALOR = 0xFFFFFFFF
+
+
+class EscritorDeCatalogo:
+    """
+    Monta um catálogo colunar: author e title codificados por dicionário
+    (um código por registro) e os demais campos em JSON, todos com arrays
+    de deslocamentos. inserir_registros pode ser passado a registrar_livros
+    """
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._dicionarios = {coluna: {} for coluna in COLUNAS}
+        self._codigos = {coluna: array('I') for coluna in COLUNAS}
+        self._extras = bytearray()
+        self._fim_dos_extras = array('Q', [0])
+
+    def __len__(self):
+        return len(self._fim_dos_extras) - 1
+
+    def adicionar(self, documentos):
+        codificar = self._codificar
+        colunas_de_texto = Livro.colunas_de_texto
+        codigos_de_autor = self._codigos['author'].append
+        codigos_de_titulo = self._codigos['title'].append
+        fins = self._fim_dos_extras
+        quantidade = 0
+        for documento in documentos:
+            autor, titulo, extras = colunas_de_texto(documento)
+            codigos_de_autor(codificar('author', autor))
+            codigos_de_titulo(codificar('title', titulo))
+            if extras:
+                self._extras += json.dumps(extras, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+            fins.append(len(self._extras))
+            quantidade += 1
+        return quantidade
+
+    inserir_registros = adicionar
+
+    def _codificar(self, coluna, valor):
+        if valor is None:
+            return SEM_VALOR
+        dicionario = self._dicionarios[coluna]
+        codigo = dicionario.get(valor)
+        if codigo is None:
+            codigo = dicionario[valor] = len(dicionario)
+        return codigo
+
+    def salvar(self):
+        secoes = []
+        for coluna in COLUNAS:
+            valores = [valor.encode('utf-8') for valor in self._dicionarios[coluna]]
+            fins = array('Q', [0])
+            total = 0
+            for valor in valores:
+                total += len(valor)
+                fins.append(total)
+            secoes.extend((_little_endian(fins), b''.join(valores), _little_endian(self._codigos[coluna])))
+        secoes.extend((_little_endian(self._fim_dos_extras), bytes(self._extras)))
+
+        temporario = f'{self.caminho}.tmp'
+        with open(temporario, 'wb') as arquivo:
+            arquivo.write(CABECALHO.pack(ASSINATURA, VERSAO, len(COLUNAS), len(self)))
+            for secao in secoes:
+                arquivo.write(TAMANHO_SECAO.pack(len(secao)))
+                arquivo.write(secao)
+                arquivo.write(b'\0' * (-len(secao) % 8))
+        os.replace(temporario, self.caminho)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.salvar()
+
+
+class LeitorDeCatalogo:
+    """
+    Lê um catálogo gravado por EscritorDeCatalogo com mmap: as colunas de códigos
+    e deslocamentos são vistas diretamente sobre o arquivo, sem cópia, e os
+    registros só viram Livro quando acessados
+    """
+
+    def __init__(self, caminho):
+        with open(caminho, 'rb') as arquivo:
+            self._mapa = mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ)
+        dados = memoryview(self._mapa)
+        # vistas sobre o mapa, liberadas em fechar
+        self._vistas = [dados]
+        assinatura, versao, colunas, self._quantidade = CABECALHO.unpack_from(dados)
+        if assinatura != ASSINATURA or versao != VERSAO or colunas != len(COLUNAS):
+            self.fechar()
+            raise ValueError(f'{caminho} não é um catálogo na versão {VERSAO}')
+        secoes = []
+        posicao = CABECALHO.size
+        while posicao < len(dados):
+            tamanho, = TAMANHO_SECAO.unpack_from(dados, posicao)
+            posicao += TAMANHO_SECAO.size
+            secoes.append(self._vista(dados[posicao:posicao + tamanho]))
+            posicao += tamanho + (-tamanho % 8)
+        self._dicionarios = {}
+        self._valores = {}
+        self._codigos = {}
+        for indice, coluna in enumerate(COLUNAS):
+            fins, valores, codigos = secoes[3 * indice:3 * indice + 3]
+            self._dicionarios[coluna] = (self._vista(_como_array(fins, 'Q')), valores)
+            self._codigos[coluna] = self._vista(_como_array(codigos, 'I'))
+        self._fim_dos_extras = self._vista(_como_array(secoes[-2], 'Q'))
+        self._extras = secoes[-1]
+
+    def _vista(self, vista):
+        if isinstance(vista, memoryview):
+            self._vistas.append(vista)
+        return vista
+
+    def __len__(self):
+        return self._quantidade
+
+    def valores(self, coluna):
+        """
+        Valores distintos da coluna, na ordem dos códigos
+        """
+        valores = self._valores.get(coluna)
+        if valores is None:
+            fins, dados = self._dicionarios[coluna]
+            valores = self._valores[coluna] = [
+                sys.intern(str(dados[inicio:fim], 'utf-8')) for inicio, fim in zip(fins, fins[1:])
+            ]
+        return valores
+
+    def codigos(self, coluna):
+        # código de cada registro na coluna, SEM_VALOR quando não há valor
+        return self._codigos[coluna]
+
+    def valor(self, coluna, indice):
+        codigo = self._codigos[coluna][indice]
+        if codigo == SEM_VALOR:
+            # valores que não são texto ficam nos extras
+            return (self.extras(indice) or {}).get(coluna)
+        fins, dados = self._dicionarios[coluna]
+        return str(dados[fins[codigo]:fins[codigo + 1]], 'utf-8')
+
+    def extras(self, indice):
+        inicio, fim = self._fim_dos_extras[indice], self._fim_dos_extras[indice + 1]
+        return json.loads(bytes(self._extras[inicio:fim])) if fim > inicio else None
+
+    def indices_de(self, coluna, valor):
+        """
+        Posições dos registros com o valor na coluna, sem decodificar os registros
+        """
+        try:
+            codigo = self.valores(coluna).index(valor)
+        except ValueError:
+            return []
+        return [indice for indice, atual in enumerate(self._codigos[coluna]) if atual == codigo]
+
+    def __getitem__(self, indice):
+        if not -self._quantidade <= indice < self._quantidade:
+            raise IndexError(indice)
+        indice %= self._quantidade
+        return Livro.de_colunas(self.valor('author', indice), self.valor('title', indice), self.extras(indice))
+
+    def __iter__(self):
+        autores = self.valores('author') + [None]
+        titulos = self.valores('title') + [None]
+        # SEM_VALOR é trocado pelo índice do None acrescentado acima
+        sem_autor, sem_titulo = len(autores) - 1, len(titulos) - 1
+        codigos_de_autor = self._codigos['author']
+        codigos_de_titulo = self._codigos['title']
+        for indice in range(self._quantidade):
+            autor = codigos_de_autor[indice]
+            titulo = codigos_de_titulo[indice]
+            yield Livro.de_colunas(autores[sem_autor if autor == SEM_VALOR else autor],
+                                   titulos[sem_titulo if titulo == SEM_VALOR else titulo],
+                                   self.extras(indice))
+
+    def fechar(self):
+        self._dicionarios = self._codigos = self._fim_dos_extras = self._extras = None
+        for vista in reversed(self._vistas):
+            vista.release()
+        self._vistas = []
+        self._mapa.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.fechar()
+
+
+def exportar_catalogo(arquivos, caminho, formato='json'):
+    """
+    Grava em um catálogo os documentos das páginas baixadas (ver registrar_livros);
+    retorna a quantidade de registros
+    """
+    with EscritorDeCatalogo(caminho) as catalogo:
+        return registrar_livros(arquivos, catalogo.inserir_registros, formato=formato)
+
+
+def _little_endian(valores):
+    if sys.byteorder == 'big':
+        valores = array(valores.typecode, valores)
+        valores.byteswap()
+    return valores.tobytes()
+
+
+def _como_array(dados, tipo):
+    # vista sem cópia; em máquinas big-endian, uma cópia com os bytes invertidos
+    if sys.byteorder == 'big':
+        valores = array(tipo, dados.tobytes())
+        valores.byteswap()
+        return valores
+    return dados.cast(tipo)
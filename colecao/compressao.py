@@ -0,0 +1,158 @@
+import zlib
+
+# valor do cabeçalho Accept-Encoding das requisições
+ACEITAR_CODIFICACAO = 'gzip, deflate'
+# maior corpo aceito, já descomprimido
+TAMANHO_MAXIMO_CORPO = 64 * 1024 * 1024
+# bytes lidos da resposta por vez
+TAMANHO_BLOCO = 64 * 1024
+# páginas JSON costumam comprimir de 5 a 10 vezes; usado para estimar o buffer
+FATOR_DE_COMPRESSAO = 8
+
+
+class CorpoInvalido(ValueError):
+    """
+    Corpo com codificação desconhecida ou dados comprimidos corrompidos
+    """
+
+
+class CorpoMuitoGrande(CorpoInvalido):
+    """
+    Corpo maior que o tamanho máximo permitido
+    """
+
+
+class LeitorDeCorpo:
+    """
+    Junta o corpo de uma resposta HTTP em um bytearray pré-alocado,
+    descomprimindo gzip ou deflate (Content-Encoding) à medida que os blocos chegam.
+    - tamanho_maximo: limite do corpo descomprimido; acima dele, CorpoMuitoGrande
+    - tamanho_declarado: Content-Length, usado para dimensionar o buffer
+    """
+
+    def __init__(self, codificacao=None, tamanho_maximo=TAMANHO_MAXIMO_CORPO, tamanho_declarado=None):
+        self._codificacao = (codificacao or 'identity').strip().lower()
+        if self._codificacao not in ('identity', 'gzip', 'x-gzip', 'deflate'):
+            raise CorpoInvalido(f'Codificação não suportada: {codificacao}')
+        self._tamanho_maximo = tamanho_maximo
+        self._tamanho_declarado = tamanho_declarado
+        if self._codificacao == 'identity':
+            self._descompressor = None
+            if tamanho_declarado and tamanho_maximo and tamanho_declarado > tamanho_maximo:
+                raise CorpoMuitoGrande(f'Corpo de {tamanho_declarado} bytes, máximo de {tamanho_maximo}')
+            capacidade = tamanho_declarado or TAMANHO_BLOCO
+        else:
+            # deflate: o formato (zlib ou deflate puro) só é conhecido com os primeiros bytes
+            self._descompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if 'gzip' in self._codificacao else None
+            capacidade = tamanho_declarado * FATOR_DE_COMPRESSAO if tamanho_declarado else TAMANHO_BLOCO
+        if tamanho_maximo:
+            capacidade = min(capacidade, tamanho_maximo)
+        self._buffer = bytearray(capacidade)
+        self._tamanho = 0
+        self._inicio = b''
+
+    def escrever(self, bloco):
+        if self._codificacao == 'identity':
+            self._guardar(bloco)
+            return
+        if self._descompressor is None:
+            self._inicio += bloco
+            if len(self._inicio) < 2:
+                return
+            bloco, self._inicio = self._inicio, b''
+            self._descompressor = zlib.decompressobj(zlib.MAX_WBITS if _tem_cabecalho_zlib(bloco) else -zlib.MAX_WBITS)
+        try:
+            while bloco:
+                # max_length evita que um corpo muito comprimido seja expandido inteiro antes da verificação
+                limite = self._tamanho_maximo - self._tamanho + 1 if self._tamanho_maximo else 0
+                self._guardar(self._descompressor.decompress(bloco, limite))
+                bloco = self._descompressor.unconsumed_tail
+        except zlib.error as error:
+            raise CorpoInvalido(f'Corpo {self._codificacao} inválido: {error}') from error
+
+    def ler_de(self, resposta, tamanho_bloco=TAMANHO_BLOCO):
+        """
+        Lê a resposta (objeto com read ou readinto) até o fim e retorna o corpo
+        """
+        if self._codificacao == 'identity' and hasattr(resposta, 'readinto'):
+            # sem compressão, os bytes são lidos direto no buffer, sem cópias intermediárias
+            while True:
+                if self._tamanho == len(self._buffer):
+                    if self._tamanho_declarado is not None and self._tamanho >= self._tamanho_declarado:
+                        # Content-Length atingido: não é preciso aumentar o buffer só para ver o fim
+                        break
+                    self._crescer(self._tamanho + tamanho_bloco)
+                with memoryview(self._buffer) as vista, vista[self._tamanho:] as livre:
+                    lidos = resposta.readinto(livre)
+                if not lidos:
+                    break
+                self._tamanho += lidos
+                self._verificar_tamanho(self._tamanho)
+        else:
+            while True:
+                bloco = resposta.read(tamanho_bloco)
+                if not bloco:
+                    break
+                self.escrever(bloco)
+        return self.resultado()
+
+    def resultado(self):
+        """
+        Corpo completo; o buffer é reduzido ao tamanho lido, sem cópia
+        """
+        if self._inicio:
+            # deflate com menos de 2 bytes: não há cabeçalho zlib possível
+            bloco, self._inicio = self._inicio, b''
+            self._descompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+            self.escrever(bloco)
+        if self._descompressor is not None:
+            try:
+                self._guardar(self._descompressor.flush())
+            except zlib.error as error:
+                raise CorpoInvalido(f'Corpo {self._codificacao} inválido: {error}') from error
+        del self._buffer[self._tamanho:]
+        return self._buffer
+
+    def _guardar(self, bloco):
+        fim = self._tamanho + len(bloco)
+        self._verificar_tamanho(fim)
+        if fim > len(self._buffer):
+            self._crescer(fim)
+        self._buffer[self._tamanho:fim] = bloco
+        self._tamanho = fim
+
+    def _crescer(self, minimo):
+        # cresce em blocos fixos: o bytearray já reserva espaço extra ao ser estendido,
+        # e dobrar o buffer chegaria a ocupar três vezes o tamanho do corpo
+        capacidade = max(minimo, len(self._buffer) + TAMANHO_BLOCO)
+        if self._tamanho_maximo:
+            # um byte além do máximo, para detectar o excesso
+            capacidade = max(minimo, min(capacidade, self._tamanho_maximo + 1))
+        self._buffer.extend(bytes(capacidade - len(self._buffer)))
+
+    def _verificar_tamanho(self, tamanho):
+        if self._tamanho_maximo and tamanho > self._tamanho_maximo:
+            raise CorpoMuitoGrande(f'Corpo com mais de {self._tamanho_maximo} bytes')
+
+
+def ler_corpo(resposta, tamanho_maximo=TAMANHO_MAXIMO_CORPO):
+    """
+    Lê o corpo de uma resposta de urlopen ou http.client conforme seus cabeçalhos
+    Content-Encoding e Content-Length
+    """
+    cabecalhos = resposta.headers
+    leitor = LeitorDeCorpo(cabecalhos.get('Content-Encoding'), tamanho_maximo,
+                           tamanho_declarado(cabecalhos))
+    return leitor.ler_de(resposta)
+
+
+def tamanho_declarado(cabecalhos):
+    try:
+        return int(cabecalhos.get('Content-Length'))
+    except (TypeError, ValueError):
+        return None
+
+
+def _tem_cabecalho_zlib(dados):
+    # CMF/FLG do RFC 1950: método 8 e os dois bytes múltiplos de 31
+    return dados[0] & 0x0F == 8 and (dados[0] << 8 | dados[1]) % 31 == 0
@@ -0,0 +1,131 @@
+import threading
+import time
+from collections import namedtuple
+from http.client import HTTPConnection, HTTPSConnection, RemoteDisconnected
+from urllib.error import HTTPError
+from urllib.parse import urljoin, urlsplit
+
+from colecao.compressao import ACEITAR_CODIFICACAO, TAMANHO_MAXIMO_CORPO, ler_corpo
+
+RespostaHTTP = namedtuple('RespostaHTTP', ['status', 'cabecalhos', 'corpo'])
+
+# erros de um socket reaproveitado que o servidor já fechou
+ERROS_DE_CONEXAO_FECHADA = (RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+# status de redirecionamento seguidos pelo pool, como faz urlopen
+REDIRECIONAMENTOS = (301, 302, 303, 307, 308)
+# o mesmo limite de urllib.request.HTTPRedirectHandler
+MAXIMO_DE_REDIRECIONAMENTOS = 10
+
+
+class PoolDeConexoes:
+    """
+    Pool de conexões HTTP/1.1 persistentes (keep-alive), separado por host:
+    - tamanho_maximo: conexões ociosas mantidas por host
+    - tempo_ocioso_maximo: segundos até uma conexão ociosa ser descartada
+    - timeout: timeout de cada conexão, em segundos
+    - tamanho_maximo_corpo: maior corpo aceito, já descomprimido
+    """
+
+    def __init__(self, tamanho_maximo=10, tempo_ocioso_maximo=30, timeout=10,
+                 tamanho_maximo_corpo=TAMANHO_MAXIMO_CORPO):
+        self._tamanho_maximo = tamanho_maximo
+        self._tamanho_maximo_corpo = tamanho_maximo_corpo
+        self._tempo_ocioso_maximo = tempo_ocioso_maximo
+        self._timeout = timeout
+        # (esquema, host, porta) -> lista de (conexao, devolvida_em)
+        self._ociosas = {}
+        self._lock = threading.Lock()
+
+    def requisitar(self, url, cabecalhos=None):
+        """
+        Executa um GET em url reaproveitando uma conexão do pool; o corpo vem
+        descomprimido (gzip/deflate). Como urlopen, segue redirecionamentos
+        (301, 302, 303, 307 e 308) e levanta HTTPError para os demais status >= 300
+        """
+        cabecalhos = {'Accept-Encoding': ACEITAR_CODIFICACAO, **(cabecalhos or {})}
+        for _ in range(MAXIMO_DE_REDIRECIONAMENTOS + 1):
+            resposta, corpo = self._executar(url, cabecalhos)
+            destino = resposta.headers.get('Location')
+            if resposta.status not in REDIRECIONAMENTOS or not destino:
+                break
+            destino = urljoin(url, destino)
+            if urlsplit(destino).scheme not in ('http', 'https'):
+                break
+            url = destino
+        else:
+            raise HTTPError(url, resposta.status, 'Redirecionamentos demais', resposta.headers, None)
+
+        if resposta.status >= 300:
+            raise HTTPError(url, resposta.status, resposta.reason, resposta.headers, None)
+        return RespostaHTTP(resposta.status, resposta.headers, corpo)
+
+    def _executar(self, url, cabecalhos):
+        partes = urlsplit(url)
+        chave = (partes.scheme, partes.hostname, partes.port)
+        caminho = partes.path or '/'
+        if partes.query:
+            caminho += '?' + partes.query
+
+        while True:
+            conexao, reaproveitada = self._obter(chave)
+            try:
+                conexao.request('GET', caminho, headers=cabecalhos)
+                resposta = conexao.getresponse()
+                corpo = ler_corpo(resposta, self._tamanho_maximo_corpo)
+            except ERROS_DE_CONEXAO_FECHADA:
+                conexao.close()
+                if reaproveitada:
+                    # o servidor fechou o socket ocioso: tenta outra conexão
+                    continue
+                raise
+            except BaseException:
+                conexao.close()
+                raise
+            break
+
+        if resposta.will_close:
+            conexao.close()
+        else:
+            self._devolver(chave, conexao)
+        return resposta, corpo
+
+    def fechar(self):
+        with self._lock:
+            ociosas, self._ociosas = self._ociosas, {}
+        for fila in ociosas.values():
+            for conexao, _ in fila:
+                conexao.close()
+
+    @property
+    def conexoes_ociosas(self):
+        with self._lock:
+            return sum(len(fila) for fila in self._ociosas.values())
+
+    def _obter(self, chave):
+        agora = time.monotonic()
+        with self._lock:
+            fila = self._ociosas.get(chave, [])
+            while fila:
+                # a conexão devolvida por último é a com menor chance de ter expirado
+                conexao, devolvida_em = fila.pop()
+                if agora - devolvida_em < self._tempo_ocioso_maximo:
+                    return conexao, True
+                conexao.close()
+
+        esquema, host, porta = chave
+        classe = HTTPSConnection if esquema == 'https' else HTTPConnection
+        return classe(host, porta, timeout=self._timeout), False
+
+    def _devolver(self, chave, conexao):
+        agora = time.monotonic()
+        descartadas = []
+        with self._lock:
+            fila = self._ociosas.setdefault(chave, [])
+            fila.append((conexao, agora))
+            while fila and (
+                    len(fila) > self._tamanho_maximo
+                    or agora - fila[0][1] >= self._tempo_ocioso_maximo
+            ):
+                descartadas.append(fila.pop(0)[0])
+        for descartada in descartadas:
+            descartada.close()
@@ -0,0 +1,138 @@
+import hashlib
+import json
+import math
+import os
+
+# campos que identificam um documento, por padrão
+CAMPOS_PADRAO = ('author', 'title')
+# bytes da impressão digital de cada documento
+TAMANHO_IMPRESSAO = 16
+
+
+class _Indice:
+    """
+    Base dos índices: calcula a impressão digital dos documentos nos campos
+    escolhidos e descarta os já vistos. Com caminho, o índice é carregado
+    do arquivo, se existir, e gravado nele por salvar()
+    """
+
+    def __init__(self, campos=CAMPOS_PADRAO, caminho=None):
+        self.campos = tuple(campos)
+        self.caminho = caminho
+        self.vistos = 0
+        self.repetidos = 0
+
+    def impressao_digital(self, documento):
+        valores = []
+        for campo in self.campos:
+            try:
+                valores.append(documento[campo])
+            except KeyError:
+                valores.append(None)
+        chave = json.dumps(valores, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.blake2b(chave.encode('utf-8'), digest_size=TAMANHO_IMPRESSAO).digest()
+
+    def novo(self, documento):
+        """
+        Registra o documento e diz se ele ainda não tinha sido visto
+        """
+        self.vistos += 1
+        if self._contem_ou_adiciona(self.impressao_digital(documento)):
+            self.repetidos += 1
+            return False
+        return True
+
+    def filtrar(self, documentos):
+        return [documento for documento in documentos if self.novo(documento)]
+
+    @property
+    def estatisticas(self):
+        return {'vistos': self.vistos, 'repetidos': self.repetidos}
+
+    def salvar(self):
+        if self.caminho is None:
+            return
+        temporario = f'{self.caminho}.tmp'
+        with open(temporario, 'wb') as arquivo:
+            self._gravar(arquivo)
+        os.replace(temporario, self.caminho)
+
+    def _carregar_se_existir(self):
+        if self.caminho is None or not os.path.exists(self.caminho):
+            return
+        with open(self.caminho, 'rb') as arquivo:
+            self._ler(arquivo)
+
+
+class IndiceExato(_Indice):
+    """
+    Conjunto das impressões digitais já vistas: sem falsos positivos,
+    mas a memória cresce com a quantidade de documentos distintos
+    """
+
+    def __init__(self, campos=CAMPOS_PADRAO, caminho=None):
+        super().__init__(campos, caminho)
+        self._impressoes = set()
+        self._carregar_se_existir()
+
+    def __len__(self):
+        return len(self._impressoes)
+
+    def _contem_ou_adiciona(self, impressao):
+        if impressao in self._impressoes:
+            return True
+        self._impressoes.add(impressao)
+        return False
+
+    def _gravar(self, arquivo):
+        arquivo.write(b''.join(self._impressoes))
+
+    def _ler(self, arquivo):
+        dados = arquivo.read()
+        self._impressoes.update(
+            dados[inicio:inicio + TAMANHO_IMPRESSAO] for inicio in range(0, len(dados), TAMANHO_IMPRESSAO)
+        )
+
+
+class FiltroDeBloom(_Indice):
+    """
+    Filtro de Bloom com memória fixa, dimensionado para a capacidade e a taxa de
+    falsos positivos informadas: um documento novo pode ser descartado como repetido
+    com essa probabilidade, mas um repetido nunca passa
+    """
+
+    def __init__(self, capacidade=1_000_000, taxa_de_falsos_positivos=0.001, campos=CAMPOS_PADRAO, caminho=None):
+        super().__init__(campos, caminho)
+        self.bits = max(8, math.ceil(-capacidade * math.log(taxa_de_falsos_positivos) / math.log(2) ** 2))
+        self.funcoes = max(1, round(self.bits / capacidade * math.log(2)))
+        self._mapa = bytearray((self.bits + 7) // 8)
+        self._carregar_se_existir()
+
+    def _posicoes(self, impressao):
+        # hashing duplo: as k posições saem das duas metades da impressão digital
+        metade = TAMANHO_IMPRESSAO // 2
+        h1 = int.from_bytes(impressao[:metade], 'little')
+        h2 = int.from_bytes(impressao[metade:], 'little') | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.funcoes)]
+
+    def _contem_ou_adiciona(self, impressao):
+        mapa = self._mapa
+        contem = True
+        for posicao in self._posicoes(impressao):
+            byte, bit = divmod(posicao, 8)
+            if not mapa[byte] & (1 << bit):
+                contem = False
+                mapa[byte] |= 1 << bit
+        return contem
+
+    def _gravar(self, arquivo):
+        cabecalho = {'bits': self.bits, 'funcoes': self.funcoes, 'campos': list(self.campos)}
+        arquivo.write(json.dumps(cabecalho).encode('utf-8') + b'\n')
+        arquivo.write(self._mapa)
+
+    def _ler(self, arquivo):
+        cabecalho = json.loads(arquivo.readline())
+        if (cabecalho['bits'], cabecalho['funcoes'], tuple(cabecalho['campos'])) != \
+                (self.bits, self.funcoes, self.campos):
+            raise ValueError(f'Filtro de Bloom em {self.caminho} foi criado com outros parâmetros')
+        arquivo.readinto(self._mapa)
@@ -0,0 +1,158 @@
+import json
+import os
+import re
+import threading
+import unicodedata
+import zlib
+from array import array
+from bisect import bisect_left
+from itertools import accumulate
+
+from colecao.livros import Resposta, ler_arquivo
+
+# campos dos documentos que entram no índice
+CAMPOS_INDEXADOS = ('author', 'title')
+PALAVRA = re.compile(r'\w+')
+
+
+def normalizar(texto):
+    """
+    Separa o texto em termos minúsculos e sem acentos: 'Introdução' -> ['introducao'].
+    Listas (autores de um livro com vários autores) dão os termos de todos os itens
+    """
+    if isinstance(texto, (list, tuple)):
+        return [termo for item in texto for termo in normalizar(item)]
+    if not isinstance(texto, str):
+        return []
+    decomposto = unicodedata.normalize('NFKD', texto)
+    sem_acentos = ''.join(caractere for caractere in decomposto if not unicodedata.combining(caractere))
+    return PALAVRA.findall(sem_acentos.casefold())
+
+
+class IndiceInvertido:
+    """
+    Índice invertido local dos documentos baixados, por termos normalizados
+    do autor e do título. Aceita novos documentos a qualquer momento e é
+    salvo em caminho, se informado, com as listas de documentos em deltas comprimidos
+    """
+
+    def __init__(self, caminho=None):
+        self.caminho = caminho
+        self.documentos = []
+        # campo -> termo -> ids dos documentos, em ordem crescente
+        self._termos = {campo: {} for campo in CAMPOS_INDEXADOS}
+        # termos ordenados de cada campo, para busca por prefixo; refeitos quando mudam
+        self._ordenados = {}
+        self._chaves = set()
+        self._lock = threading.Lock()
+        if caminho is not None and os.path.exists(caminho):
+            self._carregar()
+
+    def __len__(self):
+        return len(self.documentos)
+
+    def adicionar(self, documentos):
+        """
+        Indexa os documentos ainda não indexados (mesmo autor e título);
+        retorna quantos foram acrescentados
+        """
+        with self._lock:
+            return sum(self._adicionar(documento) for documento in documentos)
+
+    def _adicionar(self, documento):
+        chave = _chave(documento)
+        if chave in self._chaves:
+            return False
+        self._chaves.add(chave)
+        identificador = len(self.documentos)
+        self.documentos.append(documento)
+        for campo in CAMPOS_INDEXADOS:
+            termos = self._termos[campo]
+            for termo in set(normalizar(documento.get(campo))):
+                postagens = termos.get(termo)
+                if postagens is None:
+                    postagens = termos[termo] = array('I')
+                    self._ordenados.pop(campo, None)
+                postagens.append(identificador)
+        return True
+
+    def adicionar_arquivos(self, arquivos):
+        return sum(self.adicionar(Resposta(ler_arquivo(arquivo)).documentos) for arquivo in arquivos)
+
+    def buscar(self, texto, campo='author', prefixo=False):
+        """
+        Documentos cujo campo contém todos os termos do texto;
+        com prefixo=True o último termo pode ser só o começo de uma palavra
+        """
+        termos = normalizar(texto)
+        if not termos:
+            return []
+        with self._lock:
+            return self._buscar(termos, campo, prefixo)
+
+    def _buscar(self, termos, campo, prefixo):
+        conjuntos = [self._termos[campo].get(termo, ()) for termo in termos[:-1]]
+        if prefixo:
+            conjuntos.append(self._com_prefixo(campo, termos[-1]))
+        else:
+            conjuntos.append(self._termos[campo].get(termos[-1], ()))
+        conjuntos.sort(key=len)
+        encontrados = set(conjuntos[0])
+        for conjunto in conjuntos[1:]:
+            if not encontrados:
+                break
+            encontrados.intersection_update(conjunto)
+        return [self.documentos[identificador] for identificador in sorted(encontrados)]
+
+    def _com_prefixo(self, campo, prefixo):
+        ordenados = self._ordenados.get(campo)
+        if ordenados is None:
+            ordenados = self._ordenados[campo] = sorted(self._termos[campo])
+        identificadores = set()
+        posicao = bisect_left(ordenados, prefixo)
+        while posicao < len(ordenados) and ordenados[posicao].startswith(prefixo):
+            identificadores.update(self._termos[campo][ordenados[posicao]])
+            posicao += 1
+        return identificadores
+
+    def salvar(self):
+        if self.caminho is None:
+            return
+        with self._lock:
+            dados = {
+                'documentos': self.documentos,
+                'termos': {
+                    campo: {termo: _deltas(postagens) for termo, postagens in termos.items()}
+                    for campo, termos in self._termos.items()
+                },
+            }
+        temporario = f'{self.caminho}.tmp'
+        with open(temporario, 'wb') as arquivo:
+            arquivo.write(zlib.compress(json.dumps(dados, ensure_ascii=False, separators=(',', ':')).encode('utf-8')))
+        os.replace(temporario, self.caminho)
+
+    def _carregar(self):
+        with open(self.caminho, 'rb') as arquivo:
+            dados = json.loads(zlib.decompress(arquivo.read()))
+        self.documentos = dados['documentos']
+        self._chaves = {_chave(documento) for documento in self.documentos}
+        for campo, termos in dados['termos'].items():
+            self._termos[campo] = {termo: array('I', accumulate(deltas)) for termo, deltas in termos.items()}
+
+
+def _chave(documento):
+    # autor e título identificam o documento; valores que não são texto (listas) viram JSON
+    return tuple(
+        valor if valor is None or isinstance(valor, str) else json.dumps(valor, ensure_ascii=False, sort_keys=True)
+        for valor in (documento.get(campo) for campo in CAMPOS_INDEXADOS)
+    )
+
+
+def _deltas(postagens):
+    # ids crescentes viram diferenças pequenas, que comprimem melhor
+    anterior = 0
+    deltas = []
+    for identificador in postagens:
+        deltas.append(identificador - anterior)
+        anterior = identificador
+    return deltas
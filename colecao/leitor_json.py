@@ -0,0 +1,204 @@
+import codecs
+import json
+import re
+
+ESPACOS = re.compile(r'[ \t\n\r]*')
+# início de string ou delimitador de array/objeto, para pular valores sem decodificá-los
+ESTRUTURA = re.compile(r'["\[\]{}]')
+_STRING = r'"[^"\\]*(?:\\.[^"\\]*)*"'
+_SEM_ESTRUTURA = r'[^"\[\]{}]*'
+STRING = re.compile(_STRING)
+# caracteres que podem fazer parte de um número
+NUMERO = re.compile(r'[-+0-9.eE]*')
+# sequência de escalares, strings e arrays/objetos sem aninhamento, pulada de uma vez
+PLANO = re.compile(
+    rf'{_SEM_ESTRUTURA}(?:(?:{_STRING}'
+    rf'|\{{{_SEM_ESTRUTURA}(?:{_STRING}{_SEM_ESTRUTURA})*\}}'
+    rf'|\[{_SEM_ESTRUTURA}(?:{_STRING}{_SEM_ESTRUTURA})*\]){_SEM_ESTRUTURA})*'
+)
+
+
+class LeitorIncremental:
+    """
+    Percorre o objeto JSON de uma página sem decodificá-lo por inteiro.
+    A fonte pode ser str, bytes ou um arquivo aberto (modo texto ou binário);
+    bytes e arquivos são decodificados em blocos de tamanho_bloco.
+    """
+
+    def __init__(self, fonte, tamanho_bloco=64 * 1024):
+        self._decodificador = json.JSONDecoder()
+        self._tamanho_bloco = tamanho_bloco
+        self._pos = 0
+        if isinstance(fonte, str):
+            self._buffer = fonte
+            self._blocos = iter(())
+        else:
+            self._buffer = ''
+            self._blocos = self._ler_blocos(fonte)
+        self._fim = False
+
+    def documentos(self, chave='docs', cabecalho=None):
+        """
+        Gera, um a um, os elementos do array `chave` do objeto de topo.
+        Os demais campos do objeto de topo são guardados em cabecalho, se informado
+        """
+        if cabecalho is None:
+            cabecalho = {}
+        self._esperar('{')
+        if self._caractere() == '}':
+            self._pos += 1
+            return
+        while True:
+            nome = self._valor()
+            self._esperar(':')
+            if nome == chave:
+                self._esperar('[')
+                if self._caractere() == ']':
+                    self._pos += 1
+                else:
+                    while True:
+                        yield self._valor()
+                        if self._esperar(',]') == ']':
+                            break
+            else:
+                cabecalho[nome] = self._valor()
+            if self._esperar(',}') == '}':
+                return
+
+    def cabecalho(self, chave='docs', parar_nos_documentos=False):
+        """
+        Lê os campos do objeto de topo sem decodificar o array `chave`,
+        do qual só verifica se tem algum elemento. Com parar_nos_documentos,
+        os campos depois do array não são lidos. Retorna (cabecalho, ha_documentos)
+        """
+        cabecalho = {}
+        ha_documentos = False
+        self._esperar('{')
+        if self._caractere() == '}':
+            return cabecalho, ha_documentos
+        while True:
+            nome = self._valor()
+            self._esperar(':')
+            if nome == chave and self._caractere() == '[':
+                self._pos += 1
+                ha_documentos = self._caractere() != ']'
+                if parar_nos_documentos:
+                    return cabecalho, ha_documentos
+                self._pular_valor(profundidade=1)
+            else:
+                cabecalho[nome] = self._valor()
+            if self._esperar(',}') == '}':
+                return cabecalho, ha_documentos
+
+    def _pular_valor(self, profundidade=0):
+        # percorre strings e delimitadores até fechar o array ou objeto, sem montar os valores;
+        # profundidade=1 quando o delimitador de abertura já foi consumido
+        if profundidade == 0 and self._caractere() not in '[{':
+            self._valor()
+            return
+        while True:
+            self._pos = PLANO.match(self._buffer, self._pos).end()
+            encontrado = ESTRUTURA.search(self._buffer, self._pos)
+            if encontrado is None:
+                self._pos = len(self._buffer)
+                if self._fim or not self._ler_mais():
+                    raise json.JSONDecodeError('Fim inesperado do JSON', self._buffer, self._pos)
+                continue
+            self._pos = encontrado.start()
+            caractere = encontrado.group()
+            if caractere == '"':
+                string = STRING.match(self._buffer, self._pos)
+                if string is None:
+                    # a string continua no próximo bloco
+                    if self._fim or not self._ler_mais():
+                        raise json.JSONDecodeError('String não terminada', self._buffer, self._pos)
+                    continue
+                self._pos = string.end()
+            elif caractere in '[{':
+                profundidade += 1
+                self._pos += 1
+            else:
+                profundidade -= 1
+                self._pos += 1
+                if profundidade == 0:
+                    return
+
+    def _ler_blocos(self, fonte):
+        decodificar = codecs.getincrementaldecoder('utf-8')().decode
+        if isinstance(fonte, (bytes, bytearray, memoryview)):
+            dados = memoryview(fonte)
+            for inicio in range(0, len(dados), self._tamanho_bloco):
+                yield decodificar(dados[inicio:inicio + self._tamanho_bloco])
+        else:
+            while True:
+                bloco = fonte.read(self._tamanho_bloco)
+                if not bloco:
+                    break
+                yield bloco if isinstance(bloco, str) else decodificar(bloco)
+        yield decodificar(b'', final=True)
+
+    def _ler_mais(self):
+        """
+        Acrescenta um bloco ao buffer, descartando o que já foi consumido.
+        Retorna False quando a fonte termina
+        """
+        bloco = next(self._blocos, None)
+        if bloco is None:
+            self._fim = True
+            return False
+        self._buffer = self._buffer[self._pos:] + bloco
+        self._pos = 0
+        return True
+
+    def _caractere(self):
+        # próximo caractere que não é espaço, sem consumi-lo
+        while True:
+            self._pos = ESPACOS.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if self._fim or not self._ler_mais():
+                raise json.JSONDecodeError('Fim inesperado do JSON', self._buffer, self._pos)
+
+    def _esperar(self, caracteres):
+        caractere = self._caractere()
+        if caractere not in caracteres:
+            raise json.JSONDecodeError(f'Esperado um de {caracteres!r}', self._buffer, self._pos)
+        self._pos += 1
+        return caractere
+
+    def _valor(self):
+        if self._caractere() in '-0123456789':
+            # um número pode continuar no próximo bloco (depois de '.', 'e', '-' ou de um dígito):
+            # só é decodificado quando o buffer tem o caractere seguinte a ele ou a fonte acabou
+            while NUMERO.match(self._buffer, self._pos).end() == len(self._buffer):
+                if self._fim or not self._ler_mais():
+                    break
+        while True:
+            try:
+                valor, fim = self._decodificador.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if self._fim or not self._ler_mais():
+                    raise
+                continue
+            self._pos = fim
+            return valor
+
+
+def iterar_documentos(fonte, chave='docs', cabecalho=None):
+    return LeitorIncremental(fonte).documentos(chave, cabecalho)
+
+
+def ler_cabecalho(fonte, chave='docs', parar_nos_documentos=False):
+    return LeitorIncremental(fonte).cabecalho(chave, parar_nos_documentos)
+
+
+def ler_resumo(fonte, chave='docs'):
+    """
+    Retorna os campos do objeto de topo e a quantidade de documentos,
+    sem manter os documentos em memória
+    """
+    cabecalho = {}
+    quantidade = 0
+    for _ in iterar_documentos(fonte, chave, cabecalho):
+        quantidade += 1
+    return cabecalho, quantidade
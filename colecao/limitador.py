@@ -0,0 +1,153 @@
+import asyncio
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.error import HTTPError
+
+# status com que o buscador indica que estamos sendo limitados
+STATUS_DE_LIMITACAO = (429, 503)
+# intervalo para verificar de novo se há vaga, quando a concorrência está no limite
+INTERVALO_DE_ESPERA = 0.05
+
+
+class LimitadorDeTaxa:
+    """
+    Limitador compartilhado por todas as requisições ao buscador:
+    - balde de fichas (token bucket) de requisicoes_por_segundo, com rajada fichas
+    - concorrência adaptativa AIMD: taxa e concorrência crescem de forma aditiva
+      a cada resposta aceita e caem pela metade em 429/503, quando o Retry-After
+      do servidor também é respeitado
+    - tentativas: vezes que uma página limitada é pedida antes de desistir
+    """
+
+    def __init__(self, requisicoes_por_segundo=10, concorrencia_maxima=16, rajada=None, tentativas=5):
+        self._taxa_maxima = requisicoes_por_segundo
+        self._taxa = float(requisicoes_por_segundo)
+        self._capacidade = rajada or max(1, requisicoes_por_segundo)
+        self._fichas = float(self._capacidade)
+        self._concorrencia_maxima = concorrencia_maxima
+        self._concorrencia = float(concorrencia_maxima)
+        self._em_andamento = 0
+        self._pausado_ate = 0
+        self._atualizado_em = time.monotonic()
+        self._limitacoes = 0
+        self._condicao = threading.Condition()
+        self.tentativas = tentativas
+
+    @property
+    def estatisticas(self):
+        with self._condicao:
+            return {
+                'requisicoes_por_segundo': round(self._taxa, 3),
+                'concorrencia': int(self._concorrencia),
+                'em_andamento': self._em_andamento,
+                'limitacoes': self._limitacoes,
+                'pausa': max(0.0, self._pausado_ate - time.monotonic()),
+            }
+
+    def adquirir(self):
+        with self._condicao:
+            while True:
+                espera = self._tentar_adquirir()
+                if espera is None:
+                    return
+                self._condicao.wait(espera)
+
+    async def adquirir_async(self):
+        while True:
+            with self._condicao:
+                espera = self._tentar_adquirir()
+            if espera is None:
+                return
+            await asyncio.sleep(espera)
+
+    def liberar(self, status=None, retry_after=None):
+        """
+        Devolve a vaga de uma requisição, ajustando os limites pelo status da resposta
+        """
+        with self._condicao:
+            self._em_andamento -= 1
+            if status in STATUS_DE_LIMITACAO:
+                self._limitacoes += 1
+                self._taxa = max(1.0, self._taxa / 2)
+                self._concorrencia = max(1.0, self._concorrencia / 2)
+                self._fichas = min(self._fichas, 0.0)
+                pausa = segundos_de_retry_after(retry_after)
+                if pausa:
+                    self._pausado_ate = max(self._pausado_ate, time.monotonic() + pausa)
+            elif status is not None and status < 400:
+                self._taxa = min(self._taxa_maxima, self._taxa + 1 / self._taxa)
+                self._concorrencia = min(self._concorrencia_maxima, self._concorrencia + 1 / self._concorrencia)
+            self._condicao.notify_all()
+
+    def executar(self, requisitar):
+        """
+        Executa requisitar() dentro dos limites, repetindo-a quando o servidor limita
+        """
+        for tentativa in range(1, self.tentativas + 1):
+            self.adquirir()
+            try:
+                resposta = requisitar()
+            except HTTPError as error:
+                self._liberar_com_erro(error)
+                if error.code not in STATUS_DE_LIMITACAO or tentativa == self.tentativas:
+                    raise
+                continue
+            except BaseException:
+                self.liberar()
+                raise
+            self.liberar(resposta.status)
+            return resposta
+
+    async def executar_async(self, requisitar):
+        """
+        Como executar, mas requisitar() retorna uma corrotina com o corpo da resposta
+        """
+        for tentativa in range(1, self.tentativas + 1):
+            await self.adquirir_async()
+            try:
+                corpo = await requisitar()
+            except HTTPError as error:
+                self._liberar_com_erro(error)
+                if error.code not in STATUS_DE_LIMITACAO or tentativa == self.tentativas:
+                    raise
+                continue
+            except BaseException:
+                self.liberar()
+                raise
+            self.liberar(200)
+            return corpo
+
+    def _liberar_com_erro(self, error):
+        self.liberar(error.code, error.headers.get('Retry-After') if error.headers else None)
+
+    def _tentar_adquirir(self):
+        # chamado com o lock: retorna None se adquiriu a vaga ou os segundos a esperar
+        agora = time.monotonic()
+        self._fichas = min(self._capacidade, self._fichas + (agora - self._atualizado_em) * self._taxa)
+        self._atualizado_em = agora
+        if agora < self._pausado_ate:
+            return self._pausado_ate - agora
+        if self._em_andamento >= int(self._concorrencia):
+            return INTERVALO_DE_ESPERA
+        if self._fichas < 1:
+            return (1 - self._fichas) / self._taxa
+        self._fichas -= 1
+        self._em_andamento += 1
+        return None
+
+
+def segundos_de_retry_after(valor):
+    """
+    Converte o cabeçalho Retry-After (segundos ou data HTTP) em segundos
+    """
+    if not valor:
+        return 0
+    try:
+        return max(0.0, float(valor))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(valor).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return 0
@@ -1,49 +1,398 @@
+import asyncio
+import hashlib
 import json
 import logging
 import os
+import queue
+import sys
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+from functools import partial
+from http.client import HTTPMessage
+from itertools import islice
 from math import ceil
+from time import perf_counter
 from urllib.error import HTTPError
-from urllib.parse import urlencode
+from urllib.parse import urlencode, urlsplit
 from urllib.request import urlopen, Request
 
+from colecao.compressao import ACEITAR_CODIFICACAO, TAMANHO_BLOCO, CorpoInvalido, LeitorDeCorpo, ler_corpo, \
+    tamanho_declarado
+from colecao.conexoes import RespostaHTTP
+from colecao.leitor_json import iterar_documentos, ler_cabecalho, ler_resumo
+
+# endereço do buscador usado por consultar_livros
+URL_BUSCADOR = 'https://buscador'
+# pool de conexões persistentes usado por executar_requisicao (opcional)
+_pool_de_conexoes = None
+# cache em disco das páginas já baixadas (opcional)
+_cache_de_respostas = None
+# cache em memória dos resultados de consultar_livros (opcional)
+_cache_de_consultas = None
+# índice invertido local consultado antes do buscador (opcional)
+_indice_local = None
+# limitador de taxa e concorrência das requisições (opcional)
+_limitador = None
+# repetição das requisições com erros transitórios (opcional)
+_politica_de_tentativas = None
+# métricas por estágio: requisicao, analise, escrita e insercao (opcional)
+_metricas = None
+_SEM_MEDICAO = nullcontext()
+# estágios instrumentados, para métricas e ganchos
+ESTAGIOS = ('requisicao', 'analise', 'escrita', 'insercao')
+# funções chamadas antes e depois de cada estágio: estágio -> ((antes, depois), ...)
+_ganchos = {}
+# arquivos lidos por tarefa do pool de processos de registrar_livros
+ARQUIVOS_POR_TAREFA = 8
+# documentos por inserção ao registrar arquivos NDJSON sem tamanho_lote
+TAMANHO_LOTE_NDJSON = 1000
+# threads de cada etapa de baixar_e_registrar_livros
+TRABALHADORES_DO_PIPELINE = {'requisicao': 8, 'analise': 2, 'escrita': 1, 'insercao': 1}
+# marca de fim das filas de baixar_e_registrar_livros
+_FIM_DO_PIPELINE = object()
+
 
 def consultar_livros(autor):
+    if _cache_de_consultas is not None:
+        return _cache_de_consultas.obter_ou_calcular(autor, lambda: _consultar_livros(autor))
+    return _consultar_livros(autor)
+
+
+def _consultar_livros(autor):
+    if _indice_local is not None:
+        documentos = _indice_local.buscar(autor, 'author')
+        if documentos:
+            return json.dumps({'num_docs': len(documentos), 'docs': documentos}, ensure_ascii=False)
     dados = preparar_dados_para_requisicao(autor)
-    url = obter_url('https://buscador', dados)
+    url = obter_url(URL_BUSCADOR, dados)
     retorno = executar_requisicao(url)
+    if _indice_local is not None and retorno:
+        _indice_local.adicionar(Resposta(retorno).documentos)
     return retorno
 
 
 def preparar_dados_para_requisicao(autor):
-    pass
+    return {'autor': autor}
 
 
 def obter_url(url, dados):
-    pass
+    return url + '?' + urlencode(dados)
 
 
 def executar_requisicao(url):
+    if _cache_de_respostas is not None:
+        resultado = _cache_de_respostas.obter(url)
+        if resultado is not None:
+            return resultado
     try:
-        with urlopen(url, timeout=10) as resposta:
-            resultado = resposta.read().decode("utf-8")
-    except HTTPError as error:
+        resultado = _requisitar(url).corpo.decode("utf-8")
+    except (HTTPError, CorpoInvalido) as error:
         logging.exception(f'Ao acessar {url} : {error}')
     else:
+        if _cache_de_respostas is not None:
+            _cache_de_respostas.guardar(url, resultado)
         return resultado
 
 
-def escrever_em_arquivo(arquivo, conteudo):
-    diretorio = os.path.dirname(arquivo)
+def executar_requisicao_condicional(url, etag=None, modificado_em=None):
+    """
+    Revalida uma página já baixada com If-None-Match/If-Modified-Since.
+    Retorna RespostaHTTP com o conteúdo em str, RespostaHTTP com status 304
+    e sem conteúdo se a página não mudou, ou None em caso de erro
+    """
+    cabecalhos = {}
+    if etag:
+        cabecalhos['If-None-Match'] = etag
+    if modificado_em:
+        cabecalhos['If-Modified-Since'] = modificado_em
     try:
-        os.makedirs(diretorio)
-    except OSError:
-        logging.exception(f'Não foi possível criar diretório {diretorio}')
+        resposta = _requisitar(url, cabecalhos)
+    except HTTPError as error:
+        if error.code == 304:
+            return RespostaHTTP(304, error.headers, None)
+        logging.exception(f'Ao acessar {url} : {error}')
+    except CorpoInvalido as error:
+        logging.exception(f'Ao acessar {url} : {error}')
+    else:
+        return RespostaHTTP(resposta.status, resposta.cabecalhos, resposta.corpo.decode("utf-8"))
+
+
+def _requisitar(url, cabecalhos=None):
+    requisitar = partial(_abrir, url, cabecalhos)
+    if _limitador is not None:
+        requisitar = partial(_limitador.executar, requisitar)
+    if _politica_de_tentativas is not None:
+        requisitar = partial(_politica_de_tentativas.executar, requisitar)
+    return requisitar()
+
+
+def _estagio(nome, quantidade=None):
+    """
+    Contexto que mede um estágio nas métricas configuradas e chama seus ganchos;
+    sem métricas nem ganchos, não faz nada
+    """
+    if _metricas is None and not _ganchos:
+        return _SEM_MEDICAO
+    return _Estagio(nome, quantidade, _ganchos.get(nome, ()))
+
+
+class _Estagio:
+    __slots__ = ('_nome', 'quantidade', '_ganchos', '_inicio')
+
+    def __init__(self, nome, quantidade, ganchos):
+        self._nome = nome
+        self.quantidade = quantidade
+        self._ganchos = ganchos
+
+    def __enter__(self):
+        for antes, _ in self._ganchos:
+            if antes is not None:
+                self._chamar(antes, self._nome)
+        self._inicio = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        duracao = perf_counter() - self._inicio
+        erro = exc_type is not None
+        for _, depois in reversed(self._ganchos):
+            if depois is not None:
+                self._chamar(depois, self._nome, duracao, erro)
+        if _metricas is not None:
+            _metricas.observar(self._nome, duracao, self.quantidade, erro=erro)
+
+    def _chamar(self, gancho, *argumentos):
+        # um gancho com erro não pode trocar o resultado ou o erro do próprio estágio
+        try:
+            gancho(*argumentos)
+        except Exception as error:
+            logging.exception(f'Gancho do estágio {self._nome} falhou: {error}')
+
+
+def registrar_gancho(estagio, antes=None, depois=None):
+    """
+    Registra funções chamadas em torno de um estágio (ver ESTAGIOS):
+    antes(estagio) ao entrar e depois(estagio, duracao, erro) ao sair.
+    Retorna o gancho, para remover_gancho
+    """
+    global _ganchos
+    if estagio not in ESTAGIOS:
+        raise ValueError(f'Estágio desconhecido: {estagio}')
+    gancho = (antes, depois)
+    # o dicionário é substituído, e não alterado, para não travar as threads que o leem
+    ganchos = dict(_ganchos)
+    ganchos[estagio] = ganchos.get(estagio, ()) + (gancho,)
+    _ganchos = ganchos
+    return gancho
+
+
+def remover_gancho(gancho):
+    global _ganchos
+    _ganchos = {
+        estagio: tuple(registrado for registrado in registrados if registrado is not gancho)
+        for estagio, registrados in _ganchos.items()
+    }
+    _ganchos = {estagio: registrados for estagio, registrados in _ganchos.items() if registrados}
+
+
+def remover_ganchos():
+    global _ganchos
+    _ganchos = {}
+
+
+def _abrir(url, cabecalhos):
+    # o estágio é medido a cada tentativa, sem as esperas do limitador e entre tentativas
+    with _estagio('requisicao') as medicao:
+        if _pool_de_conexoes is not None:
+            resposta = _pool_de_conexoes.requisitar(url, cabecalhos)
+        else:
+            requisicao = url
+            # como urlopen, aceita também um Request já montado, que segue como está
+            if isinstance(url, str):
+                requisicao = Request(url, headers={'Accept-Encoding': ACEITAR_CODIFICACAO, **(cabecalhos or {})})
+            with urlopen(requisicao, timeout=10) as resposta_http:
+                resposta = RespostaHTTP(resposta_http.status, resposta_http.headers, ler_corpo(resposta_http))
+        if medicao is not None:
+            medicao.quantidade = len(resposta.corpo)
+    return resposta
+
+
+def configurar_pool_de_conexoes(pool):
+    """
+    Faz executar_requisicao (e, portanto, consultar_livros e baixar_livros)
+    usar um PoolDeConexoes; com None volta a abrir uma conexão por página
+    """
+    global _pool_de_conexoes
+    _pool_de_conexoes = pool
+
+
+def configurar_cache_de_respostas(cache):
+    """
+    Coloca um CacheEmDisco na frente de executar_requisicao;
+    com None as páginas voltam a ser sempre buscadas na rede
+    """
+    global _cache_de_respostas
+    _cache_de_respostas = cache
+
+
+def configurar_indice_local(indice):
+    """
+    Faz consultar_livros responder pelo IndiceInvertido quando ele conhece o autor,
+    indo ao buscador só quando não há documentos do autor no índice;
+    as respostas do buscador são acrescentadas ao índice
+    """
+    global _indice_local
+    _indice_local = indice
+
+
+def configurar_cache_de_consultas(cache):
+    """
+    Coloca um CacheEmMemoria na frente de consultar_livros;
+    com None cada chamada volta a consultar o buscador
+    """
+    global _cache_de_consultas
+    _cache_de_consultas = cache
+
+
+def configurar_limitador(limitador):
+    """
+    Faz todas as requisições (síncronas, assíncronas e pelo pool)
+    passarem pelo LimitadorDeTaxa informado; None remove o limite
+    """
+    global _limitador
+    _limitador = limitador
+
+
+def configurar_tentativas(politica):
+    """
+    Repete as requisições com erros transitórios (e, opcionalmente, duplica
+    as mais lentas) conforme a PoliticaDeTentativas informada; None desativa
+    """
+    global _politica_de_tentativas
+    _politica_de_tentativas = politica
+
+
+def configurar_metricas(metricas):
+    """
+    Passa a registrar latências e contadores de cada estágio em Metricas; None desativa
+    """
+    global _metricas
+    _metricas = metricas
+
+
+async def executar_requisicao_async(url):
+    try:
+        resultado = await _requisitar_async(url)
+    except (HTTPError, CorpoInvalido, asyncio.TimeoutError, asyncio.IncompleteReadError, OSError) as error:
+        # o erro de uma página não pode interromper o gather de baixar_livros_async
+        logging.exception(f'Ao acessar {url} : {error}')
+    else:
+        return resultado.decode("utf-8")
+
 
+async def _requisitar_async(url):
+    def requisitar():
+        return asyncio.wait_for(_abrir_async(url), timeout=10)
+
+    if _limitador is not None:
+        requisitar = partial(_limitador.executar_async, requisitar)
+    if _politica_de_tentativas is not None:
+        requisitar = partial(_politica_de_tentativas.executar_async, requisitar)
+    return await requisitar()
+
+
+async def _abrir_async(url):
+    # como em _abrir, cada tentativa é medida sem as esperas do limitador e entre tentativas
+    with _estagio('requisicao') as medicao:
+        corpo = await _executar_get_async(url)
+        if medicao is not None:
+            medicao.quantidade = len(corpo)
+    return corpo
+
+
+async def _executar_get_async(url):
+    """
+    Executa um GET HTTP/1.1 sobre as streams do asyncio
+    e retorna o corpo da resposta em bytes
+    """
+    partes = urlsplit(url)
+    https = partes.scheme == 'https'
+    caminho = partes.path or '/'
+    if partes.query:
+        caminho += '?' + partes.query
+    leitor, escritor = await asyncio.open_connection(
+        partes.hostname, partes.port or (443 if https else 80), ssl=https or None
+    )
     try:
-        with open(arquivo, 'w') as file_open:
-            file_open.write(conteudo)
-    except OSError as error:
-        logging.exception(f'Não foi possível criar arquivo {arquivo}')
+        escritor.write(
+            f'GET {caminho} HTTP/1.1\r\n'
+            f'Host: {partes.netloc}\r\n'
+            'Accept: application/json\r\n'
+            f'Accept-Encoding: {ACEITAR_CODIFICACAO}\r\n'
+            'Connection: close\r\n\r\n'.encode('latin-1')
+        )
+        await escritor.drain()
+        status, motivo, cabecalhos, corpo = await _ler_resposta_http(leitor)
+    finally:
+        escritor.close()
+    if status >= 400:
+        raise HTTPError(url, status, motivo, cabecalhos, None)
+    return corpo
+
+
+async def _ler_resposta_http(leitor):
+    linha_de_status = (await leitor.readline()).decode('latin-1').split(None, 2)
+    status = int(linha_de_status[1])
+    motivo = linha_de_status[2].strip() if len(linha_de_status) > 2 else ''
+
+    cabecalhos = HTTPMessage()
+    while True:
+        linha = await leitor.readline()
+        if linha in (b'\r\n', b'\n', b''):
+            break
+        nome, _, valor = linha.decode('latin-1').partition(':')
+        cabecalhos[nome.strip()] = valor.strip()
+
+    # os blocos são descomprimidos (Content-Encoding) à medida que chegam
+    corpo = LeitorDeCorpo(cabecalhos.get('Content-Encoding'), tamanho_declarado=tamanho_declarado(cabecalhos))
+    if cabecalhos.get('Transfer-Encoding', '').lower() == 'chunked':
+        while True:
+            tamanho = int((await leitor.readline()).split(b';')[0], 16)
+            if tamanho == 0:
+                # descarta os trailers, se houver
+                while (await leitor.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                break
+            corpo.escrever(await leitor.readexactly(tamanho))
+            await leitor.readexactly(2)
+    elif 'Content-Length' in cabecalhos:
+        restante = int(cabecalhos['Content-Length'])
+        while restante:
+            bloco = await leitor.readexactly(min(restante, TAMANHO_BLOCO))
+            corpo.escrever(bloco)
+            restante -= len(bloco)
+    else:
+        while bloco := await leitor.read(TAMANHO_BLOCO):
+            corpo.escrever(bloco)
+    return status, motivo, cabecalhos, corpo.resultado()
+
+
+def escrever_em_arquivo(arquivo, conteudo):
+    with _estagio('escrita', len(conteudo)):
+        diretorio = os.path.dirname(arquivo)
+        try:
+            os.makedirs(diretorio)
+        except FileExistsError:
+            pass
+        except OSError:
+            logging.exception(f'Não foi possível criar diretório {diretorio}')
+
+        try:
+            with open(arquivo, 'w') as file_open:
+                file_open.write(conteudo)
+        except OSError as error:
+            logging.exception(f'Não foi possível criar arquivo {arquivo}')
 
 
 class Consulta:
@@ -55,6 +404,8 @@ class Consulta:
     - url
     - dados_para_requisicao
     """
+    # endereço do buscador de livros
+    url = 'https://buscarlivros'
 
     def __init__(self, autor=None, titulo=None, livre=None):
         self._titulo = titulo
@@ -62,7 +413,7 @@ class Consulta:
         self._autor = autor
         self._pagina = 0
         self._dados_para_requisicao = None
-        self._url = 'https://buscarlivros'
+        self._url = self.url
 
     @property
     def pagina(self):
@@ -96,18 +447,112 @@ class Consulta:
             return requisicao.full_url + '?' + urlencode(requisicao.data)
 
 
+class Livro:
+    """
+    Registro compacto de um livro, alternativa aos dicionários de
+    Resposta.documentos. O autor é internado, de modo que autores
+    repetidos compartilham a mesma string.
+    dict(livro) devolve o documento original
+    """
+    __slots__ = ('author', 'title', 'extras')
+
+    def __init__(self, author=None, title=None, extras=None):
+        self.author = sys.intern(author) if isinstance(author, str) else author
+        self.title = title
+        # demais campos do documento, se houver
+        self.extras = extras
+
+    @classmethod
+    def de_documento(cls, documento):
+        extras = {
+            chave: valor for chave, valor in documento.items()
+            if chave not in ('author', 'title')
+        }
+        return cls(documento.get('author'), documento.get('title'), extras or None)
+
+    @staticmethod
+    def colunas_de_texto(documento):
+        """
+        (author, title, extras) de um documento ou Livro, para gravar em colunas de texto
+        (catálogo, SQLite): autor e título que não são texto, como listas de autores,
+        vão intactos para os extras. de_colunas faz o caminho inverso
+        """
+        if isinstance(documento, Livro):
+            autor, titulo, extras = documento.author, documento.title, documento.extras
+        else:
+            autor, titulo = documento.get('author'), documento.get('title')
+            extras = None
+            if len(documento) > (autor is not None) + (titulo is not None):
+                extras = {chave: valor for chave, valor in documento.items() if chave not in ('author', 'title')}
+        if not isinstance(autor, (str, type(None))) or not isinstance(titulo, (str, type(None))):
+            extras = dict(extras or {})
+            if not isinstance(autor, (str, type(None))):
+                extras['author'], autor = autor, None
+            if not isinstance(titulo, (str, type(None))):
+                extras['title'], titulo = titulo, None
+        return autor, titulo, extras or None
+
+    @classmethod
+    def de_colunas(cls, author, title, extras):
+        if extras and (author is None and 'author' in extras or title is None and 'title' in extras):
+            extras = dict(extras)
+            if author is None and 'author' in extras:
+                author = extras.pop('author')
+            if title is None and 'title' in extras:
+                title = extras.pop('title')
+        return cls(author, title, extras or None)
+
+    def keys(self):
+        chaves = [chave for chave in ('author', 'title') if getattr(self, chave) is not None]
+        if self.extras:
+            chaves.extend(self.extras)
+        return chaves
+
+    def __getitem__(self, chave):
+        if chave in ('author', 'title'):
+            valor = getattr(self, chave)
+            if valor is not None:
+                return valor
+        elif self.extras and chave in self.extras:
+            return self.extras[chave]
+        raise KeyError(chave)
+
+    def como_dicionario(self):
+        return dict(self)
+
+    def __eq__(self, outro):
+        if isinstance(outro, (Livro, dict)):
+            return self.como_dicionario() == dict(outro)
+        return NotImplemented
+
+    def __repr__(self):
+        return f'Livro(author={self.author!r}, title={self.title!r})'
+
+
+# marca de Resposta ainda não interpretada; None indica conteúdo inválido
+_NAO_ANALISADO = object()
+
+
 class Resposta:
     """
-    Conteúdo da página em formato JSON
+    Conteúdo da página em formato JSON.
+    Com streaming=True os documentos são lidos um a um do conteúdo
+    (str ou bytes), sem montar o dicionário da página inteira
     """
     # quantidade de documentos max esperado por página
     quantidade_documentos_por_pagina = 50
 
-    def __init__(self, conteudo):
+    def __init__(self, conteudo, streaming=False):
         # conteudo da pagina pura
         self._conteudo = conteudo
-        # conteudo processado, formato dicionário
-        self._dados = None
+        # conteudo processado, formato dicionário; interpretado uma única vez
+        self._dados = _NAO_ANALISADO
+        self._streaming = streaming
+        # modo streaming: campos do objeto de topo e quantidade de documentos
+        self._resumo = None
+        # (num_docs, há documentos), lidos sem decodificar os documentos;
+        # a quantidade de documentos não entra (ver quantidade_de_documentos)
+        self._sonda = None
 
     @property
     def conteudo(self):
@@ -115,9 +560,11 @@ class Resposta:
 
     @property
     def dados(self):
-        if not self._dados:
+        if self._dados is _NAO_ANALISADO:
+            self._dados = None
             try:
-                json_dados = json.loads(self.conteudo)
+                with _estagio('analise', len(self.conteudo or '')):
+                    json_dados = json.loads(self.conteudo)
             except TypeError as error:
                 logging.exception(
                     f'Resultado da cconsulta {self.conteudo}: tipo inválido.'
@@ -133,20 +580,91 @@ class Resposta:
     @property
     def documentos(self):
         # documentos retornados na pagina
-        return self.dados.get('docs', [])
+        if self._streaming:
+            return iterar_documentos(self.conteudo)
+        return (self.dados or {}).get('docs', [])
+
+    @property
+    def livros(self):
+        # documentos da pagina como registros Livro
+        return [Livro.de_documento(documento) for documento in self.documentos]
+
+    @property
+    def num_docs(self):
+        # total de documentos, todas as páginas
+        return self._sondar()[0]
+
+    @property
+    def quantidade_de_documentos(self):
+        # documentos nesta página
+        if self._streaming:
+            return self._obter_resumo()[1]
+        # a sonda não conta os documentos: pular cada um com o LeitorIncremental custa
+        # cerca de 8 vezes o json.loads da página inteira (páginas de 50 documentos),
+        # então contar pela sonda sairia mais caro que interpretar. Ela só evita a
+        # interpretação quando já se sabe que a página não tem documentos
+        if self._dados is _NAO_ANALISADO and not self._sondar()[1]:
+            return 0
+        return len(self.documentos)
+
+    def _obter_resumo(self):
+        # modo streaming: (campos do objeto de topo, quantidade de documentos)
+        if self._resumo is None:
+            self._resumo = ler_resumo(self.conteudo)
+        return self._resumo
+
+    def _sondar(self):
+        if self._sonda is None:
+            self._sonda = self._ler_sonda()
+        return self._sonda
+
+    def _ler_sonda(self):
+        # lê num_docs do começo do conteúdo e só espia o array de documentos;
+        # se num_docs vier depois dos documentos, interpretar tudo de uma vez sai mais barato
+        if self._dados is _NAO_ANALISADO and isinstance(self.conteudo, (str, bytes, bytearray)):
+            try:
+                cabecalho, ha_documentos = ler_cabecalho(self.conteudo, parar_nos_documentos=not self._streaming)
+            except ValueError:
+                # conteúdo inválido: dados registra o erro
+                pass
+            else:
+                if self._streaming or 'num_docs' in cabecalho:
+                    return cabecalho.get('num_docs', 0), ha_documentos
+        dados = self.dados or {}
+        return dados.get('num_docs', 0), bool(dados.get('docs'))
 
     @property
     def total_de_paginas(self):
         # total de paginas, todos os resultados
-        if len(self.documentos):
+        num_docs, ha_documentos = self._sondar()
+        if ha_documentos:
             return ceil(
-                self.dados.get('num_docs', 0) / self.quantidade_documentos_por_pagina
+                num_docs / self.quantidade_documentos_por_pagina
             )
         return 0
 
 
-def baixar_livros(arquivo, autor=None, titulo=None, livre=None):
+def baixar_livros(arquivo, autor=None, titulo=None, livre=None, max_workers=None, retomar=False,
+                  revalidar=False):
+    """
+    Baixa todas as páginas da consulta. arquivo é a lista com o arquivo
+    de cada página ou uma SaidaNDJSON, que junta os documentos de todas as páginas.
+    - retomar: registra cada página concluída em um Manifesto ao lado dos arquivos
+      e, em uma nova execução, pula as páginas já baixadas e íntegras
+    - revalidar: com retomar, em vez de pular as páginas já baixadas, confirma
+      com o servidor (ETag/Last-Modified) que não mudaram
+    retomar não aceita SaidaNDJSON: o manifesto confere cada página pelo seu arquivo
+    """
     consulta = Consulta(autor, titulo, livre)
+    manifesto = None
+    if retomar:
+        if isinstance(arquivo, SaidaNDJSON):
+            raise ValueError('retomar exige um arquivo por página; SaidaNDJSON não pode ser retomada')
+        manifesto = Manifesto(os.path.join(os.path.dirname(arquivo[0]), Manifesto.nome))
+    if max_workers:
+        return _baixar_livros_concorrente(arquivo, consulta, max_workers, manifesto, revalidar)
+    if manifesto is not None:
+        return _baixar_livros_com_manifesto(arquivo, consulta, manifesto, revalidar)
     total_de_paginas = 1
     i = 0
     while True:
@@ -154,7 +672,7 @@ def baixar_livros(arquivo, autor=None, titulo=None, livre=None):
         if resultado:
             resposta = Resposta(resultado)
             total_de_paginas = resposta.total_de_paginas
-            escrever_em_arquivo(arquivo[i], resultado)
+            _gravar_pagina(arquivo, i, resultado, resposta)
         elif consulta.pagina == 1:
             total_de_paginas = 2
 
@@ -163,14 +681,657 @@ def baixar_livros(arquivo, autor=None, titulo=None, livre=None):
         i += 1
 
 
+def _gravar_pagina(arquivo, indice, resultado, resposta=None):
+    if isinstance(arquivo, SaidaNDJSON):
+        arquivo.gravar((resposta or Resposta(resultado)).documentos)
+    else:
+        escrever_em_arquivo(arquivo[indice], resultado)
+
+
+def _baixar_pagina(arquivo, indice, url, manifesto=None, revalidar=False):
+    if manifesto is not None:
+        return _baixar_pagina_com_manifesto(arquivo[indice], url, manifesto, revalidar)
+    resultado = executar_requisicao(url)
+    if resultado:
+        _gravar_pagina(arquivo, indice, resultado)
+    return resultado
+
+
+def _baixar_pagina_com_manifesto(arquivo, url, manifesto, revalidar):
+    registro = manifesto.obter(url)
+    anterior = manifesto.conteudo_integro(registro, arquivo) if registro else None
+    if anterior is None:
+        resposta = executar_requisicao_condicional(url)
+    elif revalidar:
+        resposta = executar_requisicao_condicional(url, registro['etag'], registro['last_modified'])
+    else:
+        return anterior
+
+    if resposta is None:
+        return None
+    if resposta.status == 304:
+        return anterior
+    if resposta.corpo:
+        escrever_em_arquivo(arquivo, resposta.corpo)
+        manifesto.registrar(url, arquivo, resposta.corpo, resposta.cabecalhos)
+    return resposta.corpo
+
+
+def _baixar_livros_com_manifesto(arquivo, consulta, manifesto, revalidar):
+    total_de_paginas = 1
+    while True:
+        url = consulta.seguinte
+        resultado = _baixar_pagina(arquivo, consulta.pagina - 1, url, manifesto, revalidar)
+        if resultado:
+            total_de_paginas = Resposta(resultado).total_de_paginas
+        elif consulta.pagina == 1:
+            total_de_paginas = 2
+
+        if consulta.pagina == total_de_paginas:
+            break
+
+
+def _baixar_livros_concorrente(arquivo, consulta, max_workers, manifesto=None, revalidar=False):
+    """
+    Baixa a primeira página para conhecer o total de páginas
+    e distribui as páginas restantes entre max_workers threads
+    """
+    total_de_paginas = 0
+    # se a página 1 falhar, a página 2 é usada para obter o total,
+    # como no download sequencial
+    while consulta.pagina < 2:
+        url = consulta.seguinte
+        resultado = _baixar_pagina(arquivo, consulta.pagina - 1, url, manifesto, revalidar)
+        if resultado:
+            total_de_paginas = Resposta(resultado).total_de_paginas
+            break
+
+    paginas = _paginas_restantes(consulta, total_de_paginas)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for _ in executor.map(lambda pagina: _baixar_pagina(arquivo, *pagina, manifesto, revalidar), paginas):
+            pass
+
+
+def _paginas_restantes(consulta, total_de_paginas):
+    # (indice, url) de cada página; as urls são geradas antes,
+    # pois Consulta.seguinte não é thread-safe
+    return [
+        (pagina - 1, consulta.seguinte)
+        for pagina in range(consulta.pagina + 1, total_de_paginas + 1)
+    ]
+
+
+class ProgressoDaConsulta:
+    """
+    Andamento de uma consulta de baixar_lote
+    """
+    __slots__ = ('consulta', 'total_de_paginas', 'paginas_baixadas', 'paginas_com_erro', 'concluida')
+
+    def __init__(self, consulta):
+        self.consulta = consulta
+        # desconhecido até a primeira página chegar
+        self.total_de_paginas = None
+        self.paginas_baixadas = 0
+        self.paginas_com_erro = 0
+        self.concluida = False
+
+    def __repr__(self):
+        return (f'ProgressoDaConsulta(paginas_baixadas={self.paginas_baixadas}, '
+                f'paginas_com_erro={self.paginas_com_erro}, total_de_paginas={self.total_de_paginas}, '
+                f'concluida={self.concluida})')
+
+
+def baixar_lote(consultas, max_workers=8, pesos=None, progresso=None):
+    """
+    Baixa várias consultas em um único pool de max_workers threads, que é também
+    o limite de páginas em andamento somando todas as consultas.
+    consultas é uma lista de (arquivo, consulta): arquivo como em baixar_livros e consulta uma Consulta.
+    As páginas são distribuídas por round-robin ponderado entre as consultas com páginas
+    pendentes, de modo que uma consulta grande não atrasa as pequenas.
+    - pesos: peso de cada consulta (padrão 1); uma consulta de peso 2 recebe duas vezes mais vagas
+    - progresso: chamada como progresso(indice, ProgressoDaConsulta) a cada página concluída
+    Retorna o ProgressoDaConsulta de cada consulta
+    """
+    pesos = list(pesos) if pesos is not None else [1] * len(consultas)
+    if len(pesos) != len(consultas) or any(peso <= 0 for peso in pesos):
+        raise ValueError('pesos deve ter um valor positivo para cada consulta')
+    progressos = [ProgressoDaConsulta(consulta) for _, consulta in consultas]
+    # páginas a baixar de cada consulta: começa pela primeira, que informa o total
+    pendentes = [deque() for _ in consultas]
+    for indice, (_, consulta) in enumerate(consultas):
+        url = consulta.seguinte
+        pendentes[indice].append((consulta.pagina - 1, url))
+    # créditos do round-robin ponderado suave: cada escolha soma o peso de cada consulta
+    # pendente e desconta o total da escolhida
+    creditos = [0] * len(consultas)
+    em_andamento = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while True:
+            while len(em_andamento) < max_workers:
+                escolhida = _escolher_consulta(pendentes, pesos, creditos)
+                if escolhida is None:
+                    break
+                indice, url = pendentes[escolhida].popleft()
+                arquivo = consultas[escolhida][0]
+                futuro = executor.submit(_baixar_pagina, arquivo, indice, url)
+                em_andamento[futuro] = (escolhida, indice, url)
+            if not em_andamento:
+                break
+            concluidos, _ = wait(em_andamento, return_when=FIRST_COMPLETED)
+            for futuro in concluidos:
+                escolhida, indice, url = em_andamento.pop(futuro)
+                try:
+                    resultado = futuro.result()
+                except Exception as error:
+                    # a falha de uma página não interrompe as demais consultas
+                    logging.exception(f'Ao acessar {url} : {error}')
+                    resultado = None
+                _registrar_pagina_do_lote(consultas[escolhida][1], progressos[escolhida], pendentes[escolhida],
+                                          indice, resultado)
+                if progresso is not None:
+                    progresso(escolhida, progressos[escolhida])
+    return progressos
+
+
+def _escolher_consulta(pendentes, pesos, creditos):
+    escolhida = None
+    total = 0
+    for indice, paginas in enumerate(pendentes):
+        if not paginas:
+            continue
+        creditos[indice] += pesos[indice]
+        total += pesos[indice]
+        if escolhida is None or creditos[indice] > creditos[escolhida]:
+            escolhida = indice
+    if escolhida is not None:
+        creditos[escolhida] -= total
+    return escolhida
+
+
+def _registrar_pagina_do_lote(consulta, progresso, pendentes, indice, resultado):
+    total_de_paginas = None
+    if resultado and progresso.total_de_paginas is None:
+        try:
+            total_de_paginas = Resposta(resultado).total_de_paginas
+        except Exception as error:
+            logging.exception(f'Resposta inválida na página {indice + 1}: {error}')
+            resultado = None
+    if resultado:
+        progresso.paginas_baixadas += 1
+    else:
+        progresso.paginas_com_erro += 1
+    if progresso.total_de_paginas is None:
+        # primeira página (ou a segunda, se a primeira falhou), como em _baixar_livros_concorrente
+        if resultado:
+            progresso.total_de_paginas = total_de_paginas
+            pendentes.extend(_paginas_restantes(consulta, progresso.total_de_paginas))
+        elif consulta.pagina < 2:
+            url = consulta.seguinte
+            pendentes.append((consulta.pagina - 1, url))
+        else:
+            progresso.total_de_paginas = 0
+    # consulta.pagina é a quantidade de páginas já pedidas por Consulta.seguinte
+    progresso.concluida = progresso.total_de_paginas is not None and not pendentes and \
+        progresso.paginas_baixadas + progresso.paginas_com_erro == consulta.pagina
+
+
+async def _baixar_pagina_async(arquivo, indice, url, semaforo):
+    async with semaforo:
+        resultado = await executar_requisicao_async(url)
+    if resultado:
+        # a escrita em disco é bloqueante e roda fora do loop de eventos
+        await asyncio.to_thread(_gravar_pagina, arquivo, indice, resultado)
+    return resultado
+
+
+async def baixar_livros_async(arquivo, autor=None, titulo=None, livre=None, max_concorrencia=100):
+    """
+    Versão asyncio de baixar_livros: todas as páginas são baixadas
+    em uma única thread, com no máximo max_concorrencia requisições em andamento.
+    Retorna o resultado de cada página (None para as páginas com erro)
+    """
+    consulta = Consulta(autor, titulo, livre)
+    semaforo = asyncio.Semaphore(max_concorrencia)
+    resultados = []
+    total_de_paginas = 0
+    while consulta.pagina < 2:
+        url = consulta.seguinte
+        resultado = await _baixar_pagina_async(arquivo, consulta.pagina - 1, url, semaforo)
+        resultados.append(resultado)
+        if resultado:
+            total_de_paginas = Resposta(resultado).total_de_paginas
+            break
+
+    paginas = _paginas_restantes(consulta, total_de_paginas)
+    resultados.extend(await asyncio.gather(
+        *(_baixar_pagina_async(arquivo, indice, url, semaforo) for indice, url in paginas)
+    ))
+    return resultados
+
+
+class Manifesto:
+    """
+    Registro das páginas já baixadas, usado por baixar_livros(retomar=True).
+    Cada linha do arquivo (JSON Lines) descreve uma página concluída:
+    url, arquivo, tamanho, sha256, etag e last_modified.
+    Linhas são só acrescentadas; a última linha de cada url prevalece
+    """
+    nome = 'manifesto.jsonl'
+
+    def __init__(self, caminho):
+        self._caminho = caminho
+        # url -> registro
+        self._paginas = {}
+        self._lock = threading.Lock()
+        try:
+            with open(caminho, 'rb') as arquivo:
+                for linha in arquivo:
+                    try:
+                        registro = json.loads(linha)
+                    except json.JSONDecodeError:
+                        # linha incompleta de uma execução interrompida
+                        continue
+                    self._paginas[registro['url']] = registro
+        except FileNotFoundError:
+            pass
+
+    def obter(self, url):
+        return self._paginas.get(url)
+
+    @staticmethod
+    def conteudo_integro(registro, arquivo):
+        """
+        Retorna o conteúdo gravado em arquivo se ele confere com o registro
+        (tamanho e sha256), ou None
+        """
+        try:
+            with open(arquivo, 'rb') as arquivo_aberto:
+                dados = arquivo_aberto.read()
+        except OSError:
+            return None
+        if len(dados) != registro['tamanho'] or hashlib.sha256(dados).hexdigest() != registro['sha256']:
+            return None
+        return dados.decode('utf-8')
+
+    def registrar(self, url, arquivo, conteudo, cabecalhos):
+        dados = conteudo.encode('utf-8')
+        registro = {
+            'url': url,
+            'arquivo': arquivo,
+            'tamanho': len(dados),
+            'sha256': hashlib.sha256(dados).hexdigest(),
+            'etag': cabecalhos.get('ETag'),
+            'last_modified': cabecalhos.get('Last-Modified'),
+        }
+        linha = json.dumps(registro, ensure_ascii=False) + '\n'
+        with self._lock:
+            self._paginas[url] = registro
+            with open(self._caminho, 'a', encoding='utf-8') as arquivo_aberto:
+                arquivo_aberto.write(linha)
+
+
+class SaidaNDJSON:
+    """
+    Destino de baixar_livros que acrescenta cada documento baixado como uma
+    linha JSON (NDJSON) em um único arquivo ou, com tamanho_maximo (bytes),
+    em segmentos caminho.00000.ndjson, caminho.00001.ndjson, ...
+    Uma saída já existente é continuada: os novos segmentos seguem os que estão
+    no disco, e a última linha incompleta de uma gravação interrompida é descartada.
+    Pode ser usada por várias threads ao mesmo tempo
+    """
+
+    def __init__(self, caminho, tamanho_maximo=None):
+        self._caminho = caminho
+        self._tamanho_maximo = tamanho_maximo
+        self._arquivo = None
+        self._lock = threading.Lock()
+        # segmentos da saída, na ordem, inclusive os que já estavam no disco
+        self.arquivos = []
+        diretorio = os.path.dirname(caminho)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+        if tamanho_maximo:
+            raiz, extensao = os.path.splitext(caminho)
+            self._modelo_do_segmento = f'{raiz}.{{:05d}}{extensao or ".ndjson"}'
+            self.arquivos = self._segmentos_existentes()
+        self._proximo_segmento = len(self.arquivos)
+        # o último arquivo de uma execução anterior pode ter sido interrompido no meio de uma linha
+        _descartar_linha_incompleta(self.arquivos[-1] if self.arquivos else caminho)
+
+    def gravar(self, documentos):
+        linhas = ''.join(
+            json.dumps(documento, ensure_ascii=False) + '\n' for documento in documentos
+        ).encode('utf-8')
+        if not linhas:
+            return
+        with _estagio('escrita', len(linhas)), self._lock:
+            if self._arquivo is None or self._segmento_cheio(len(linhas)):
+                self._abrir_segmento()
+            self._arquivo.write(linhas)
+
+    def fechar(self):
+        with self._lock:
+            if self._arquivo is not None:
+                self._arquivo.close()
+                self._arquivo = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.fechar()
+
+    def _segmento_cheio(self, tamanho):
+        posicao = self._arquivo.tell()
+        return bool(self._tamanho_maximo) and posicao > 0 and posicao + tamanho > self._tamanho_maximo
+
+    def _segmentos_existentes(self):
+        segmentos = []
+        while os.path.exists(self._modelo_do_segmento.format(len(segmentos))):
+            segmentos.append(self._modelo_do_segmento.format(len(segmentos)))
+        return segmentos
+
+    def _abrir_segmento(self):
+        if self._arquivo is not None:
+            self._arquivo.close()
+        if self._tamanho_maximo:
+            nome = self._modelo_do_segmento.format(self._proximo_segmento)
+            self._proximo_segmento += 1
+        else:
+            nome = self._caminho
+        self._arquivo = open(nome, 'ab')
+        if nome not in self.arquivos:
+            self.arquivos.append(nome)
+
+
+def _descartar_linha_incompleta(nome):
+    # uma gravação interrompida deixa a última linha sem '\n'; sem o corte, o próximo
+    # documento seria emendado a ela e os dois se perderiam na leitura (ver ler_ndjson)
+    try:
+        arquivo = open(nome, 'r+b')
+    except FileNotFoundError:
+        return
+    with arquivo:
+        fim = posicao = arquivo.seek(0, os.SEEK_END)
+        while posicao > 0:
+            inicio = max(0, posicao - TAMANHO_BLOCO)
+            arquivo.seek(inicio)
+            quebra = arquivo.read(posicao - inicio).rfind(b'\n')
+            if quebra >= 0:
+                posicao = inicio + quebra + 1
+                break
+            posicao = inicio
+        if posicao < fim:
+            arquivo.truncate(posicao)
+
+
 def ler_arquivo(nome_arquivo):
-    return ''
+    """
+    Retorna o conteúdo do arquivo em bytes, que json.loads aceita sem decodificar.
+    Se o arquivo não puder ser lido, retorna b''
+    """
+    try:
+        # read() aloca o tamanho do arquivo de uma vez; json.loads não aceita mmap,
+        # então mapear o arquivo exigiria a mesma cópia para bytes
+        with open(nome_arquivo, 'rb') as arquivo:
+            return arquivo.read()
+    except OSError:
+        logging.exception(f'Não foi possível ler arquivo {nome_arquivo}')
+        return b''
+
+
+def registrar_livros(arquivos, inserir_registros, como_livros=False, tamanho_lote=None, processos=None,
+                     formato='json', deduplicacao=None):
+    """
+    Insere os documentos de cada arquivo com inserir_registros.
+    - como_livros: passa os documentos como registros Livro
+    - tamanho_lote: junta os documentos dos arquivos em lotes desse tamanho
+      (o último pode ser menor); sem ele, é feita uma inserção por arquivo
+    - processos: lê e interpreta os arquivos em um pool de processos;
+      inserir_registros continua sendo chamado só neste processo, na ordem dos arquivos
+    - formato: 'json' (uma página por arquivo) ou 'ndjson' (arquivos gravados
+      por SaidaNDJSON, lidos linha a linha em lotes de tamanho_lote ou TAMANHO_LOTE_NDJSON)
+    - deduplicacao: índice de colecao.deduplicacao (IndiceExato ou FiltroDeBloom);
+      documentos já vistos não são inseridos e, ao final, o índice é salvo
+    Retorna a quantidade de registros inseridos
+    """
+    if formato == 'ndjson':
+        if processos:
+            raise ValueError('processos não é suportado com o formato ndjson')
+        documentos = ler_ndjson(arquivos)
+        if deduplicacao is not None:
+            documentos = filter(deduplicacao.novo, documentos)
+        if como_livros:
+            documentos = map(Livro.de_documento, documentos)
+        lotes = iter(lambda: list(islice(documentos, tamanho_lote or TAMANHO_LOTE_NDJSON)), [])
+        quantidade = _inserir_em_lotes(lotes, inserir_registros, None)
+    elif processos:
+        with ProcessPoolExecutor(max_workers=processos) as executor:
+            paginas = _paginas_em_processos(executor, arquivos, processos)
+            if deduplicacao is not None:
+                paginas = _sem_repetidos(paginas, deduplicacao)
+            if como_livros:
+                # os Livro são criados aqui para que os autores sejam internados neste processo
+                paginas = ([Livro.de_documento(documento) for documento in documentos] for documentos in paginas)
+            quantidade = _inserir_em_lotes(paginas, inserir_registros, tamanho_lote)
+    else:
+        paginas = (_documentos_do_arquivo(arquivo, como_livros) for arquivo in arquivos)
+        if deduplicacao is not None:
+            paginas = _sem_repetidos(paginas, deduplicacao)
+        quantidade = _inserir_em_lotes(paginas, inserir_registros, tamanho_lote)
+
+    if deduplicacao is not None:
+        deduplicacao.salvar()
+    return quantidade
 
 
-def registrar_livros(arquivos, inserir_registros):
+def ler_ndjson(arquivos):
+    """
+    Gera os documentos dos arquivos NDJSON, um por linha, sem carregar os arquivos inteiros
+    """
+    for nome_arquivo in arquivos:
+        try:
+            with open(nome_arquivo, 'rb') as arquivo:
+                for numero, linha in enumerate(arquivo, 1):
+                    if not linha.strip():
+                        continue
+                    try:
+                        documento = json.loads(linha)
+                    except ValueError:
+                        # linha incompleta de uma gravação interrompida; as demais continuam valendo
+                        logging.exception(f'Linha {numero} inválida em {nome_arquivo}')
+                        continue
+                    yield documento
+        except OSError:
+            logging.exception(f'Não foi possível ler arquivo {nome_arquivo}')
+
+
+def _inserir_em_lotes(paginas, inserir_registros, tamanho_lote):
     quantidade = 0
-    for arquivo in arquivos:
-        conteudo = ler_arquivo(arquivo)
-        resposta = Resposta(conteudo)
-        quantidade += inserir_registros(resposta.documentos)
+    for lote in _em_lotes(paginas, tamanho_lote):
+        with _estagio('insercao', len(lote)):
+            quantidade += inserir_registros(lote)
     return quantidade
+
+
+def _sem_repetidos(paginas, deduplicacao):
+    for documentos in paginas:
+        documentos = deduplicacao.filtrar(documentos)
+        # páginas só com repetidos não chegam a inserir_registros
+        if documentos:
+            yield documentos
+
+
+def _paginas_em_processos(executor, arquivos, processos):
+    """
+    Como executor.map, na ordem dos arquivos, mas com no máximo 2 * processos tarefas
+    em andamento: com uma inserção lenta, a leitura não se adianta mais que isso
+    """
+    arquivos = iter(arquivos)
+    grupos = iter(lambda: list(islice(arquivos, ARQUIVOS_POR_TAREFA)), [])
+    pendentes = deque(executor.submit(_documentos_dos_arquivos, grupo) for grupo in islice(grupos, 2 * processos))
+    while pendentes:
+        paginas = pendentes.popleft().result()
+        grupo = next(grupos, None)
+        if grupo is not None:
+            pendentes.append(executor.submit(_documentos_dos_arquivos, grupo))
+        yield from paginas
+
+
+def _documentos_dos_arquivos(arquivos):
+    return [_documentos_do_arquivo(arquivo) for arquivo in arquivos]
+
+
+def _documentos_do_arquivo(arquivo, como_livros=False):
+    conteudo = ler_arquivo(arquivo)
+    resposta = Resposta(conteudo)
+    return resposta.livros if como_livros else resposta.documentos
+
+
+def _em_lotes(paginas, tamanho_lote):
+    if not tamanho_lote:
+        yield from paginas
+        return
+    lote = []
+    for documentos in paginas:
+        if not isinstance(documentos, list):
+            documentos = list(documentos)
+        inicio = 0
+        if lote:
+            # completa o lote com o começo da página
+            inicio = tamanho_lote - len(lote)
+            lote.extend(documentos[:inicio])
+            if len(lote) < tamanho_lote:
+                continue
+            yield lote
+        # os lotes completos saem por fatias da página; só o resto é copiado para o próximo lote
+        completos = inicio + (len(documentos) - inicio) // tamanho_lote * tamanho_lote
+        for posicao in range(inicio, completos, tamanho_lote):
+            yield documentos[posicao:posicao + tamanho_lote]
+        lote = documentos[completos:]
+    if lote:
+        yield lote
+
+
+def baixar_e_registrar_livros(inserir_registros, autor=None, titulo=None, livre=None, arquivo=None,
+                              como_livros=False, tamanho_lote=None, deduplicacao=None, trabalhadores=None,
+                              tamanho_fila=16):
+    """
+    Baixa as páginas da consulta e insere os documentos com inserir_registros
+    sem passar pelo disco: requisicao -> analise -> [escrita] -> insercao.
+    Cada etapa roda em suas próprias threads e as etapas são ligadas por filas
+    de até tamanho_fila itens, de modo que uma etapa lenta segura as anteriores.
+    - arquivo: lista com o arquivo de cada página ou SaidaNDJSON; sem ele, nada é gravado
+    - trabalhadores: threads por etapa, sobre TRABALHADORES_DO_PIPELINE
+    - como_livros, tamanho_lote e deduplicacao: como em registrar_livros
+    Os documentos são inseridos na ordem em que as páginas chegam.
+    Retorna a quantidade de registros inseridos
+    """
+    quantidade_de_threads = dict(TRABALHADORES_DO_PIPELINE, **(trabalhadores or {}))
+    consulta = Consulta(autor, titulo, livre)
+    urls = queue.Queue()
+    paginas = queue.Queue(tamanho_fila)
+    documentos = queue.Queue(tamanho_fila)
+    falhas = []
+    quantidades = []
+    lock_deduplicacao = threading.Lock()
+
+    def baixar(pagina):
+        indice, url = pagina
+        resultado = executar_requisicao(url)
+        return (indice, resultado) if resultado else None
+
+    def selecionar(resposta):
+        selecionados = resposta.livros if como_livros else resposta.documentos
+        if deduplicacao is not None:
+            with lock_deduplicacao:
+                selecionados = deduplicacao.filtrar(selecionados)
+        return selecionados or None
+
+    def analisar(pagina):
+        indice, resultado = pagina
+        resposta = Resposta(resultado)
+        if arquivo is None:
+            return selecionar(resposta)
+        return indice, resultado, resposta
+
+    def gravar(pagina):
+        _gravar_pagina(arquivo, *pagina)
+        return selecionar(pagina[2])
+
+    etapas = [('requisicao', baixar, urls, paginas)]
+    if arquivo is None:
+        etapas.append(('analise', analisar, paginas, documentos))
+    else:
+        analisadas = queue.Queue(tamanho_fila)
+        etapas.append(('analise', analisar, paginas, analisadas))
+        etapas.append(('escrita', gravar, analisadas, documentos))
+    threads = []
+    for nome, processar, entrada, saida in etapas:
+        threads.append(_iniciar_threads(nome, quantidade_de_threads[nome], _trabalhador_do_pipeline,
+                                        processar, entrada, saida, falhas))
+    threads.append(_iniciar_threads('insercao', quantidade_de_threads['insercao'], _trabalhador_de_insercao,
+                                    documentos, inserir_registros, tamanho_lote, falhas, quantidades))
+
+    try:
+        # a primeira página (ou a segunda, se a primeira falhar) informa o total de páginas
+        total_de_paginas = 0
+        while consulta.pagina < 2:
+            url = consulta.seguinte
+            pagina = baixar((consulta.pagina - 1, url))
+            if pagina is not None:
+                paginas.put(pagina)
+                total_de_paginas = Resposta(pagina[1]).total_de_paginas
+                break
+        for pagina in _paginas_restantes(consulta, total_de_paginas):
+            urls.put(pagina)
+    finally:
+        # cada etapa só recebe o fim depois que a anterior terminou
+        entradas = [entrada for _, _, entrada, _ in etapas] + [documentos]
+        for entrada, threads_da_etapa in zip(entradas, threads):
+            for _ in threads_da_etapa:
+                entrada.put(_FIM_DO_PIPELINE)
+            for thread in threads_da_etapa:
+                thread.join()
+
+    if falhas:
+        raise falhas[0]
+    if deduplicacao is not None:
+        deduplicacao.salvar()
+    return sum(quantidades)
+
+
+def _iniciar_threads(nome, quantidade, alvo, *argumentos):
+    threads = [
+        threading.Thread(target=alvo, args=argumentos, name=f'pipeline-{nome}-{i}', daemon=True)
+        for i in range(quantidade)
+    ]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def _trabalhador_do_pipeline(processar, entrada, saida, falhas):
+    for item in iter(entrada.get, _FIM_DO_PIPELINE):
+        if falhas:
+            # depois de uma falha as filas só são esvaziadas, para nenhuma etapa ficar bloqueada
+            continue
+        try:
+            resultado = processar(item)
+        except Exception as error:
+            logging.exception(f'Falha no pipeline: {error}')
+            falhas.append(error)
+            continue
+        if resultado is not None:
+            saida.put(resultado)
+
+
+def _trabalhador_de_insercao(entrada, inserir_registros, tamanho_lote, falhas, quantidades):
+    paginas = (documentos for documentos in iter(entrada.get, _FIM_DO_PIPELINE) if not falhas)
+    try:
+        quantidades.append(_inserir_em_lotes(paginas, inserir_registros, tamanho_lote))
+    except Exception as error:
+        logging.exception(f'Falha no pipeline: {error}')
+        falhas.append(error)
+        for _ in iter(entrada.get, _FIM_DO_PIPELINE):
+            pass
@@ -0,0 +1,121 @@
+import json
+import os
+import threading
+from bisect import bisect_left
+
+# limites, em segundos, dos buckets dos histogramas de latência
+LIMITES_DE_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# limites dos histogramas de tamanho (bytes por requisição, registros por inserção, ...)
+LIMITES_DE_TAMANHO = (1, 10, 100, 1000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+
+class Histograma:
+    def __init__(self, limites):
+        self.limites = limites
+        # a última posição conta os valores acima do maior limite
+        self.contagens = [0] * (len(limites) + 1)
+        self.soma = 0
+        self.quantidade = 0
+
+    def observar(self, valor):
+        self.contagens[bisect_left(self.limites, valor)] += 1
+        self.soma += valor
+        self.quantidade += 1
+
+    def como_dicionario(self):
+        return {
+            'limites': list(self.limites),
+            'contagens': list(self.contagens),
+            'soma': self.soma,
+            'quantidade': self.quantidade,
+        }
+
+
+class Metricas:
+    """
+    Contadores e histogramas de latência e de tamanho por estágio
+    (requisicao, analise, escrita, insercao), alimentados pelos estágios
+    de colecao.livros (ver configurar_metricas).
+    Exporta um retrato em JSON ou no formato texto do Prometheus
+    """
+
+    def __init__(self, prefixo='colecao'):
+        self._prefixo = prefixo
+        self._estagios = {}
+        self._lock = threading.Lock()
+
+    def observar(self, estagio, duracao, quantidade=None, erro=False):
+        with self._lock:
+            dados = self._estagios.get(estagio)
+            if dados is None:
+                dados = self._estagios[estagio] = {
+                    'chamadas': 0,
+                    'erros': 0,
+                    'quantidade': 0,
+                    'latencia': Histograma(LIMITES_DE_LATENCIA),
+                    'tamanho': Histograma(LIMITES_DE_TAMANHO),
+                }
+            dados['chamadas'] += 1
+            dados['latencia'].observar(duracao)
+            if erro:
+                dados['erros'] += 1
+            if quantidade is not None:
+                dados['quantidade'] += quantidade
+                dados['tamanho'].observar(quantidade)
+
+    def retrato(self):
+        with self._lock:
+            return {
+                estagio: {
+                    'chamadas': dados['chamadas'],
+                    'erros': dados['erros'],
+                    'quantidade': dados['quantidade'],
+                    'latencia': dados['latencia'].como_dicionario(),
+                    'tamanho': dados['tamanho'].como_dicionario(),
+                }
+                for estagio, dados in self._estagios.items()
+            }
+
+    def texto_prometheus(self):
+        retrato = self.retrato()
+        prefixo = self._prefixo
+        linhas = []
+        for nome, chave, descricao in (
+                ('chamadas_total', 'chamadas', 'Chamadas por estágio'),
+                ('erros_total', 'erros', 'Chamadas com erro por estágio'),
+                ('quantidade_total', 'quantidade', 'Bytes ou registros processados por estágio'),
+        ):
+            linhas.append(f'# HELP {prefixo}_{nome} {descricao}')
+            linhas.append(f'# TYPE {prefixo}_{nome} counter')
+            for estagio, dados in retrato.items():
+                linhas.append(f'{prefixo}_{nome}{{estagio="{estagio}"}} {dados[chave]}')
+        for nome, chave, descricao in (
+                ('latencia_segundos', 'latencia', 'Latência por estágio'),
+                ('tamanho', 'tamanho', 'Bytes ou registros por chamada'),
+        ):
+            linhas.append(f'# HELP {prefixo}_{nome} {descricao}')
+            linhas.append(f'# TYPE {prefixo}_{nome} histogram')
+            for estagio, dados in retrato.items():
+                histograma = dados[chave]
+                acumulado = 0
+                limites = [str(limite) for limite in histograma['limites']] + ['+Inf']
+                for limite, contagem in zip(limites, histograma['contagens']):
+                    acumulado += contagem
+                    linhas.append(f'{prefixo}_{nome}_bucket{{estagio="{estagio}",le="{limite}"}} {acumulado}')
+                linhas.append(f'{prefixo}_{nome}_sum{{estagio="{estagio}"}} {histograma["soma"]}')
+                linhas.append(f'{prefixo}_{nome}_count{{estagio="{estagio}"}} {histograma["quantidade"]}')
+        return '\n'.join(linhas) + '\n'
+
+    def exportar_json(self, caminho):
+        _gravar(caminho, json.dumps(self.retrato(), indent=2))
+
+    def exportar_prometheus(self, caminho):
+        _gravar(caminho, self.texto_prometheus())
+
+
+def _gravar(caminho, conteudo):
+    # grava em um arquivo temporário e troca, para que leitores nunca vejam um arquivo pela metade
+    temporario = f'{caminho}.tmp'
+    with open(temporario, 'w', encoding='utf-8') as arquivo:
+        arquivo.write(conteudo)
+    os.replace(temporario, caminho)
@@ -0,0 +1,177 @@
+import io
+import os
+import pstats
+import random
+import threading
+import tracemalloc
+from contextvars import ContextVar
+from cProfile import Profile
+
+from colecao.livros import ESTAGIOS, registrar_gancho, remover_gancho
+
+
+class _PerfilPorEstagio:
+    """
+    Base dos perfis: registra ganchos nos estágios e sorteia quais chamadas medir.
+    Cada contexto (thread ou tarefa do asyncio) guarda uma pilha própria, para estágios
+    aninhados e downloads concorrentes. O perfil vale para a thread inteira, então só
+    uma amostra por thread fica ativa por vez; no asyncio ela inclui as outras tarefas
+    que rodarem enquanto a amostrada espera
+    """
+
+    def __init__(self, diretorio, amostragem=0.01):
+        self.diretorio = diretorio
+        self.amostragem = amostragem
+        # tupla, e não lista: as tarefas do asyncio herdam uma cópia do contexto
+        # e compartilhariam a mesma lista
+        self._pilha = ContextVar(f'pilha_do_perfil_{id(self)}', default=())
+        # amostra ativa em cada thread
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._ganchos = []
+
+    def registrar(self, estagios=ESTAGIOS):
+        for estagio in estagios:
+            self._ganchos.append(registrar_gancho(estagio, self._antes, self._depois))
+        return self
+
+    def remover(self):
+        for gancho in self._ganchos:
+            remover_gancho(gancho)
+        self._ganchos = []
+
+    def __enter__(self):
+        return self.registrar()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.remover()
+        self.despejar()
+
+    def _antes(self, estagio):
+        pilha = self._pilha.get()
+        estado = None
+        # só a chamada mais externa é sorteada; as aninhadas já entram no perfil dela
+        if not pilha and not getattr(self._local, 'amostrando', False) and random.random() < self.amostragem:
+            estado = self._iniciar()
+            self._local.amostrando = estado is not None
+        self._pilha.set(pilha + (estado,))
+
+    def _depois(self, estagio, duracao, erro):
+        pilha = self._pilha.get()
+        if not pilha:
+            # perfil registrado com o estágio já em andamento
+            return
+        self._pilha.set(pilha[:-1])
+        estado = pilha[-1]
+        if estado is not None:
+            self._local.amostrando = False
+            self._finalizar(estagio, estado)
+
+    def _arquivo(self, nome):
+        os.makedirs(self.diretorio, exist_ok=True)
+        return os.path.join(self.diretorio, nome)
+
+
+class PerfilCProfile(_PerfilPorEstagio):
+    """
+    Executa uma amostra das chamadas de cada estágio sob o cProfile e
+    acumula as estatísticas por estágio; despejar grava {estagio}.prof e {estagio}.txt
+    """
+
+    def __init__(self, diretorio, amostragem=0.01, linhas=30):
+        super().__init__(diretorio, amostragem)
+        self.linhas = linhas
+        self._estatisticas = {}
+        self.amostras = {}
+
+    def _iniciar(self):
+        perfil = Profile()
+        perfil.enable()
+        return perfil
+
+    def _finalizar(self, estagio, perfil):
+        perfil.disable()
+        with self._lock:
+            self.amostras[estagio] = self.amostras.get(estagio, 0) + 1
+            estatisticas = self._estatisticas.get(estagio)
+            if estatisticas is None:
+                self._estatisticas[estagio] = pstats.Stats(perfil)
+            else:
+                estatisticas.add(perfil)
+
+    def despejar(self):
+        arquivos = []
+        with self._lock:
+            for estagio, estatisticas in self._estatisticas.items():
+                caminho = self._arquivo(f'{estagio}.prof')
+                estatisticas.dump_stats(caminho)
+                texto = io.StringIO()
+                estatisticas.stream = texto
+                estatisticas.sort_stats('cumulative').print_stats(self.linhas)
+                with open(self._arquivo(f'{estagio}.txt'), 'w', encoding='utf-8') as arquivo:
+                    arquivo.write(texto.getvalue())
+                arquivos.append(caminho)
+        return arquivos
+
+
+class PerfilTracemalloc(_PerfilPorEstagio):
+    """
+    Compara instantâneos do tracemalloc antes e depois de uma amostra das chamadas
+    de cada estágio; despejar grava {estagio}.alocacoes.txt com os maiores pontos de alocação
+    """
+
+    def __init__(self, diretorio, amostragem=0.01, top=10):
+        super().__init__(diretorio, amostragem)
+        self.top = top
+        # estágio -> {(arquivo, linha): [bytes, blocos]}
+        self._alocacoes = {}
+        self.amostras = {}
+        self._iniciou_tracemalloc = False
+
+    def registrar(self, estagios=ESTAGIOS):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._iniciou_tracemalloc = True
+        return super().registrar(estagios)
+
+    def remover(self):
+        super().remover()
+        if self._iniciou_tracemalloc:
+            tracemalloc.stop()
+            self._iniciou_tracemalloc = False
+
+    def _iniciar(self):
+        if not tracemalloc.is_tracing():
+            return None
+        return tracemalloc.take_snapshot()
+
+    def _finalizar(self, estagio, antes):
+        depois = tracemalloc.take_snapshot()
+        filtros = (tracemalloc.Filter(False, tracemalloc.__file__),)
+        diferencas = depois.filter_traces(filtros).compare_to(antes.filter_traces(filtros), 'lineno')
+        with self._lock:
+            self.amostras[estagio] = self.amostras.get(estagio, 0) + 1
+            alocacoes = self._alocacoes.setdefault(estagio, {})
+            for diferenca in diferencas:
+                if diferenca.size_diff <= 0:
+                    continue
+                quadro = diferenca.traceback[0]
+                total = alocacoes.setdefault((quadro.filename, quadro.lineno), [0, 0])
+                total[0] += diferenca.size_diff
+                total[1] += diferenca.count_diff
+
+    def maiores_alocacoes(self, estagio):
+        with self._lock:
+            alocacoes = self._alocacoes.get(estagio, {})
+            return sorted(alocacoes.items(), key=lambda item: item[1][0], reverse=True)[:self.top]
+
+    def despejar(self):
+        arquivos = []
+        for estagio in list(self._alocacoes):
+            caminho = self._arquivo(f'{estagio}.alocacoes.txt')
+            with open(caminho, 'w', encoding='utf-8') as arquivo:
+                arquivo.write(f'# {estagio}: {self.amostras.get(estagio, 0)} amostras\n')
+                for (nome, linha), (tamanho, blocos) in self.maiores_alocacoes(estagio):
+                    arquivo.write(f'{nome}:{linha}: {tamanho / 1024:.1f} KiB em {blocos} blocos\n')
+            arquivos.append(caminho)
+        return arquivos
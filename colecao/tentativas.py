@@ -0,0 +1,209 @@
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from urllib.error import HTTPError, URLError
+
+
+def erro_transitorio(error):
+    """
+    Erros que costumam passar se a requisição for repetida:
+    timeouts, conexões recusadas ou reiniciadas e status 5xx
+    """
+    if isinstance(error, HTTPError):
+        return error.code >= 500
+    return isinstance(error, (URLError, TimeoutError, ConnectionError))
+
+
+class PoliticaDeTentativas:
+    """
+    Repete requisições com erros transitórios, esperando entre as tentativas
+    um tempo aleatório entre 0 e espera_base * 2 ** (tentativa - 1), limitado a espera_maxima.
+    Com hedge=True, se uma requisição demorar mais que o percentil das latências
+    já observadas (depois de amostras_minimas), uma cópia é disparada; orcamento_de_hedge
+    limita as cópias a essa fração das requisições.
+    Vale a primeira resposta bem-sucedida; a requisição só falha se as duas falharem.
+    - executar: com hedge, cada tentativa roda em uma thread própria (sem pool, para não
+      limitar a concorrência) e a mais lenta termina em segundo plano, com o resultado descartado
+    - executar_async: a tarefa mais lenta é cancelada
+    """
+
+    def __init__(self, tentativas=3, espera_base=0.5, espera_maxima=30, hedge=False, percentil=0.95,
+                 amostras_minimas=20, amostras=1000, orcamento_de_hedge=0.05):
+        self.tentativas = tentativas
+        self.espera_base = espera_base
+        self.espera_maxima = espera_maxima
+        self.hedge = hedge
+        self.percentil = percentil
+        self.amostras_minimas = amostras_minimas
+        self.orcamento_de_hedge = orcamento_de_hedge
+        self._latencias = deque(maxlen=amostras)
+        self._requisicoes = 0
+        self._repeticoes = 0
+        self._hedges = 0
+        self._lock = threading.Lock()
+
+    @property
+    def estatisticas(self):
+        with self._lock:
+            return {
+                'repeticoes': self._repeticoes,
+                'hedges': self._hedges,
+                'latencia_limite': self.latencia_limite(),
+            }
+
+    def espera(self, tentativa):
+        return random.uniform(0, min(self.espera_maxima, self.espera_base * 2 ** (tentativa - 1)))
+
+    def latencia_limite(self):
+        # latência do percentil configurado ou None se ainda há poucas amostras
+        latencias = sorted(self._latencias)
+        if len(latencias) < self.amostras_minimas:
+            return None
+        return latencias[min(len(latencias) - 1, int(len(latencias) * self.percentil))]
+
+    def executar(self, requisitar):
+        for tentativa in range(1, self.tentativas + 1):
+            try:
+                return self._executar_uma_vez(requisitar)
+            except Exception as error:
+                if tentativa == self.tentativas or not erro_transitorio(error):
+                    raise
+            with self._lock:
+                self._repeticoes += 1
+            time.sleep(self.espera(tentativa))
+
+    async def executar_async(self, requisitar):
+        """
+        Como executar, mas requisitar() retorna uma corrotina
+        """
+        for tentativa in range(1, self.tentativas + 1):
+            try:
+                return await self._executar_uma_vez_async(requisitar)
+            except Exception as error:
+                if tentativa == self.tentativas or not erro_transitorio(error):
+                    raise
+            with self._lock:
+                self._repeticoes += 1
+            await asyncio.sleep(self.espera(tentativa))
+
+    def _executar_uma_vez(self, requisitar):
+        limite = self._limite_do_hedge()
+        if limite is None:
+            return self._medir(requisitar)
+
+        corrida = _Corrida(self, requisitar)
+        corrida.disparar()
+        # o prazo conta a partir do início real da requisição original
+        if not corrida.esperar(limite) and self._reservar_hedge():
+            corrida.disparar()
+        corrida.esperar()
+        return corrida.resultado()
+
+    async def _executar_uma_vez_async(self, requisitar):
+        limite = self._limite_do_hedge()
+        if limite is None:
+            return await self._medir_async(requisitar)
+
+        primeira = asyncio.ensure_future(self._medir_async(requisitar))
+        prontas, _ = await asyncio.wait({primeira}, timeout=limite)
+        if prontas:
+            return primeira.result()
+        if not self._reservar_hedge():
+            return await primeira
+        pendentes = {primeira, asyncio.ensure_future(self._medir_async(requisitar))}
+        while pendentes:
+            prontas, pendentes = await asyncio.wait(pendentes, return_when=asyncio.FIRST_COMPLETED)
+            for tarefa in prontas:
+                if tarefa.exception() is None:
+                    for pendente in pendentes:
+                        pendente.cancel()
+                    return tarefa.result()
+        return primeira.result()
+
+    def _limite_do_hedge(self):
+        if not self.hedge:
+            return None
+        with self._lock:
+            self._requisicoes += 1
+        return self.latencia_limite()
+
+    def _reservar_hedge(self):
+        # uma cópia só é disparada se couber no orçamento, para não dobrar a carga no servidor
+        with self._lock:
+            if self._hedges >= self.orcamento_de_hedge * self._requisicoes:
+                return False
+            self._hedges += 1
+            return True
+
+    def _medir(self, requisitar):
+        inicio = time.perf_counter()
+        resultado = requisitar()
+        self._latencias.append(time.perf_counter() - inicio)
+        return resultado
+
+    async def _medir_async(self, requisitar):
+        inicio = time.perf_counter()
+        resultado = await requisitar()
+        self._latencias.append(time.perf_counter() - inicio)
+        return resultado
+
+
+class _Corrida:
+    """
+    Tentativas simultâneas da mesma requisição síncrona, cada uma em sua thread:
+    vale o primeiro sucesso e, se todas falharem, o primeiro erro
+    """
+
+    __slots__ = ('_politica', '_requisitar', '_condicao', '_disparadas', '_iniciadas', '_erros',
+                 '_resultado', '_concluida')
+
+    def __init__(self, politica, requisitar):
+        self._politica = politica
+        self._requisitar = requisitar
+        self._condicao = threading.Condition()
+        self._disparadas = 0
+        self._iniciadas = 0
+        self._erros = []
+        self._resultado = None
+        self._concluida = False
+
+    def disparar(self):
+        with self._condicao:
+            self._disparadas += 1
+        threading.Thread(target=self._executar, name='hedge', daemon=True).start()
+        with self._condicao:
+            self._condicao.wait_for(lambda: self._iniciadas == self._disparadas)
+
+    def _executar(self):
+        with self._condicao:
+            self._iniciadas += 1
+            self._condicao.notify_all()
+        try:
+            resultado = self._politica._medir(self._requisitar)
+        except Exception as error:
+            with self._condicao:
+                self._erros.append(error)
+                self._condicao.notify_all()
+        else:
+            with self._condicao:
+                if not self._concluida:
+                    self._concluida = True
+                    self._resultado = resultado
+                self._condicao.notify_all()
+
+    def esperar(self, timeout=None):
+        """
+        Espera um sucesso ou a falha de todas as tentativas; retorna False se o prazo acabar antes
+        """
+        with self._condicao:
+            return self._condicao.wait_for(
+                lambda: self._concluida or len(self._erros) == self._disparadas, timeout
+            )
+
+    def resultado(self):
+        with self._condicao:
+            if self._concluida:
+                return self._resultado
+            raise self._erros[0]
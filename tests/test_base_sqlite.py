@@ -0,0 +1,74 @@
+import sqlite3
+
+import pytest
+
+from colecao.base_sqlite import BaseSQLite
+from colecao.livros import Livro, registrar_livros
+
+
+DOCUMENTOS = [
+    {'author': 'Luciano Ramalho', 'title': 'Python Fluente'},
+    {'author': 'Allen B. Downey', 'title': 'Pense em Python', 'ano': 2016},
+    {'title': 'Sem autor'},
+]
+
+
+def test_inserir_registros_retorna_quantidade_e_grava_documentos(tmp_path):
+    with BaseSQLite(str(tmp_path / 'livros.db')) as base:
+        assert base.inserir_registros(DOCUMENTOS) == 3
+        assert base.inserir_registros([Livro('Nilo Ney', 'Introdução a Programação com Python')]) == 1
+        assert base.quantidade() == 4
+        assert base.livros('Allen B. Downey') == [DOCUMENTOS[1]]
+        assert base.livros()[2] == DOCUMENTOS[2]
+
+
+def test_base_usa_wal(tmp_path):
+    with BaseSQLite(str(tmp_path / 'livros.db'), synchronous='off') as base:
+        assert base._conexao.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        assert base._conexao.execute('PRAGMA synchronous').fetchone()[0] == 0
+
+
+def test_upsert_atualiza_documento_com_mesma_chave_natural(tmp_path):
+    with BaseSQLite(str(tmp_path / 'livros.db'), upsert=True) as base:
+        base.inserir_registros(DOCUMENTOS)
+        base.inserir_registros([{'author': 'Luciano Ramalho', 'title': 'Python Fluente', 'edicao': 2},
+                                {'title': 'Sem autor'}])
+        assert base.quantidade() == 3
+        assert base.livros('Luciano Ramalho')[0].extras == {'edicao': 2}
+
+
+def test_lote_com_erro_e_desfeito(tmp_path):
+    with BaseSQLite(str(tmp_path / 'livros.db')) as base:
+        base._conexao.execute(
+            "CREATE TRIGGER recusa BEFORE INSERT ON livros WHEN NEW.title = 'Recusado' "
+            "BEGIN SELECT RAISE(ABORT, 'recusado'); END"
+        )
+        with pytest.raises(sqlite3.IntegrityError):
+            base.inserir_registros([DOCUMENTOS[0], {'author': 'Nilo Ney', 'title': 'Recusado'}])
+        assert base.quantidade() == 0
+
+
+def test_autor_e_titulo_que_nao_sao_texto_ficam_nos_extras(tmp_path):
+    varios_autores = {'author': ['Brian W. Kernighan', 'Dennis M. Ritchie'], 'title': 'The C Programming Language'}
+    outra_edicao = {'author': ['Brian W. Kernighan'], 'title': 'The C Programming Language'}
+    with BaseSQLite(str(tmp_path / 'livros.db'), upsert=True) as base:
+        assert base.inserir_registros([DOCUMENTOS[0], varios_autores, outra_edicao, {'title': 2015}]) == 4
+        assert base.inserir_registros([varios_autores]) == 1
+        assert base.quantidade() == 4
+        assert base.livros() == [DOCUMENTOS[0], varios_autores, outra_edicao, {'title': 2015}]
+        assert base.livros()[1].author == ['Brian W. Kernighan', 'Dennis M. Ritchie']
+
+
+def test_base_rejeita_pragmas_e_tabela_invalidos(tmp_path):
+    with pytest.raises(ValueError):
+        BaseSQLite(str(tmp_path / 'livros.db'), synchronous='NORMAL; DROP TABLE livros')
+    with pytest.raises(ValueError):
+        BaseSQLite(str(tmp_path / 'livros.db'), tabela='livros; --')
+
+
+def test_registrar_livros_na_base_sqlite(tmp_path):
+    arquivo = tmp_path / 'arquivo1.json'
+    arquivo.write_text('{"num_docs": 2, "docs": [{"author": "Nilo Ney"}, {"author": "Wes McKinney"}]}')
+    with BaseSQLite(str(tmp_path / 'livros.db')) as base:
+        assert registrar_livros([str(arquivo)], base.inserir_registros, tamanho_lote=1) == 2
+        assert base.quantidade() == 2
@@ -0,0 +1,56 @@
+import gzip
+import json
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+import pytest
+
+from benchmarks.bench_livros import comparar, main
+from benchmarks.servidor import ServidorDeBusca
+
+
+def test_servidor_de_busca_responde_paginas_sinteticas():
+    with ServidorDeBusca(num_docs=120, documentos_por_pagina=50, autores=3) as servidor:
+        with urlopen(servidor.url + '?q=python&page=3') as resposta:
+            pagina = json.loads(resposta.read())
+    assert pagina['num_docs'] == 120
+    assert len(pagina['docs']) == 20
+    assert pagina['docs'][0] == {'author': 'Autor 1', 'title': 'Livro 100'}
+    assert servidor.total_de_paginas == 3
+
+
+def test_servidor_de_busca_comprime_quando_o_cliente_aceita():
+    with ServidorDeBusca(num_docs=120, documentos_por_pagina=50) as servidor:
+        requisicao = Request(servidor.url + '?page=1', headers={'Accept-Encoding': 'gzip'})
+        with urlopen(requisicao) as resposta:
+            codificacao = resposta.headers['Content-Encoding']
+            pagina = json.loads(gzip.decompress(resposta.read()))
+    assert codificacao == 'gzip'
+    assert len(pagina['docs']) == 50
+
+
+def test_servidor_de_busca_simula_erros():
+    with ServidorDeBusca(taxa_de_erro=1) as servidor:
+        with pytest.raises(HTTPError) as excecao:
+            urlopen(servidor.url + '?page=1')
+    assert excecao.value.code == 503
+
+
+def test_bench_livros_grava_resultados_de_todos_os_cenarios(tmp_path):
+    saida = tmp_path / 'resultados.json'
+    assert main(['--paginas', '3', '--consultas', '3', '--workers', '2', '--pool',
+                 '--sem-memoria', '--saida', str(saida)]) == 0
+    resultados = json.loads(saida.read_text())
+    assert sorted(resultados['cenarios']) == [
+        'baixar_e_registrar_livros', 'baixar_livros', 'consultar_livros', 'registrar_livros',
+    ]
+    assert resultados['cenarios']['baixar_livros']['quantidade'] == 3
+    assert resultados['cenarios']['registrar_livros']['quantidade'] == 150
+    assert resultados['cenarios']['baixar_e_registrar_livros']['quantidade'] == 150
+    assert set(resultados['cenarios']['consultar_livros']['latencia_ms']) == {'p50', 'p90', 'p95', 'p99', 'max'}
+
+
+def test_comparar_aponta_cenarios_mais_lentos():
+    anterior = {'cenarios': {'baixar_livros': {'por_segundo': 100}, 'registrar_livros': {'por_segundo': 100}}}
+    atual = {'cenarios': {'baixar_livros': {'por_segundo': 85}, 'registrar_livros': {'por_segundo': 95}}}
+    assert comparar(atual, anterior, tolerancia=0.1) == ['baixar_livros']
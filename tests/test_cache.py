@@ -0,0 +1,110 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch, Mock
+
+import pytest
+
+from colecao.cache import CacheEmDisco, CacheEmMemoria
+
+
+def test_cache_em_disco_retorna_conteudo_guardado(tmp_path):
+    cache = CacheEmDisco(str(tmp_path))
+    cache.guardar('https://buscarlivros?q=python&page=1', '{"num_docs": 5}')
+    assert cache.obter('https://buscarlivros?q=python&page=1') == '{"num_docs": 5}'
+    assert cache.obter('https://buscarlivros?q=python&page=2') is None
+    assert cache.estatisticas['acertos'] == 1
+    assert cache.estatisticas['falhas'] == 1
+
+
+def test_cache_em_disco_descarta_entrada_expirada(tmp_path):
+    cache = CacheEmDisco(str(tmp_path), ttl=60)
+    with patch('colecao.cache.time.time', return_value=1000):
+        cache.guardar('https://buscarlivros?page=1', 'pagina 1')
+    with patch('colecao.cache.time.time', return_value=1061):
+        assert cache.obter('https://buscarlivros?page=1') is None
+    assert cache.estatisticas['remocoes'] == 1
+    assert cache.estatisticas['entradas'] == 0
+    assert os.listdir(tmp_path) == []
+
+
+def test_cache_em_disco_remove_entrada_usada_ha_mais_tempo(tmp_path):
+    cache = CacheEmDisco(str(tmp_path), limite_bytes=100)
+    conteudo = 'x' * 30
+    cache.guardar('https://buscarlivros?page=1', conteudo)
+    cache.guardar('https://buscarlivros?page=2', conteudo)
+    cache.obter('https://buscarlivros?page=1')
+    cache.guardar('https://buscarlivros?page=3', conteudo)
+    assert cache.obter('https://buscarlivros?page=2') is None
+    assert cache.obter('https://buscarlivros?page=1') == conteudo
+    assert cache.obter('https://buscarlivros?page=3') == conteudo
+    assert cache.estatisticas['remocoes'] == 1
+    assert cache.estatisticas['bytes'] <= 100
+
+
+def test_cache_em_disco_recarrega_entradas_existentes(tmp_path):
+    CacheEmDisco(str(tmp_path)).guardar('https://buscarlivros?page=1', 'pagina 1')
+    cache = CacheEmDisco(str(tmp_path))
+    assert cache.estatisticas['entradas'] == 1
+    assert cache.obter('https://buscarlivros?page=1') == 'pagina 1'
+
+
+def test_cache_em_memoria_calcula_uma_vez_por_chave():
+    cache = CacheEmMemoria()
+    calcular = Mock(return_value='livros')
+    assert cache.obter_ou_calcular('Agatha Christie', calcular) == 'livros'
+    assert cache.obter_ou_calcular('Agatha Christie', calcular) == 'livros'
+    calcular.assert_called_once_with()
+    assert cache.estatisticas['acertos'] == 1
+
+
+def test_cache_em_memoria_recalcula_apos_ttl():
+    cache = CacheEmMemoria(ttl=60)
+    calcular = Mock(side_effect=['antigo', 'novo'])
+    with patch('colecao.cache.time.monotonic', return_value=100):
+        cache.obter_ou_calcular('Agatha Christie', calcular)
+    with patch('colecao.cache.time.monotonic', return_value=161):
+        assert cache.obter_ou_calcular('Agatha Christie', calcular) == 'novo'
+
+
+def test_cache_em_memoria_remove_chave_usada_ha_mais_tempo():
+    cache = CacheEmMemoria(capacidade=2)
+    cache.obter_ou_calcular('a', lambda: 1)
+    cache.obter_ou_calcular('b', lambda: 2)
+    cache.obter_ou_calcular('a', lambda: 1)
+    cache.obter_ou_calcular('c', lambda: 3)
+    assert cache.obter_ou_calcular('a', lambda: 'recalculado') == 1
+    assert cache.obter_ou_calcular('b', lambda: 'recalculado') == 'recalculado'
+
+
+def test_cache_em_memoria_nao_guarda_resultado_none():
+    cache = CacheEmMemoria()
+    cache.obter_ou_calcular('Agatha Christie', lambda: None)
+    assert cache.obter_ou_calcular('Agatha Christie', lambda: 'livros') == 'livros'
+
+
+def test_cache_em_memoria_agrupa_chamadas_simultaneas():
+    cache = CacheEmMemoria()
+    liberar = threading.Event()
+    chamadas = []
+
+    def calcular():
+        chamadas.append(1)
+        liberar.wait(timeout=5)
+        return 'livros'
+
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        futuros = [executor.submit(cache.obter_ou_calcular, 'Agatha Christie', calcular) for _ in range(5)]
+        while cache.estatisticas['agrupadas'] < 4:
+            time.sleep(0.001)
+        liberar.set()
+        assert [futuro.result() for futuro in futuros] == ['livros'] * 5
+    assert len(chamadas) == 1
+
+
+def test_cache_em_memoria_repassa_excecao_para_chamadas_agrupadas():
+    cache = CacheEmMemoria()
+    with pytest.raises(ValueError):
+        cache.obter_ou_calcular('Agatha Christie', Mock(side_effect=ValueError))
+    assert cache.obter_ou_calcular('Agatha Christie', lambda: 'livros') == 'livros'
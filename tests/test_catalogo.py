@@ -0,0 +1,71 @@
+import pytest
+
+from colecao.catalogo import EscritorDeCatalogo, LeitorDeCatalogo, SEM_VALOR, exportar_catalogo
+from colecao.livros import Livro
+
+
+DOCUMENTOS = [
+    {'author': 'Luciano Ramalho', 'title': 'Python Fluente'},
+    {'author': 'Allen B. Downey', 'title': 'Pense em Python', 'ano': 2016},
+    {'author': 'Luciano Ramalho', 'title': 'Python Fluente', 'edicao': 2},
+    {'title': 'Introdução a Programação com Python'},
+]
+
+
+@pytest.fixture
+def catalogo(tmp_path):
+    caminho = str(tmp_path / 'catalogo.bin')
+    with EscritorDeCatalogo(caminho) as escritor:
+        assert escritor.inserir_registros(DOCUMENTOS[:2]) == 2
+        escritor.adicionar([Livro.de_documento(documento) for documento in DOCUMENTOS[2:]])
+    with LeitorDeCatalogo(caminho) as leitor:
+        yield leitor
+
+
+def test_catalogo_devolve_os_documentos_gravados(catalogo):
+    assert len(catalogo) == 4
+    assert list(catalogo) == DOCUMENTOS
+    assert catalogo[1] == DOCUMENTOS[1]
+    assert catalogo[-1].author is None
+    with pytest.raises(IndexError):
+        catalogo[4]
+
+
+def test_catalogo_codifica_autor_e_titulo_por_dicionario(catalogo):
+    assert catalogo.valores('author') == ['Luciano Ramalho', 'Allen B. Downey']
+    assert list(catalogo.codigos('author')) == [0, 1, 0, SEM_VALOR]
+    assert catalogo.valor('title', 3) == 'Introdução a Programação com Python'
+    assert catalogo.indices_de('author', 'Luciano Ramalho') == [0, 2]
+    assert catalogo.indices_de('author', 'Nilo Ney') == []
+
+
+def test_leitor_recusa_arquivo_que_nao_e_catalogo(tmp_path):
+    caminho = tmp_path / 'pagina.json'
+    caminho.write_text('{"num_docs": 0, "docs": []}')
+    with pytest.raises(ValueError):
+        LeitorDeCatalogo(str(caminho))
+
+
+def test_exportar_catalogo_das_paginas_baixadas(tmp_path):
+    arquivo = tmp_path / 'arquivo1.json'
+    arquivo.write_text('{"num_docs": 2, "docs": [{"author": "Nilo Ney"}, {"author": "Wes McKinney"}]}')
+    caminho = str(tmp_path / 'catalogo.bin')
+    assert exportar_catalogo([str(arquivo)], caminho) == 2
+    with LeitorDeCatalogo(caminho) as leitor:
+        assert [livro.author for livro in leitor] == ['Nilo Ney', 'Wes McKinney']
+
+
+def test_catalogo_guarda_autor_e_titulo_que_nao_sao_texto_nos_extras(tmp_path):
+    caminho = str(tmp_path / 'catalogo.bin')
+    documentos = [
+        {'author': ['Brian W. Kernighan', 'Dennis M. Ritchie'], 'title': 'The C Programming Language'},
+        {'author': 'Luciano Ramalho', 'title': 2015, 'edicao': 1},
+        Livro(['Nilo Ney'], 'Introdução a Programação com Python'),
+    ]
+    with EscritorDeCatalogo(caminho) as escritor:
+        escritor.adicionar(documentos)
+    with LeitorDeCatalogo(caminho) as leitor:
+        assert list(leitor) == documentos[:2] + [dict(documentos[2])]
+        assert leitor[1].title == 2015
+        assert leitor.valor('author', 0) == ['Brian W. Kernighan', 'Dennis M. Ritchie']
+        assert leitor.valores('title') == ['The C Programming Language', 'Introdução a Programação com Python']
@@ -0,0 +1,86 @@
+import gzip
+import io
+import tracemalloc
+import zlib
+
+import pytest
+
+from colecao.compressao import LeitorDeCorpo, CorpoInvalido, CorpoMuitoGrande, ler_corpo
+
+CORPO = ('{"num_docs": 500, "docs": [%s]}' % ', '.join(
+    '{"author": "Autor %d", "title": "Livro %d"}' % (i % 7, i) for i in range(500))).encode('utf-8')
+
+
+class StubResposta(io.BytesIO):
+    def __init__(self, corpo, cabecalhos):
+        super().__init__(corpo)
+        self.headers = cabecalhos
+
+
+@pytest.mark.parametrize('codificacao, comprimido', [
+    (None, CORPO),
+    ('gzip', gzip.compress(CORPO)),
+    ('deflate', zlib.compress(CORPO)),
+    # deflate puro, sem o cabeçalho zlib, como alguns servidores enviam
+    ('deflate', zlib.compress(CORPO)[2:-4]),
+])
+@pytest.mark.parametrize('tamanho_bloco', [1, 100, 64 * 1024])
+def test_leitor_de_corpo_descomprime_em_blocos(codificacao, comprimido, tamanho_bloco):
+    leitor = LeitorDeCorpo(codificacao, tamanho_declarado=len(comprimido))
+    assert leitor.ler_de(io.BytesIO(comprimido), tamanho_bloco) == CORPO
+
+
+def test_ler_corpo_usa_cabecalhos_da_resposta():
+    comprimido = gzip.compress(CORPO)
+    resposta = StubResposta(comprimido, {'Content-Encoding': 'gzip', 'Content-Length': str(len(comprimido))})
+    assert len(comprimido) * 5 < len(CORPO)
+    assert ler_corpo(resposta) == CORPO
+
+
+def test_corpo_comprimido_maior_que_o_maximo_e_interrompido():
+    bomba = gzip.compress(b'0' * 10_000_000)
+    leitor = LeitorDeCorpo('gzip', tamanho_maximo=1000)
+    with pytest.raises(CorpoMuitoGrande):
+        leitor.ler_de(io.BytesIO(bomba))
+    assert len(leitor._buffer) <= 1001
+
+
+def test_corpo_sem_compressao_maior_que_o_maximo():
+    with pytest.raises(CorpoMuitoGrande):
+        LeitorDeCorpo(tamanho_maximo=10, tamanho_declarado=11)
+    with pytest.raises(CorpoMuitoGrande):
+        LeitorDeCorpo(tamanho_maximo=10).ler_de(io.BytesIO(b'x' * 11))
+
+
+def test_corpo_invalido_ou_codificacao_desconhecida():
+    with pytest.raises(CorpoInvalido):
+        LeitorDeCorpo('gzip').ler_de(io.BytesIO(b'nao e gzip'))
+    with pytest.raises(CorpoInvalido):
+        LeitorDeCorpo('br')
+
+
+def test_corpo_sem_compressao_com_content_length_nao_e_copiado():
+    corpo = b'x' * (8 * 1024 * 1024)
+    resposta = io.BytesIO(corpo)
+    tracemalloc.start()
+    try:
+        resultado = LeitorDeCorpo(tamanho_declarado=len(corpo)).ler_de(resposta)
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert resultado == corpo
+    assert resposta.tell() == len(corpo)
+    assert pico < 1.1 * len(corpo)
+
+
+def test_corpo_sem_compressao_e_sem_content_length_cresce_em_blocos():
+    corpo = b'x' * (1024 * 1024)
+    resposta = io.BytesIO(corpo)
+    tracemalloc.start()
+    try:
+        resultado = LeitorDeCorpo().ler_de(resposta)
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert resultado == corpo
+    assert pico < 1.5 * len(corpo)
@@ -0,0 +1,166 @@
+import gzip
+from http.client import RemoteDisconnected
+from unittest.mock import patch
+from urllib.error import HTTPError
+
+import pytest
+
+from colecao.conexoes import PoolDeConexoes
+
+
+class StubResposta:
+    def __init__(self, status=200, corpo=b'{}', will_close=False, cabecalhos=None):
+        self.status = status
+        self.reason = 'OK' if status < 400 else 'Erro'
+        self.headers = cabecalhos or {}
+        self.will_close = will_close
+        self._corpo = corpo
+
+    def read(self, tamanho=-1):
+        corpo, self._corpo = self._corpo, b''
+        return corpo
+
+
+class FakeConexao:
+    criadas = []
+
+    def __init__(self, host, porta, timeout):
+        self.host = host
+        self.porta = porta
+        self.requisicoes = []
+        self.respostas = []
+        self.fechada = False
+        FakeConexao.criadas.append(self)
+
+    def request(self, metodo, caminho, headers):
+        if self.respostas and isinstance(self.respostas[0], Exception):
+            raise self.respostas.pop(0)
+        self.requisicoes.append((metodo, caminho, headers))
+
+    def getresponse(self):
+        return self.respostas.pop(0) if self.respostas else StubResposta()
+
+    def close(self):
+        self.fechada = True
+
+
+@pytest.fixture
+def fake_conexao():
+    FakeConexao.criadas = []
+    with patch('colecao.conexoes.HTTPSConnection', FakeConexao), \
+            patch('colecao.conexoes.HTTPConnection', FakeConexao):
+        yield FakeConexao
+
+
+def test_pool_reaproveita_conexao_do_mesmo_host(fake_conexao):
+    pool = PoolDeConexoes()
+    pool.requisitar('https://buscarlivros?q=python&page=1')
+    pool.requisitar('https://buscarlivros?q=python&page=2')
+    assert len(fake_conexao.criadas) == 1
+    assert [caminho for _, caminho, _ in fake_conexao.criadas[0].requisicoes] == [
+        '/?q=python&page=1',
+        '/?q=python&page=2',
+    ]
+
+
+def test_pool_separa_conexoes_por_host(fake_conexao):
+    pool = PoolDeConexoes()
+    pool.requisitar('https://buscarlivros?q=python')
+    pool.requisitar('https://buscador?q=python')
+    assert [conexao.host for conexao in fake_conexao.criadas] == ['buscarlivros', 'buscador']
+
+
+def test_pool_reconecta_quando_servidor_fecha_conexao_ociosa(fake_conexao):
+    pool = PoolDeConexoes()
+    pool.requisitar('https://buscarlivros?page=1')
+    fake_conexao.criadas[0].respostas.append(RemoteDisconnected('fechada'))
+    resposta = pool.requisitar('https://buscarlivros?page=2')
+    assert resposta.corpo == b'{}'
+    assert fake_conexao.criadas[0].fechada
+    assert len(fake_conexao.criadas) == 2
+
+
+def test_pool_descarta_conexoes_ociosas_expiradas(fake_conexao):
+    pool = PoolDeConexoes(tempo_ocioso_maximo=30)
+    with patch('colecao.conexoes.time.monotonic', return_value=100):
+        pool.requisitar('https://buscarlivros?page=1')
+    with patch('colecao.conexoes.time.monotonic', return_value=200):
+        pool.requisitar('https://buscarlivros?page=2')
+    assert fake_conexao.criadas[0].fechada
+    assert len(fake_conexao.criadas) == 2
+
+
+def test_pool_respeita_tamanho_maximo(fake_conexao):
+    pool = PoolDeConexoes(tamanho_maximo=1)
+    conexoes = [pool._obter(('https', 'buscarlivros', None))[0] for _ in range(3)]
+    for conexao in conexoes:
+        pool._devolver(('https', 'buscarlivros', None), conexao)
+    assert pool.conexoes_ociosas == 1
+    assert [conexao.fechada for conexao in conexoes] == [True, True, False]
+
+
+def test_pool_nao_devolve_conexao_que_sera_fechada(fake_conexao):
+    pool = PoolDeConexoes()
+    conexao, _ = pool._obter(('https', 'buscarlivros', None))
+    conexao.respostas.append(StubResposta(will_close=True))
+    pool._devolver(('https', 'buscarlivros', None), conexao)
+    pool.requisitar('https://buscarlivros?page=1')
+    assert conexao.fechada
+    assert pool.conexoes_ociosas == 0
+
+
+def test_pool_levanta_http_error_para_status_de_erro(fake_conexao):
+    pool = PoolDeConexoes()
+    conexao, _ = pool._obter(('https', 'buscarlivros', None))
+    conexao.respostas.append(StubResposta(status=404))
+    pool._devolver(('https', 'buscarlivros', None), conexao)
+    with pytest.raises(HTTPError) as excecao:
+        pool.requisitar('https://buscarlivros?page=1')
+    assert excecao.value.code == 404
+
+
+def test_pool_pede_e_descomprime_gzip(fake_conexao):
+    pool = PoolDeConexoes()
+    with patch.object(FakeConexao, 'getresponse',
+                      lambda self: StubResposta(corpo=gzip.compress(b'{"docs": []}'),
+                                                cabecalhos={'Content-Encoding': 'gzip'})):
+        resposta = pool.requisitar('https://buscarlivros?page=1', {'If-None-Match': '"v1"'})
+    assert resposta.corpo == b'{"docs": []}'
+    _, _, cabecalhos = fake_conexao.criadas[0].requisicoes[0]
+    assert cabecalhos == {'Accept-Encoding': 'gzip, deflate', 'If-None-Match': '"v1"'}
+
+
+def test_pool_segue_redirecionamentos_como_urlopen(fake_conexao):
+    pool = PoolDeConexoes()
+    with patch.object(FakeConexao, 'getresponse', side_effect=[
+        StubResposta(301, b'', cabecalhos={'Location': '/livros?q=python'}),
+        StubResposta(307, b'', cabecalhos={'Location': 'https://espelho/livros?q=python'}),
+        StubResposta(corpo=b'{"docs": []}'),
+    ]):
+        resposta = pool.requisitar('https://buscarlivros?q=python')
+    assert resposta.corpo == b'{"docs": []}'
+    # o redirecionamento para o mesmo host reaproveita a conexão
+    assert [(conexao.host, [caminho for _, caminho, _ in conexao.requisicoes])
+            for conexao in fake_conexao.criadas] == [
+        ('buscarlivros', ['/?q=python', '/livros?q=python']),
+        ('espelho', ['/livros?q=python']),
+    ]
+
+
+def test_pool_desiste_de_redirecionamentos_em_ciclo(fake_conexao):
+    pool = PoolDeConexoes()
+    with patch.object(FakeConexao, 'getresponse',
+                      lambda self: StubResposta(302, b'', cabecalhos={'Location': '/?q=python'})):
+        with pytest.raises(HTTPError) as excecao:
+            pool.requisitar('https://buscarlivros?q=python')
+    assert excecao.value.code == 302
+    assert len(fake_conexao.criadas[0].requisicoes) == 11
+
+
+def test_pool_nao_segue_304(fake_conexao):
+    pool = PoolDeConexoes()
+    with patch.object(FakeConexao, 'getresponse',
+                      lambda self: StubResposta(304, b'', cabecalhos={'Location': '/outra'})):
+        with pytest.raises(HTTPError) as excecao:
+            pool.requisitar('https://buscarlivros?q=python', {'If-None-Match': '"v1"'})
+    assert excecao.value.code == 304
@@ -0,0 +1,54 @@
+import pytest
+
+from colecao.deduplicacao import IndiceExato, FiltroDeBloom
+from colecao.livros import Livro
+
+
+DOCUMENTOS = [
+    {'author': 'Luciano Ramalho', 'title': 'Python Fluente'},
+    {'author': 'Allen B. Downey', 'title': 'Pense em Python'},
+    {'author': 'Luciano Ramalho', 'title': 'Python Fluente', 'ano': 2015},
+    {'author': 'Luciano Ramalho'},
+]
+
+
+@pytest.mark.parametrize('criar_indice', [IndiceExato, lambda: FiltroDeBloom(capacidade=100)])
+def test_indice_filtra_documentos_repetidos_nos_campos_escolhidos(criar_indice):
+    indice = criar_indice()
+    assert indice.filtrar(DOCUMENTOS) == [DOCUMENTOS[0], DOCUMENTOS[1], DOCUMENTOS[3]]
+    assert indice.filtrar(DOCUMENTOS) == []
+    assert indice.estatisticas == {'vistos': 8, 'repetidos': 5}
+
+
+def test_indice_exato_reconhece_livro_e_dicionario_iguais():
+    indice = IndiceExato(campos=('title',))
+    assert indice.novo(Livro('Luciano Ramalho', 'Python Fluente'))
+    assert not indice.novo({'title': 'Python Fluente'})
+    assert len(indice) == 1
+
+
+@pytest.mark.parametrize('criar_indice', [
+    lambda caminho: IndiceExato(caminho=caminho),
+    lambda caminho: FiltroDeBloom(capacidade=100, caminho=caminho),
+])
+def test_indice_salvo_e_carregado_na_proxima_execucao(criar_indice, tmp_path):
+    caminho = str(tmp_path / 'indice')
+    indice = criar_indice(caminho)
+    indice.filtrar(DOCUMENTOS[:2])
+    indice.salvar()
+    assert criar_indice(caminho).filtrar(DOCUMENTOS) == [DOCUMENTOS[3]]
+
+
+def test_filtro_de_bloom_dimensionado_pela_capacidade_e_taxa():
+    filtro = FiltroDeBloom(capacidade=1000, taxa_de_falsos_positivos=0.01)
+    assert filtro.bits == 9586
+    assert filtro.funcoes == 7
+    novos = sum(filtro.novo({'author': f'Autor {i}'}) for i in range(1000))
+    assert novos >= 980
+
+
+def test_filtro_de_bloom_recusa_arquivo_com_outros_parametros(tmp_path):
+    caminho = str(tmp_path / 'filtro')
+    FiltroDeBloom(capacidade=100, caminho=caminho).salvar()
+    with pytest.raises(ValueError):
+        FiltroDeBloom(capacidade=1000, caminho=caminho)
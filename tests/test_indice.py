@@ -0,0 +1,67 @@
+from colecao.indice import IndiceInvertido, normalizar
+
+
+DOCUMENTOS = [
+    {'author': 'Luciano Ramalho', 'title': 'Python Fluente'},
+    {'author': 'Nilo Ney', 'title': 'Introdução a Programação com Python'},
+    {'author': 'Allen B. Downey', 'title': 'Pense em Python'},
+    {'author': 'Luciano Ramalho', 'title': 'Python Fluente'},
+]
+
+
+def test_normalizar_remove_acentos_e_maiusculas():
+    assert normalizar('Introdução a PROGRAMAÇÃO') == ['introducao', 'a', 'programacao']
+    assert normalizar(None) == []
+
+
+def test_indice_busca_por_todos_os_termos_do_campo():
+    indice = IndiceInvertido()
+    assert indice.adicionar(DOCUMENTOS) == 3
+    assert indice.buscar('ramalho luciano') == [DOCUMENTOS[0]]
+    assert indice.buscar('python', campo='title') == DOCUMENTOS[:3]
+    assert indice.buscar('introducao python', campo='title') == [DOCUMENTOS[1]]
+    assert indice.buscar('luciano downey') == []
+    assert indice.buscar('') == []
+
+
+def test_indice_busca_por_prefixo_inclui_documentos_novos():
+    indice = IndiceInvertido()
+    indice.adicionar(DOCUMENTOS)
+    assert indice.buscar('progr', campo='title', prefixo=True) == [DOCUMENTOS[1]]
+    novo = {'author': 'Autor', 'title': 'Programando em Python'}
+    indice.adicionar([novo])
+    assert indice.buscar('progr', campo='title', prefixo=True) == [DOCUMENTOS[1], novo]
+
+
+def test_indice_salvo_e_carregado_do_disco(tmp_path):
+    caminho = str(tmp_path / 'indice.bin')
+    indice = IndiceInvertido(caminho)
+    indice.adicionar(DOCUMENTOS)
+    indice.salvar()
+    carregado = IndiceInvertido(caminho)
+    assert len(carregado) == 3
+    assert carregado.buscar('pense', campo='title') == [DOCUMENTOS[2]]
+    assert carregado.adicionar(DOCUMENTOS) == 0
+
+
+def test_indice_adicionar_arquivos_le_paginas_baixadas(tmp_path):
+    arquivo = tmp_path / 'arquivo1.json'
+    arquivo.write_text('{"num_docs": 1, "docs": [{"author": "Wes McKinney", "title": "Python Para Análise de Dados"}]}',
+                       encoding='utf-8')
+    indice = IndiceInvertido()
+    assert indice.adicionar_arquivos([str(arquivo)]) == 1
+    assert indice.buscar('mckinney')[0]['title'] == 'Python Para Análise de Dados'
+
+
+def test_indice_aceita_varios_autores_em_lista(tmp_path):
+    caminho = str(tmp_path / 'indice.bin')
+    documento = {'author': ['Brian W. Kernighan', 'Dennis M. Ritchie'], 'title': 'The C Programming Language'}
+    indice = IndiceInvertido(caminho)
+    assert indice.adicionar([documento, dict(documento)]) == 1
+    assert indice.buscar('ritchie') == [documento]
+    assert indice.buscar('kernighan dennis') == [documento]
+    indice.salvar()
+
+    carregado = IndiceInvertido(caminho)
+    assert carregado.adicionar([documento]) == 0
+    assert carregado.buscar('kern', prefixo=True) == [documento]
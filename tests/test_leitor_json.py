@@ -0,0 +1,83 @@
+import io
+import json
+
+import pytest
+
+from colecao.leitor_json import LeitorIncremental, iterar_documentos, ler_cabecalho, ler_resumo
+
+PAGINA = """
+{
+    "num_docs": 12345,
+    "docs": [
+        {"author": "Luciano Ramalho", "title": "Python Fluente"},
+        {"author": "Nilo Ney", "title": "Introdução a Programação com Python"},
+        {"author": "Allen B. Downey", "title": "Pense em Python", "ano": [2016, 2023]}
+    ],
+    "fim": true
+}
+"""
+
+
+def test_iterar_documentos_gera_os_mesmos_documentos_de_json_loads():
+    assert list(iterar_documentos(PAGINA)) == json.loads(PAGINA)['docs']
+
+
+@pytest.mark.parametrize('tamanho_bloco', [1, 2, 7, 64])
+def test_iterar_documentos_de_bytes_em_blocos_pequenos(tamanho_bloco):
+    cabecalho = {}
+    leitor = LeitorIncremental(PAGINA.encode('utf-8'), tamanho_bloco=tamanho_bloco)
+    assert list(leitor.documentos(cabecalho=cabecalho)) == json.loads(PAGINA)['docs']
+    assert cabecalho == {'num_docs': 12345, 'fim': True}
+
+
+def test_iterar_documentos_de_arquivo_binario():
+    leitor = LeitorIncremental(io.BytesIO(PAGINA.encode('utf-8')), tamanho_bloco=5)
+    assert len(list(leitor.documentos())) == 3
+
+
+def test_iterar_documentos_e_preguicoso():
+    documentos = iterar_documentos('{"docs": [{"title": "A"}, {"title": "B"}, invalido')
+    assert next(documentos) == {'title': 'A'}
+    assert next(documentos) == {'title': 'B'}
+    with pytest.raises(json.JSONDecodeError):
+        next(documentos)
+
+
+def test_ler_resumo_retorna_cabecalho_e_quantidade():
+    assert ler_resumo(PAGINA) == ({'num_docs': 12345, 'fim': True}, 3)
+    assert ler_resumo('{"num_docs": 0, "docs": []}') == ({'num_docs': 0}, 0)
+    assert ler_resumo('{}') == ({}, 0)
+
+
+@pytest.mark.parametrize('tamanho_bloco', [1, 3, 64 * 1024])
+def test_cabecalho_pula_documentos_com_delimitadores_em_strings(tamanho_bloco):
+    pagina = json.dumps({
+        'docs': [{'title': 'A ]}" [{', 'ano': [2016, {'mes': '}'}]}, {'title': '\\'}],
+        'num_docs': 2,
+        'fim': True,
+    })
+    leitor = LeitorIncremental(pagina.encode('utf-8'), tamanho_bloco=tamanho_bloco)
+    assert leitor.cabecalho() == ({'num_docs': 2, 'fim': True}, True)
+
+
+def test_cabecalho_parar_nos_documentos_nao_le_o_restante():
+    # o conteúdo depois do início do array nem chega a ser válido
+    assert ler_cabecalho('{"num_docs": 7, "docs": [{"tit', parar_nos_documentos=True) == ({'num_docs': 7}, True)
+    assert ler_cabecalho('{"num_docs": 0, "docs": [ ]}', parar_nos_documentos=True) == ({'num_docs': 0}, False)
+    assert ler_cabecalho('{}') == ({}, False)
+
+
+PAGINA_COM_NUMEROS = (
+    b'{"max_score": 12.75, "start": -3, "docs": [{"score": -0.5e-3, "ano": 2016}, 1E+10, -7.25], '
+    b'"num_docs": 3, "peso": 6.02e23, "fim": null}'
+)
+
+
+@pytest.mark.parametrize('tamanho_bloco', range(1, len(PAGINA_COM_NUMEROS) + 1))
+def test_leitor_incremental_le_numeros_divididos_entre_blocos(tamanho_bloco):
+    esperado = json.loads(PAGINA_COM_NUMEROS)
+    cabecalho = {}
+    documentos = list(LeitorIncremental(PAGINA_COM_NUMEROS, tamanho_bloco).documentos('docs', cabecalho))
+    assert documentos == esperado.pop('docs')
+    assert cabecalho == esperado
+    assert LeitorIncremental(PAGINA_COM_NUMEROS, tamanho_bloco).cabecalho('docs')[0] == esperado
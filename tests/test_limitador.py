@@ -0,0 +1,106 @@
+import asyncio
+import threading
+import time
+from unittest.mock import Mock, patch
+from urllib.error import HTTPError
+
+import pytest
+
+from colecao.conexoes import RespostaHTTP
+from colecao.limitador import LimitadorDeTaxa, segundos_de_retry_after
+
+
+def erro_http(status, retry_after=None):
+    cabecalhos = {'Retry-After': retry_after} if retry_after else {}
+    return HTTPError('https://buscarlivros', status, 'Limitado', cabecalhos, None)
+
+
+def test_limitador_respeita_requisicoes_por_segundo():
+    limitador = LimitadorDeTaxa(requisicoes_por_segundo=50, rajada=1)
+    inicio = time.monotonic()
+    for _ in range(3):
+        limitador.adquirir()
+        limitador.liberar(200)
+    assert time.monotonic() - inicio >= 0.035
+
+
+def test_limitador_espera_vaga_de_concorrencia():
+    limitador = LimitadorDeTaxa(requisicoes_por_segundo=1000, concorrencia_maxima=1)
+    limitador.adquirir()
+    adquiriu = threading.Event()
+    thread = threading.Thread(target=lambda: (limitador.adquirir(), adquiriu.set()))
+    thread.start()
+    assert not adquiriu.wait(0.1)
+    limitador.liberar(200)
+    assert adquiriu.wait(1)
+    thread.join()
+
+
+def test_limitador_repete_pagina_limitada_e_reduz_limites():
+    limitador = LimitadorDeTaxa(requisicoes_por_segundo=1000, concorrencia_maxima=8)
+    requisitar = Mock(side_effect=[erro_http(429), erro_http(503), RespostaHTTP(200, {}, b'{}')])
+    assert limitador.executar(requisitar).corpo == b'{}'
+    assert requisitar.call_count == 3
+    estatisticas = limitador.estatisticas
+    assert estatisticas['limitacoes'] == 2
+    assert estatisticas['concorrencia'] == 2
+    assert estatisticas['em_andamento'] == 0
+
+
+def test_limitador_desiste_apos_tentativas():
+    limitador = LimitadorDeTaxa(requisicoes_por_segundo=1000, tentativas=2)
+    requisitar = Mock(side_effect=erro_http(429))
+    with pytest.raises(HTTPError):
+        limitador.executar(requisitar)
+    assert requisitar.call_count == 2
+
+
+def test_limitador_nao_repete_outros_erros_http():
+    limitador = LimitadorDeTaxa(requisicoes_por_segundo=1000)
+    requisitar = Mock(side_effect=erro_http(404))
+    with pytest.raises(HTTPError):
+        limitador.executar(requisitar)
+    assert requisitar.call_count == 1
+
+
+def test_limitador_respeita_retry_after():
+    limitador = LimitadorDeTaxa(requisicoes_por_segundo=1000)
+    limitador.adquirir()
+    limitador.liberar(429, '0.1')
+    assert limitador.estatisticas['pausa'] > 0
+    inicio = time.monotonic()
+    limitador.adquirir()
+    assert time.monotonic() - inicio >= 0.09
+
+
+def test_limitador_volta_a_crescer_com_respostas_aceitas():
+    limitador = LimitadorDeTaxa(requisicoes_por_segundo=1000, concorrencia_maxima=4)
+    limitador.adquirir()
+    limitador.liberar(429)
+    assert limitador.estatisticas['concorrencia'] == 2
+    for _ in range(20):
+        limitador.adquirir()
+        limitador.liberar(200)
+    assert limitador.estatisticas['concorrencia'] == 4
+
+
+def test_limitador_executar_async_repete_pagina_limitada():
+    limitador = LimitadorDeTaxa(requisicoes_por_segundo=1000)
+    respostas = [erro_http(429), b'{}']
+
+    async def requisitar():
+        resposta = respostas.pop(0)
+        if isinstance(resposta, Exception):
+            raise resposta
+        return resposta
+
+    assert asyncio.run(limitador.executar_async(requisitar)) == b'{}'
+    assert limitador.estatisticas['limitacoes'] == 1
+
+
+def test_segundos_de_retry_after():
+    assert segundos_de_retry_after(None) == 0
+    assert segundos_de_retry_after('3') == 3
+    assert segundos_de_retry_after('data invalida') == 0
+    with patch('colecao.limitador.time.time', return_value=1445412480):
+        assert segundos_de_retry_after('Wed, 21 Oct 2015 07:28:10 GMT') == 10
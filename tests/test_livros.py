@@ -1,15 +1,36 @@
-from urllib.error import HTTPError
+import asyncio
+import gzip
+import io
+import json
+import time
+from urllib.error import HTTPError, URLError
 
 import pytest
 
 from colecao.livros import consultar_livros, executar_requisicao, escrever_em_arquivo, Consulta, \
-    baixar_livros, Resposta, registrar_livros
-from unittest.mock import patch, mock_open, Mock, MagicMock, call
+    baixar_livros, Resposta, registrar_livros, executar_requisicao_async, baixar_livros_async, \
+    configurar_pool_de_conexoes, configurar_cache_de_respostas, configurar_cache_de_consultas, Livro, \
+    ler_arquivo, SaidaNDJSON, Manifesto, executar_requisicao_condicional, configurar_limitador, \
+    configurar_tentativas, configurar_metricas, registrar_gancho, remover_gancho, remover_ganchos, \
+    configurar_indice_local, baixar_e_registrar_livros, baixar_lote, ler_ndjson
+from colecao.cache import CacheEmDisco, CacheEmMemoria
+from colecao.compressao import ler_corpo
+from colecao.deduplicacao import IndiceExato
+from colecao.indice import IndiceInvertido
+from colecao.conexoes import RespostaHTTP
+from colecao.limitador import LimitadorDeTaxa
+from colecao.metricas import Metricas
+from colecao.tentativas import PoliticaDeTentativas
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch, mock_open, Mock, MagicMock, AsyncMock, call
 from unittest import skip
 
 
 class StubHTTPResponse:
-    def read(self):
+    status = 200
+    headers = {}
+
+    def read(self, tamanho=-1):
         return b''
 
     def __enter__(self):
@@ -766,4 +787,798 @@ def test_registrar_livros_inserir_8_registros_na_base_de_dados(stub_ler_arquivo,
     assert fake_db._registros[0] == {
         'author': 'Luciano Ramalho',
         'title': 'Python Fluente'
-    }
\ No newline at end of file
+    }
+
+def executar_requisicao_por_url(resultados):
+    paginas = {
+        f'https://buscarlivros?q=python&page={pagina}': resultado
+        for pagina, resultado in enumerate(resultados, start=1)
+    }
+
+    def executar_requisicao(url):
+        return paginas[url]
+    return executar_requisicao
+
+
+def test_baixar_livros_com_max_workers_escreve_cada_pagina_no_seu_arquivo(resultado_em_tres_paginas):
+    Resposta.quantidade_documentos_por_pagina = 3
+    arquivo = ['/tmp/arquivo1', '/tmp/arquivo2', '/tmp/arquivo3']
+    with patch('colecao.livros.executar_requisicao', executar_requisicao_por_url(resultado_em_tres_paginas)):
+        with patch('colecao.livros.escrever_em_arquivo') as mock_escrever:
+            baixar_livros(arquivo, None, None, 'python', max_workers=3)
+            assert sorted(mock_escrever.call_args_list) == [
+                call(arquivo[0], resultado_em_tres_paginas[0]),
+                call(arquivo[1], resultado_em_tres_paginas[1]),
+                call(arquivo[2], resultado_em_tres_paginas[2]),
+            ]
+
+
+def test_baixar_livros_com_max_workers_ignora_pagina_com_erro(resultado_em_tres_paginas_erro_na_pagina_2):
+    Resposta.quantidade_documentos_por_pagina = 3
+    arquivo = ['/tmp/arquivo1', '/tmp/arquivo2', '/tmp/arquivo3']
+    with patch('colecao.livros.executar_requisicao',
+               executar_requisicao_por_url(resultado_em_tres_paginas_erro_na_pagina_2)):
+        with patch('colecao.livros.escrever_em_arquivo') as mock_escrever:
+            baixar_livros(arquivo, None, None, 'python', max_workers=2)
+            assert sorted(mock_escrever.call_args_list) == [
+                call(arquivo[0], resultado_em_tres_paginas_erro_na_pagina_2[0]),
+                call(arquivo[2], resultado_em_tres_paginas_erro_na_pagina_2[2]),
+            ]
+
+
+def test_baixar_livros_com_max_workers_usa_pagina_2_quando_pagina_1_falha(resultado_em_tres_paginas_erro_na_pagina_1):
+    Resposta.quantidade_documentos_por_pagina = 3
+    arquivo = ['/tmp/arquivo1', '/tmp/arquivo2', '/tmp/arquivo3']
+    with patch('colecao.livros.executar_requisicao',
+               executar_requisicao_por_url(resultado_em_tres_paginas_erro_na_pagina_1)):
+        with patch('colecao.livros.escrever_em_arquivo') as mock_escrever:
+            baixar_livros(arquivo, None, None, 'python', max_workers=2)
+            assert sorted(mock_escrever.call_args_list) == [
+                call(arquivo[1], resultado_em_tres_paginas_erro_na_pagina_1[1]),
+                call(arquivo[2], resultado_em_tres_paginas_erro_na_pagina_1[2]),
+            ]
+
+
+def duble_open_connection(resposta):
+    escritor = MagicMock()
+    escritor.drain = AsyncMock()
+
+    async def open_connection(host, porta, ssl=None):
+        leitor = asyncio.StreamReader()
+        leitor.feed_data(resposta)
+        leitor.feed_eof()
+        return leitor, escritor
+    return open_connection, escritor
+
+
+def test_executar_requisicao_async_retorna_corpo_com_content_length():
+    open_connection, escritor = duble_open_connection(
+        b'HTTP/1.1 200 OK\r\nContent-Length: 13\r\n\r\n{"docs": []}\n'
+    )
+    with patch('colecao.livros.asyncio.open_connection', open_connection):
+        resultado = asyncio.run(executar_requisicao_async('https://buscarlivros?q=python&page=1'))
+    assert resultado == '{"docs": []}\n'
+    requisicao = escritor.write.call_args[0][0]
+    assert requisicao.startswith(b'GET /?q=python&page=1 HTTP/1.1\r\nHost: buscarlivros\r\n')
+
+
+def test_executar_requisicao_async_retorna_corpo_chunked():
+    open_connection, _ = duble_open_connection(
+        b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n'
+        b'5\r\n{"doc\r\n7\r\ns": []}\r\n0\r\n\r\n'
+    )
+    with patch('colecao.livros.asyncio.open_connection', open_connection):
+        resultado = asyncio.run(executar_requisicao_async('http://buscarlivros/?q=python'))
+    assert resultado == '{"docs": []}'
+
+
+def test_executar_requisicao_async_loga_mensagem_de_erro_http(caplog):
+    open_connection, _ = duble_open_connection(
+        b'HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\n\r\n'
+    )
+    with patch('colecao.livros.asyncio.open_connection', open_connection):
+        resultado = asyncio.run(executar_requisicao_async('http://buscarlivros/?q=python'))
+    assert resultado is None
+    assert len(caplog.records) == 1
+    assert 'Service Unavailable' in caplog.records[0].message
+
+
+def test_baixar_livros_async_escreve_paginas_e_retorna_resultados(resultado_em_tres_paginas_erro_na_pagina_2):
+    Resposta.quantidade_documentos_por_pagina = 3
+    arquivo = ['/tmp/arquivo1', '/tmp/arquivo2', '/tmp/arquivo3']
+    executar_requisicao = executar_requisicao_por_url(resultado_em_tres_paginas_erro_na_pagina_2)
+
+    async def executar_requisicao_async(url):
+        return executar_requisicao(url)
+
+    with patch('colecao.livros.executar_requisicao_async', executar_requisicao_async):
+        with patch('colecao.livros.escrever_em_arquivo') as mock_escrever:
+            resultados = asyncio.run(baixar_livros_async(arquivo, None, None, 'python', max_concorrencia=2))
+            assert resultados == resultado_em_tres_paginas_erro_na_pagina_2
+            assert mock_escrever.call_args_list == [
+                call(arquivo[0], resultado_em_tres_paginas_erro_na_pagina_2[0]),
+                call(arquivo[2], resultado_em_tres_paginas_erro_na_pagina_2[2]),
+            ]
+
+
+def test_baixar_livros_async_loga_timeout_e_erro_de_conexao_por_pagina(resultado_em_tres_paginas, caplog):
+    primeira = resultado_em_tres_paginas[0].encode('utf-8')
+    erros = {'2': asyncio.TimeoutError(), '3': ConnectionResetError('conexão reiniciada')}
+
+    paginas = ['1', '2', '3']
+
+    async def open_connection(host, porta, ssl=None):
+        pagina = paginas.pop(0)
+        leitor = asyncio.StreamReader()
+        leitor.feed_data(b'HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n' % len(primeira) + primeira)
+        leitor.feed_eof()
+        escritor = MagicMock()
+
+        async def drain():
+            if pagina in erros:
+                raise erros[pagina]
+        escritor.drain = drain
+        return leitor, escritor
+
+    arquivo = ['/tmp/arquivo1', '/tmp/arquivo2', '/tmp/arquivo3']
+    with patch.object(Resposta, 'quantidade_documentos_por_pagina', 3), \
+            patch('colecao.livros.asyncio.open_connection', open_connection), \
+            patch('colecao.livros.escrever_em_arquivo') as mock_escrever:
+        resultados = asyncio.run(baixar_livros_async(arquivo, None, None, 'python', max_concorrencia=1))
+    assert resultados == [resultado_em_tres_paginas[0], None, None]
+    assert mock_escrever.call_args_list == [call(arquivo[0], resultado_em_tres_paginas[0])]
+    assert len(caplog.records) == 2
+    assert 'conexão reiniciada' in caplog.records[1].message
+
+
+def test_executar_requisicao_usa_pool_de_conexoes_configurado():
+    pool = Mock()
+    pool.requisitar.return_value = RespostaHTTP(200, {}, '{"docs": []}'.encode('utf-8'))
+    configurar_pool_de_conexoes(pool)
+    try:
+        with patch('colecao.livros.urlopen') as spy_urlopen:
+            resultado = executar_requisicao('https://buscarlivros?q=python&page=1')
+    finally:
+        configurar_pool_de_conexoes(None)
+    assert resultado == '{"docs": []}'
+    pool.requisitar.assert_called_once_with('https://buscarlivros?q=python&page=1', None)
+    spy_urlopen.assert_not_called()
+
+
+@patch('colecao.livros.urlopen', return_value=StubHTTPResponse())
+def test_executar_requisicao_usa_cache_de_respostas_configurado(spy_urlopen, tmp_path):
+    configurar_cache_de_respostas(CacheEmDisco(str(tmp_path)))
+    try:
+        primeiro = executar_requisicao('https://buscarlivros?q=python&page=1')
+        segundo = executar_requisicao('https://buscarlivros?q=python&page=1')
+    finally:
+        configurar_cache_de_respostas(None)
+    assert primeiro == segundo == ''
+    assert spy_urlopen.call_count == 1
+
+
+@patch('colecao.livros.urlopen', return_value=StubHTTPResponse())
+def test_consultar_livros_usa_cache_de_consultas_configurado(stub_urlopen):
+    configurar_cache_de_consultas(CacheEmMemoria())
+    try:
+        with patch('colecao.livros.executar_requisicao', return_value='livros') as spy_executar_requisicao:
+            consultar_livros('Agatha Christie')
+            resultado = consultar_livros('Agatha Christie')
+    finally:
+        configurar_cache_de_consultas(None)
+    assert resultado == 'livros'
+    assert spy_executar_requisicao.call_count == 1
+
+
+def test_resposta_streaming_gera_documentos_e_total_de_paginas(resultado_em_tres_paginas):
+    Resposta.quantidade_documentos_por_pagina = 3
+    resposta = Resposta(resultado_em_tres_paginas[0].encode('utf-8'), streaming=True)
+    assert list(resposta.documentos) == Resposta(resultado_em_tres_paginas[0]).documentos
+    assert resposta.num_docs == 8
+    assert resposta.quantidade_de_documentos == 3
+    assert resposta.total_de_paginas == 3
+
+
+def test_livro_convertido_em_dicionario_e_igual_ao_documento():
+    documento = {'author': 'Luciano Ramalho', 'title': 'Python Fluente', 'ano': 2015}
+    livro = Livro.de_documento(documento)
+    assert dict(livro) == documento
+    assert livro.como_dicionario() == documento
+    assert livro == documento
+    assert not hasattr(livro, '__dict__')
+
+
+def test_livro_sem_titulo_nao_tem_chave_title():
+    assert dict(Livro.de_documento({'author': 'Nilo Ney'})) == {'author': 'Nilo Ney'}
+
+
+def test_resposta_livros_compartilham_autores_repetidos(resultado_em_tres_paginas):
+    livros = Resposta(resultado_em_tres_paginas[0]).livros + Resposta(resultado_em_tres_paginas[1]).livros
+    assert livros[0].author is livros[3].author
+    assert [dict(livro) for livro in livros] == (
+        Resposta(resultado_em_tres_paginas[0]).documentos + Resposta(resultado_em_tres_paginas[1]).documentos
+    )
+
+
+@patch('colecao.livros.ler_arquivo')
+def test_registrar_livros_como_livros_insere_registros_livro(stub_ler_arquivo, resultado_em_tres_paginas):
+    stub_ler_arquivo.side_effect = resultado_em_tres_paginas
+    fake_db = FakeDB()
+    quantidade = registrar_livros(['/tmp/arquivo1', '/tmp/arquivo2', '/tmp/arquivo3'],
+                                  fake_db.inserir_registros, como_livros=True)
+    assert quantidade == 8
+    assert all(isinstance(registro, Livro) for registro in fake_db._registros)
+    assert dict(fake_db._registros[0]) == {
+        'author': 'Luciano Ramalho',
+        'title': 'Python Fluente'
+    }
+
+
+@patch('colecao.livros.ler_arquivo')
+def test_registrar_livros_com_tamanho_lote_agrupa_documentos_dos_arquivos(stub_ler_arquivo, conteudo_de_4_arquivos):
+    stub_ler_arquivo.side_effect = conteudo_de_4_arquivos
+    spy_inserir_registros = Mock(side_effect=fake_inserir_registros)
+    arquivos = ['/tmp/arquivo1', '/tmp/arquivo2', '/tmp/arquivo3', '/tmp/arquivo4']
+    quantidade = registrar_livros(arquivos, spy_inserir_registros, tamanho_lote=4)
+    assert quantidade == 17
+    assert [len(chamada.args[0]) for chamada in spy_inserir_registros.call_args_list] == [4, 4, 4, 4, 1]
+
+
+@patch('colecao.livros.ler_arquivo')
+def test_registrar_livros_com_tamanho_lote_divide_arquivo_grande(stub_ler_arquivo):
+    documentos = [{'author': f'Autor {indice}', 'title': f'Livro {indice}'} for indice in range(20003)]
+    stub_ler_arquivo.side_effect = [
+        json.dumps({'num_docs': 3, 'docs': documentos[:3]}),
+        json.dumps({'num_docs': 20000, 'docs': documentos[3:]}),
+    ]
+    lotes = []
+    quantidade = registrar_livros(['/tmp/arquivo1', '/tmp/arquivo2'], lambda lote: lotes.append(lote) or len(lote),
+                                  tamanho_lote=7)
+    assert quantidade == 20003
+    assert [len(lote) for lote in lotes] == [7] * 2857 + [4]
+    assert [documento for lote in lotes for documento in lote] == documentos
+
+
+def test_registrar_livros_com_processos_nao_le_muito_a_frente_da_insercao(resultado_em_duas_paginas):
+    lidos = []
+    lidos_na_primeira_insercao = []
+
+    def documentos_do_arquivo(arquivo, como_livros=False):
+        lidos.append(arquivo)
+        return Resposta(resultado_em_duas_paginas[0]).documentos
+
+    def inserir_registros(documentos):
+        if not lidos_na_primeira_insercao:
+            time.sleep(0.1)
+            lidos_na_primeira_insercao.append(len(lidos))
+        return len(documentos)
+
+    arquivos = [f'/tmp/arquivo{indice}' for indice in range(200)]
+    with patch('colecao.livros.ProcessPoolExecutor', ThreadPoolExecutor), \
+            patch('colecao.livros._documentos_do_arquivo', documentos_do_arquivo):
+        quantidade = registrar_livros(arquivos, inserir_registros, processos=2)
+    assert quantidade == 600
+    assert len(lidos) == 200
+    # até 2 * processos tarefas de ARQUIVOS_POR_TAREFA arquivos, mais a que substitui a primeira
+    assert lidos_na_primeira_insercao[0] <= 5 * 8
+
+
+def test_registrar_livros_com_processos_insere_na_ordem_dos_arquivos(tmp_path, conteudo_de_4_arquivos):
+    arquivos = []
+    for indice, conteudo in enumerate(conteudo_de_4_arquivos):
+        arquivo = tmp_path / f'arquivo{indice}.json'
+        arquivo.write_text(conteudo)
+        arquivos.append(str(arquivo))
+    fake_db = FakeDB()
+    quantidade = registrar_livros(arquivos, fake_db.inserir_registros, processos=2)
+    assert quantidade == 17
+    assert fake_db._registros == [
+        documento for conteudo in conteudo_de_4_arquivos for documento in Resposta(conteudo).documentos
+    ]
+
+
+def test_ler_arquivo_retorna_bytes(tmp_path, resultado_em_duas_paginas):
+    arquivo = tmp_path / 'arquivo1.json'
+    arquivo.write_text(resultado_em_duas_paginas[0], encoding='utf-8')
+    conteudo = ler_arquivo(str(arquivo))
+    assert conteudo == resultado_em_duas_paginas[0].encode('utf-8')
+    assert len(Resposta(conteudo).documentos) == 3
+
+
+def test_ler_arquivo_registra_erro_e_retorna_vazio(caplog):
+    assert ler_arquivo('/tmp/nao/existe.json') == b''
+    assert caplog.records[0].message == 'Não foi possível ler arquivo /tmp/nao/existe.json'
+
+
+def test_registrar_livros_ignora_arquivo_que_nao_pode_ser_lido(tmp_path, resultado_em_duas_paginas):
+    arquivo = tmp_path / 'arquivo2.json'
+    arquivo.write_text(resultado_em_duas_paginas[1], encoding='utf-8')
+    quantidade = registrar_livros(['/tmp/nao/existe.json', str(arquivo)], fake_inserir_registros)
+    assert quantidade == 2
+
+
+@patch('colecao.livros.executar_requisicao')
+def test_baixar_livros_em_saida_ndjson_grava_um_documento_por_linha(stub_executar_requisicao, tmp_path,
+                                                                    resultado_em_tres_paginas_erro_na_pagina_2):
+    stub_executar_requisicao.side_effect = resultado_em_tres_paginas_erro_na_pagina_2
+    Resposta.quantidade_documentos_por_pagina = 3
+    with SaidaNDJSON(str(tmp_path / 'livros.ndjson')) as saida:
+        baixar_livros(saida, None, None, 'python')
+    assert saida.arquivos == [str(tmp_path / 'livros.ndjson')]
+    linhas = (tmp_path / 'livros.ndjson').read_text(encoding='utf-8').splitlines()
+    assert [json.loads(linha) for linha in linhas] == (
+        Resposta(resultado_em_tres_paginas_erro_na_pagina_2[0]).documentos
+        + Resposta(resultado_em_tres_paginas_erro_na_pagina_2[2]).documentos
+    )
+
+
+def test_saida_ndjson_divide_em_segmentos_pelo_tamanho_maximo(tmp_path):
+    documento = {'author': 'Luciano Ramalho', 'title': 'Python Fluente'}
+    tamanho_linha = len(json.dumps(documento)) + 1
+    with SaidaNDJSON(str(tmp_path / 'livros.ndjson'), tamanho_maximo=2 * tamanho_linha) as saida:
+        for _ in range(5):
+            saida.gravar([documento])
+    assert saida.arquivos == [
+        str(tmp_path / 'livros.00000.ndjson'),
+        str(tmp_path / 'livros.00001.ndjson'),
+        str(tmp_path / 'livros.00002.ndjson'),
+    ]
+    assert [len(open(arquivo).readlines()) for arquivo in saida.arquivos] == [2, 2, 1]
+
+
+@pytest.mark.parametrize('tamanho_maximo', [None, 200])
+def test_saida_ndjson_continua_gravacao_interrompida_sem_perder_documentos(tmp_path, tamanho_maximo):
+    documentos = [{'author': f'Autor {indice}', 'title': f'Livro {indice}'} for indice in range(6)]
+    caminho = str(tmp_path / 'livros.ndjson')
+    with SaidaNDJSON(caminho, tamanho_maximo) as saida:
+        saida.gravar(documentos[:3])
+    # gravação interrompida no meio de uma linha
+    with open(saida.arquivos[-1], 'ab') as arquivo:
+        arquivo.write(b'{"author": "Autor 3", "ti')
+    with SaidaNDJSON(caminho, tamanho_maximo) as retomada:
+        retomada.gravar(documentos[3:])
+    assert retomada.arquivos[:len(saida.arquivos)] == saida.arquivos
+    if tamanho_maximo:
+        assert len(retomada.arquivos) > len(saida.arquivos)
+    assert list(ler_ndjson(retomada.arquivos)) == documentos
+
+
+def test_registrar_livros_formato_ndjson_insere_em_lotes(tmp_path, conteudo_de_4_arquivos):
+    with SaidaNDJSON(str(tmp_path / 'livros.ndjson'), tamanho_maximo=1000) as saida:
+        for conteudo in conteudo_de_4_arquivos:
+            saida.gravar(Resposta(conteudo).documentos)
+    spy_inserir_registros = Mock(side_effect=fake_inserir_registros)
+    quantidade = registrar_livros(saida.arquivos, spy_inserir_registros, tamanho_lote=10, formato='ndjson')
+    assert len(saida.arquivos) > 1
+    assert quantidade == 17
+    assert [len(chamada.args[0]) for chamada in spy_inserir_registros.call_args_list] == [10, 7]
+    assert spy_inserir_registros.call_args_list[0].args[0][0] == {
+        'author': 'Luciano Ramalho',
+        'title': 'Python Fluente'
+    }
+
+
+def respostas_condicionais_por_url(resultados, etag='"v1"'):
+    executar_requisicao = executar_requisicao_por_url(resultados)
+
+    def executar_requisicao_condicional(url, etag_anterior=None, modificado_em=None):
+        if etag_anterior == etag:
+            return RespostaHTTP(304, {}, None)
+        resultado = executar_requisicao(url)
+        if resultado:
+            return RespostaHTTP(200, {'ETag': etag}, resultado)
+    return Mock(side_effect=executar_requisicao_condicional)
+
+
+def test_baixar_livros_retomar_baixa_so_as_paginas_que_faltaram(tmp_path, resultado_em_tres_paginas,
+                                                                 resultado_em_tres_paginas_erro_na_pagina_2):
+    Resposta.quantidade_documentos_por_pagina = 3
+    arquivo = [str(tmp_path / f'arquivo{pagina}.json') for pagina in range(1, 4)]
+    with patch('colecao.livros.executar_requisicao_condicional',
+               respostas_condicionais_por_url(resultado_em_tres_paginas_erro_na_pagina_2)):
+        baixar_livros(arquivo, None, None, 'python', retomar=True)
+
+    with patch('colecao.livros.executar_requisicao_condicional',
+               respostas_condicionais_por_url(resultado_em_tres_paginas)) as spy_requisicao:
+        baixar_livros(arquivo, None, None, 'python', retomar=True)
+        assert spy_requisicao.call_args_list == [call('https://buscarlivros?q=python&page=2')]
+    assert [open(nome).read() for nome in arquivo] == resultado_em_tres_paginas
+    assert Manifesto(str(tmp_path / Manifesto.nome)).obter('https://buscarlivros?q=python&page=3')['etag'] == '"v1"'
+
+
+def test_baixar_livros_retomar_refaz_pagina_alterada_no_disco(tmp_path, resultado_em_duas_paginas):
+    Resposta.quantidade_documentos_por_pagina = 3
+    arquivo = [str(tmp_path / 'arquivo1.json'), str(tmp_path / 'arquivo2.json')]
+    with patch('colecao.livros.executar_requisicao_condicional',
+               respostas_condicionais_por_url(resultado_em_duas_paginas)):
+        baixar_livros(arquivo, None, None, 'python', retomar=True)
+    with open(arquivo[1], 'w') as arquivo_alterado:
+        arquivo_alterado.write('truncado')
+
+    with patch('colecao.livros.executar_requisicao_condicional',
+               respostas_condicionais_por_url(resultado_em_duas_paginas)) as spy_requisicao:
+        baixar_livros(arquivo, None, None, 'python', retomar=True, max_workers=2)
+        assert spy_requisicao.call_args_list == [call('https://buscarlivros?q=python&page=2')]
+    assert open(arquivo[1]).read() == resultado_em_duas_paginas[1]
+
+
+def test_baixar_livros_revalidar_envia_etag_e_mantem_paginas_nao_modificadas(tmp_path, resultado_em_duas_paginas):
+    Resposta.quantidade_documentos_por_pagina = 3
+    arquivo = [str(tmp_path / 'arquivo1.json'), str(tmp_path / 'arquivo2.json')]
+    with patch('colecao.livros.executar_requisicao_condicional',
+               respostas_condicionais_por_url(resultado_em_duas_paginas)):
+        baixar_livros(arquivo, None, None, 'python', retomar=True)
+
+    with patch('colecao.livros.executar_requisicao_condicional',
+               respostas_condicionais_por_url(resultado_em_duas_paginas)) as spy_requisicao:
+        with patch('colecao.livros.escrever_em_arquivo') as spy_escrever:
+            baixar_livros(arquivo, None, None, 'python', retomar=True, revalidar=True)
+            spy_escrever.assert_not_called()
+        assert spy_requisicao.call_args_list == [
+            call('https://buscarlivros?q=python&page=1', '"v1"', None),
+            call('https://buscarlivros?q=python&page=2', '"v1"', None),
+        ]
+
+
+def test_executar_requisicao_condicional_envia_cabecalhos_e_trata_304():
+    fp = mock_open
+    fp.close = Mock()
+    with patch('colecao.livros.urlopen') as stub_urlopen:
+        stub_urlopen.side_effect = HTTPError(Mock(), 304, 'Not Modified', {'ETag': '"v1"'}, fp)
+        resposta = executar_requisicao_condicional('https://buscarlivros?page=1', '"v1"',
+                                                   'Wed, 21 Oct 2015 07:28:00 GMT')
+        requisicao = stub_urlopen.call_args.args[0]
+    assert resposta.status == 304
+    assert resposta.corpo is None
+    assert requisicao.get_header('If-none-match') == '"v1"'
+    assert requisicao.get_header('If-modified-since') == 'Wed, 21 Oct 2015 07:28:00 GMT'
+
+
+def test_executar_requisicao_com_limitador_nao_perde_pagina_limitada():
+    configurar_limitador(LimitadorDeTaxa(requisicoes_por_segundo=1000))
+    try:
+        with patch('colecao.livros.urlopen') as stub_urlopen:
+            stub_urlopen.side_effect = [
+                HTTPError('https://buscarlivros', 429, 'Too Many Requests', {'Retry-After': '0'}, None),
+                StubHTTPResponse(),
+            ]
+            resultado = executar_requisicao('https://buscarlivros?q=python&page=1')
+    finally:
+        configurar_limitador(None)
+    assert resultado == ''
+    assert stub_urlopen.call_count == 2
+
+
+@patch('colecao.tentativas.time.sleep')
+def test_executar_requisicao_com_tentativas_repete_erro_transitorio(spy_sleep):
+    configurar_tentativas(PoliticaDeTentativas(tentativas=3))
+    try:
+        with patch('colecao.livros.urlopen') as stub_urlopen:
+            stub_urlopen.side_effect = [URLError(ConnectionResetError()), StubHTTPResponse()]
+            resultado = executar_requisicao('https://buscarlivros?q=python&page=1')
+    finally:
+        configurar_tentativas(None)
+    assert resultado == ''
+    assert stub_urlopen.call_count == 2
+
+
+def test_metricas_configuradas_medem_todos_os_estagios(tmp_path, resultado_em_duas_paginas):
+    metricas = Metricas()
+    configurar_metricas(metricas)
+    try:
+        with patch('colecao.livros.urlopen', return_value=StubHTTPResponse()):
+            executar_requisicao('https://buscarlivros?q=python&page=1')
+        arquivo = str(tmp_path / 'arquivo1.json')
+        escrever_em_arquivo(arquivo, resultado_em_duas_paginas[0])
+        registrar_livros([arquivo], fake_inserir_registros)
+    finally:
+        configurar_metricas(None)
+    retrato = metricas.retrato()
+    assert sorted(retrato) == ['analise', 'escrita', 'insercao', 'requisicao']
+    assert retrato['requisicao']['quantidade'] == 0
+    assert retrato['escrita']['quantidade'] == len(resultado_em_duas_paginas[0])
+    assert retrato['insercao']['quantidade'] == 3
+
+
+def test_metricas_medem_cada_tentativa_sem_as_esperas():
+    metricas = Metricas()
+    configurar_metricas(metricas)
+    configurar_tentativas(PoliticaDeTentativas(tentativas=2, espera_base=0.05))
+    try:
+        with patch('colecao.livros.urlopen', side_effect=[URLError('recusada'), StubHTTPResponse()]), \
+                patch('colecao.tentativas.random.uniform', side_effect=lambda inicio, fim: fim):
+            executar_requisicao('https://buscarlivros?q=python&page=1')
+    finally:
+        configurar_tentativas(None)
+        configurar_metricas(None)
+    requisicao = metricas.retrato()['requisicao']
+    assert requisicao['chamadas'] == 2
+    assert requisicao['erros'] == 1
+    assert requisicao['latencia']['soma'] < 0.05
+
+
+def test_ganchos_sao_chamados_antes_e_depois_do_estagio(tmp_path, resultado_em_duas_paginas):
+    chamadas = []
+    gancho = registrar_gancho('escrita', antes=chamadas.append,
+                              depois=lambda estagio, duracao, erro: chamadas.append((estagio, erro)))
+    registrar_gancho('requisicao', depois=lambda estagio, duracao, erro: chamadas.append((estagio, erro)))
+    try:
+        escrever_em_arquivo(str(tmp_path / 'arquivo1.json'), resultado_em_duas_paginas[0])
+        with patch('colecao.livros.urlopen', side_effect=HTTPError('url', 500, 'erro', None, None)):
+            executar_requisicao('https://buscarlivros?q=python&page=1')
+        remover_gancho(gancho)
+        escrever_em_arquivo(str(tmp_path / 'arquivo2.json'), resultado_em_duas_paginas[1])
+    finally:
+        remover_ganchos()
+    assert chamadas == ['escrita', ('escrita', False), ('requisicao', True)]
+
+
+def test_registrar_gancho_rejeita_estagio_desconhecido():
+    with pytest.raises(ValueError):
+        registrar_gancho('download')
+
+
+@patch('colecao.livros.ler_arquivo')
+def test_registrar_livros_com_deduplicacao_descarta_documentos_repetidos(stub_ler_arquivo, resultado_em_tres_paginas,
+                                                                          tmp_path):
+    stub_ler_arquivo.side_effect = resultado_em_tres_paginas
+    fake_db = FakeDB()
+    indice = IndiceExato(caminho=str(tmp_path / 'indice'))
+    quantidade = registrar_livros(['arquivo1', 'arquivo2', 'arquivo3'], fake_db.inserir_registros,
+                                  deduplicacao=indice)
+    assert quantidade == 5
+    assert indice.estatisticas == {'vistos': 8, 'repetidos': 3}
+
+    # uma nova execução com o índice salvo não insere nada
+    stub_ler_arquivo.side_effect = resultado_em_tres_paginas
+    inserir_registros = Mock(return_value=0)
+    quantidade = registrar_livros(['arquivo1', 'arquivo2', 'arquivo3'], inserir_registros,
+                                  deduplicacao=IndiceExato(caminho=str(tmp_path / 'indice')))
+    assert quantidade == 0
+    inserir_registros.assert_not_called()
+
+
+def test_consultar_livros_responde_pelo_indice_local_e_so_vai_ao_buscador_na_falta(resultado_em_tres_paginas):
+    indice = IndiceInvertido()
+    indice.adicionar(json.loads(resultado_em_tres_paginas[2])['docs'])
+    configurar_indice_local(indice)
+    try:
+        with patch('colecao.livros.executar_requisicao', return_value=resultado_em_tres_paginas[0]) as requisicao:
+            local = json.loads(consultar_livros('Wes McKinney'))
+            requisicao.assert_not_called()
+            remoto = consultar_livros('Luciano Ramalho')
+            requisicao.assert_called_once_with('https://buscador?autor=Luciano+Ramalho')
+            consultar_livros('Luciano Ramalho')
+            requisicao.assert_called_once()
+    finally:
+        configurar_indice_local(None)
+    assert local == {'num_docs': 1, 'docs': [{'author': 'Wes McKinney', 'title': 'Python Para Análise de Dados'}]}
+    assert remoto == resultado_em_tres_paginas[0]
+
+
+def test_resposta_interpreta_conteudo_uma_unica_vez_mesmo_vazio():
+    resposta = Resposta('{}')
+    with patch('colecao.livros.json.loads', wraps=json.loads) as spy_loads:
+        assert resposta.dados == {}
+        assert resposta.documentos == []
+        assert resposta.total_de_paginas == 0
+    spy_loads.assert_called_once()
+
+
+def test_resposta_total_de_paginas_nao_decodifica_documentos(resultado_em_tres_paginas):
+    resposta = Resposta(resultado_em_tres_paginas[0])
+    with patch('colecao.livros.json.loads') as spy_loads, \
+            patch.object(Resposta, 'quantidade_documentos_por_pagina', 3):
+        assert resposta.num_docs == 8
+        assert resposta.total_de_paginas == 3
+    spy_loads.assert_not_called()
+
+
+def test_resposta_sem_documentos_nao_decodifica_para_contar():
+    resposta = Resposta('{"num_docs": 0, "docs": [], "start": 0}')
+    with patch('colecao.livros.json.loads') as spy_loads:
+        assert resposta.quantidade_de_documentos == 0
+        assert resposta.total_de_paginas == 0
+    spy_loads.assert_not_called()
+
+
+def test_resposta_total_de_paginas_com_num_docs_depois_dos_documentos():
+    resposta = Resposta('{"docs": [{"title": "A"}, {"title": "B"}], "num_docs": 4}')
+    with patch.object(Resposta, 'quantidade_documentos_por_pagina', 2):
+        assert resposta.total_de_paginas == 2
+    assert resposta.quantidade_de_documentos == 2
+
+
+def test_resposta_invalida_registra_erro_uma_vez(caplog):
+    resposta = Resposta('{"num_docs": invalido')
+    assert resposta.total_de_paginas == 0
+    assert resposta.num_docs == 0
+    assert resposta.documentos == []
+    assert caplog.text.count('JSON inválido') == 1
+
+
+def test_baixar_e_registrar_livros_insere_documentos_sem_gravar_arquivos(resultado_em_tres_paginas_erro_na_pagina_2):
+    Resposta.quantidade_documentos_por_pagina = 3
+    fake_db = FakeDB()
+    with patch('colecao.livros.executar_requisicao',
+               executar_requisicao_por_url(resultado_em_tres_paginas_erro_na_pagina_2)), \
+            patch('colecao.livros.escrever_em_arquivo') as mock_escrever:
+        quantidade = baixar_e_registrar_livros(fake_db.inserir_registros, livre='python',
+                                               trabalhadores={'requisicao': 2, 'analise': 2})
+    assert quantidade == 5
+    assert sorted(registro['author'] for registro in fake_db._registros) == [
+        'Allen B. Downey', 'Kenneth Reitz', 'Luciano Ramalho', 'Nilo Ney', 'Wes McKinney',
+    ]
+    mock_escrever.assert_not_called()
+
+
+def test_baixar_e_registrar_livros_grava_paginas_e_deduplica(resultado_em_tres_paginas):
+    Resposta.quantidade_documentos_por_pagina = 3
+    arquivo = ['/tmp/arquivo1', '/tmp/arquivo2', '/tmp/arquivo3']
+    inserir_registros = Mock(side_effect=len)
+    with patch('colecao.livros.executar_requisicao', executar_requisicao_por_url(resultado_em_tres_paginas)), \
+            patch('colecao.livros.escrever_em_arquivo') as mock_escrever:
+        quantidade = baixar_e_registrar_livros(inserir_registros, livre='python', arquivo=arquivo, como_livros=True,
+                                               tamanho_lote=10, deduplicacao=IndiceExato())
+    assert quantidade == 5
+    lote, = inserir_registros.call_args.args
+    assert all(isinstance(livro, Livro) for livro in lote)
+    assert sorted(mock_escrever.call_args_list) == [
+        call(arquivo[indice], resultado) for indice, resultado in enumerate(resultado_em_tres_paginas)
+    ]
+
+
+def test_baixar_e_registrar_livros_propaga_erro_de_insercao_sem_travar(resultado_em_tres_paginas):
+    paginas = [resultado_em_tres_paginas[0]] * 50
+    inserir_registros = Mock(side_effect=RuntimeError('base indisponível'))
+    # 8 documentos em páginas de 0,16: 50 páginas
+    with patch('colecao.livros.executar_requisicao', executar_requisicao_por_url(paginas)), \
+            patch.object(Resposta, 'quantidade_documentos_por_pagina', 0.16):
+        with pytest.raises(RuntimeError):
+            baixar_e_registrar_livros(inserir_registros, livre='python', tamanho_fila=1)
+    inserir_registros.assert_called_once()
+
+
+def test_baixar_lote_intercala_paginas_das_consultas(resultado_em_tres_paginas, resultado_em_duas_paginas):
+    paginas = {
+        **{f'https://buscarlivros?q=grande&page={pagina}': resultado_em_tres_paginas[0] for pagina in range(1, 7)},
+        'https://buscarlivros?q=pequena&page=1': resultado_em_duas_paginas[0],
+        'https://buscarlivros?q=pequena&page=2': resultado_em_duas_paginas[1],
+        'https://buscarlivros?q=pequena&page=3': None,
+        'https://buscarlivros?q=pequena&page=4': None,
+    }
+    pedidas = []
+
+    def executar_requisicao(url):
+        pedidas.append(url)
+        return paginas[url]
+
+    arquivos_grande = [f'/tmp/grande{pagina}' for pagina in range(1, 7)]
+    arquivos_pequena = ['/tmp/pequena1', '/tmp/pequena2', '/tmp/pequena3', '/tmp/pequena4']
+    andamento = []
+    with patch('colecao.livros.executar_requisicao', executar_requisicao), \
+            patch('colecao.livros.escrever_em_arquivo') as mock_escrever, \
+            patch.object(Resposta, 'quantidade_documentos_por_pagina', 1.4):
+        # 8 documentos em páginas de 1,4: 6 páginas; 5 documentos: 4 páginas, das quais só 2 existem
+        progressos = baixar_lote(
+            [(arquivos_grande, Consulta(livre='grande')), (arquivos_pequena, Consulta(livre='pequena'))],
+            max_workers=1,
+            progresso=lambda indice, progresso: andamento.append((indice, progresso.concluida)),
+        )
+    # com uma única vaga, as consultas se alternam até a pequena acabar
+    assert [url.split('q=')[1].split('&')[0] for url in pedidas] == ['grande', 'pequena'] * 4 + ['grande'] * 2
+    assert progressos[0].paginas_baixadas == 6
+    assert progressos[1].paginas_baixadas == 2
+    assert progressos[1].paginas_com_erro == 2
+    assert all(progresso.concluida for progresso in progressos)
+    assert andamento[-1] == (0, True)
+    assert mock_escrever.call_count == 8
+
+
+def test_baixar_lote_usa_segunda_pagina_quando_primeira_falha(resultado_em_tres_paginas_erro_na_pagina_1):
+    Resposta.quantidade_documentos_por_pagina = 3
+    arquivo = ['/tmp/arquivo1', '/tmp/arquivo2', '/tmp/arquivo3']
+    with patch('colecao.livros.executar_requisicao',
+               executar_requisicao_por_url(resultado_em_tres_paginas_erro_na_pagina_1)), \
+            patch('colecao.livros.escrever_em_arquivo'):
+        progresso, = baixar_lote([(arquivo, Consulta(livre='python'))], max_workers=4)
+    assert progresso.total_de_paginas == 3
+    assert (progresso.paginas_baixadas, progresso.paginas_com_erro, progresso.concluida) == (2, 1, True)
+
+
+def test_baixar_lote_registra_falha_de_pagina_e_continua(resultado_em_tres_paginas, caplog):
+    paginas = {
+        'https://buscarlivros?q=quebrada&page=1': resultado_em_tres_paginas[0],
+        'https://buscarlivros?q=quebrada&page=2': resultado_em_tres_paginas[1],
+        'https://buscarlivros?q=quebrada&page=3': resultado_em_tres_paginas[2],
+        'https://buscarlivros?q=python&page=1': resultado_em_tres_paginas[0],
+        'https://buscarlivros?q=python&page=2': resultado_em_tres_paginas[1],
+        'https://buscarlivros?q=python&page=3': resultado_em_tres_paginas[2],
+    }
+
+    def escrever_em_arquivo(arquivo, resultado):
+        if arquivo.startswith('/tmp/quebrada'):
+            raise OSError('disco cheio')
+
+    def executar_requisicao(url):
+        return paginas[url]
+
+    arquivos_quebrada = ['/tmp/quebrada1', '/tmp/quebrada2', '/tmp/quebrada3']
+    arquivos_python = ['/tmp/python1', '/tmp/python2', '/tmp/python3']
+    with patch('colecao.livros.executar_requisicao', executar_requisicao), \
+            patch('colecao.livros.escrever_em_arquivo', escrever_em_arquivo), \
+            patch.object(Resposta, 'quantidade_documentos_por_pagina', 3):
+        quebrada, python = baixar_lote(
+            [(arquivos_quebrada, Consulta(livre='quebrada')), (arquivos_python, Consulta(livre='python'))],
+            max_workers=2,
+        )
+    # a primeira e a segunda página da consulta quebrada falham e ela desiste, como no download sequencial
+    assert (quebrada.paginas_baixadas, quebrada.paginas_com_erro, quebrada.concluida) == (0, 2, True)
+    assert (python.paginas_baixadas, python.paginas_com_erro, python.concluida) == (3, 0, True)
+    assert 'disco cheio' in caplog.text
+
+
+def test_baixar_lote_rejeita_pesos_invalidos():
+    with pytest.raises(ValueError):
+        baixar_lote([([], Consulta(livre='python'))], pesos=[0])
+
+
+class StubRespostaGzip(io.BytesIO):
+    status = 200
+
+    def __init__(self, corpo):
+        comprimido = gzip.compress(corpo)
+        super().__init__(comprimido)
+        self.headers = {'Content-Encoding': 'gzip', 'Content-Length': str(len(comprimido))}
+
+
+def test_executar_requisicao_pede_gzip_e_descomprime(resultado_em_tres_paginas):
+    with patch('colecao.livros.urlopen', return_value=StubRespostaGzip(resultado_em_tres_paginas[0].encode())) \
+            as spy_urlopen:
+        resultado = executar_requisicao('https://buscarlivros?q=python&page=1')
+    assert resultado == resultado_em_tres_paginas[0]
+    requisicao = spy_urlopen.call_args.args[0]
+    assert requisicao.get_header('Accept-encoding') == 'gzip, deflate'
+
+
+def test_executar_requisicao_recusa_corpo_maior_que_o_maximo(caplog):
+    with patch('colecao.livros.urlopen', return_value=StubRespostaGzip(b'0' * 100_000)), \
+            patch('colecao.livros.ler_corpo', lambda resposta: ler_corpo(resposta, 1000)):
+        resultado = executar_requisicao('https://buscarlivros?q=python&page=1')
+    assert resultado is None
+    assert 'Corpo com mais de 1000 bytes' in caplog.text
+
+
+def test_executar_requisicao_async_descomprime_gzip_chunked():
+    comprimido = gzip.compress(b'{"docs": []}')
+    open_connection, escritor = duble_open_connection(
+        b'HTTP/1.1 200 OK\r\nContent-Encoding: gzip\r\nTransfer-Encoding: chunked\r\n\r\n'
+        + b'%x\r\n' % 10 + comprimido[:10] + b'\r\n'
+        + b'%x\r\n' % (len(comprimido) - 10) + comprimido[10:] + b'\r\n0\r\n\r\n'
+    )
+    with patch('colecao.livros.asyncio.open_connection', open_connection):
+        resultado = asyncio.run(executar_requisicao_async('http://buscarlivros/?q=python'))
+    assert resultado == '{"docs": []}'
+    assert b'Accept-Encoding: gzip, deflate\r\n' in escritor.write.call_args[0][0]
+
+
+def test_baixar_livros_recusa_retomar_com_saida_ndjson(tmp_path):
+    with SaidaNDJSON(str(tmp_path / 'livros.ndjson')) as saida, \
+            patch('colecao.livros.executar_requisicao') as spy_executar_requisicao:
+        with pytest.raises(ValueError, match='SaidaNDJSON'):
+            baixar_livros(saida, None, None, 'python', retomar=True)
+    spy_executar_requisicao.assert_not_called()
+
+
+def test_registrar_livros_formato_ndjson_pula_linha_incompleta(tmp_path, caplog):
+    arquivo = tmp_path / 'livros.ndjson'
+    arquivo.write_bytes(
+        b'{"author": "Luciano Ramalho", "title": "Python Fluente"}\n'
+        b'{"author": "Nilo Ney", "title": "Introdu\xc3'
+    )
+    spy_inserir_registros = Mock(side_effect=fake_inserir_registros)
+    quantidade = registrar_livros([str(arquivo)], spy_inserir_registros, formato='ndjson')
+    assert quantidade == 1
+    assert spy_inserir_registros.call_args.args[0] == [{'author': 'Luciano Ramalho', 'title': 'Python Fluente'}]
+    assert len(caplog.records) == 1
+    assert 'Linha 2 inválida' in caplog.records[0].message
@@ -0,0 +1,50 @@
+import json
+
+from colecao.metricas import Histograma, Metricas
+
+
+def test_histograma_conta_valores_por_bucket():
+    histograma = Histograma((1, 10))
+    for valor in (0.5, 1, 5, 50):
+        histograma.observar(valor)
+    assert histograma.como_dicionario() == {
+        'limites': [1, 10],
+        'contagens': [2, 1, 1],
+        'soma': 56.5,
+        'quantidade': 4,
+    }
+
+
+def test_metricas_observar_registra_latencia_quantidade_e_erros():
+    metricas = Metricas()
+    metricas.observar('insercao', 0.01, 50)
+    metricas.observar('insercao', 0.02, 10, erro=True)
+    metricas.observar('requisicao', 0.1, 2048)
+    retrato = metricas.retrato()
+    assert retrato['insercao']['chamadas'] == 2
+    assert retrato['insercao']['erros'] == 1
+    assert retrato['insercao']['quantidade'] == 60
+    assert retrato['insercao']['latencia']['quantidade'] == 2
+    assert retrato['requisicao']['quantidade'] == 2048
+
+
+def test_metricas_texto_prometheus_tem_buckets_acumulados():
+    metricas = Metricas()
+    metricas.observar('analise', 0.003)
+    metricas.observar('analise', 20)
+    texto = metricas.texto_prometheus()
+    assert '# TYPE colecao_latencia_segundos histogram' in texto
+    assert 'colecao_chamadas_total{estagio="analise"} 2' in texto
+    assert 'colecao_latencia_segundos_bucket{estagio="analise",le="0.005"} 1' in texto
+    assert 'colecao_latencia_segundos_bucket{estagio="analise",le="10"} 1' in texto
+    assert 'colecao_latencia_segundos_bucket{estagio="analise",le="+Inf"} 2' in texto
+    assert 'colecao_latencia_segundos_count{estagio="analise"} 2' in texto
+
+
+def test_metricas_exporta_json_e_prometheus(tmp_path):
+    metricas = Metricas()
+    metricas.observar('escrita', 0.01, 100)
+    metricas.exportar_json(str(tmp_path / 'metricas.json'))
+    metricas.exportar_prometheus(str(tmp_path / 'metricas.prom'))
+    assert json.loads((tmp_path / 'metricas.json').read_text())['escrita']['quantidade'] == 100
+    assert 'colecao_quantidade_total{estagio="escrita"} 100' in (tmp_path / 'metricas.prom').read_text()
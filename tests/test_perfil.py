@@ -0,0 +1,81 @@
+import asyncio
+import pstats
+
+from colecao import livros
+from colecao.livros import Resposta
+from colecao.perfil import PerfilCProfile, PerfilTracemalloc
+
+
+CONTEUDO = '{"num_docs": 2, "docs": [{"author": "Luciano Ramalho", "title": "Python Fluente"}]}'
+
+
+def test_perfil_cprofile_grava_perfil_por_estagio(tmp_path):
+    with PerfilCProfile(str(tmp_path), amostragem=1) as perfil:
+        Resposta(CONTEUDO).dados
+    assert perfil.amostras == {'analise': 1}
+    estatisticas = pstats.Stats(str(tmp_path / 'analise.prof'))
+    assert any(funcao == 'loads' for _, _, funcao in estatisticas.stats)
+    assert 'loads' in (tmp_path / 'analise.txt').read_text()
+
+
+def test_perfil_sem_amostragem_nao_grava_nada(tmp_path):
+    with PerfilCProfile(str(tmp_path), amostragem=0) as perfil:
+        Resposta(CONTEUDO).dados
+    assert perfil.amostras == {}
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_perfil_remove_seus_ganchos(tmp_path):
+    perfil = PerfilTracemalloc(str(tmp_path)).registrar(['analise'])
+    perfil.remover()
+    assert livros._ganchos == {}
+
+
+def test_perfil_tracemalloc_grava_maiores_alocacoes(tmp_path):
+    conteudo = '{"docs": [%s]}' % ', '.join(['{"author": "Autor %d"}' % i for i in range(1000)])
+    with PerfilTracemalloc(str(tmp_path), amostragem=1, top=3) as perfil:
+        resposta = Resposta(conteudo)
+        resposta.dados
+    assert perfil.amostras == {'analise': 1}
+    assert len(perfil.maiores_alocacoes('analise')) <= 3
+    linhas = (tmp_path / 'analise.alocacoes.txt').read_text().splitlines()
+    assert linhas[0] == '# analise: 1 amostras'
+    assert len(linhas) > 1
+
+
+def test_perfil_separa_as_pilhas_das_tarefas_do_asyncio(tmp_path):
+    finalizadas_por = []
+
+    async def baixar(nome, espera):
+        with livros._estagio('requisicao'):
+            await asyncio.sleep(espera)
+
+    async def executar():
+        primeira = asyncio.create_task(baixar('primeira', 0.01), name='primeira')
+        await asyncio.sleep(0)
+        await asyncio.gather(primeira, asyncio.create_task(baixar('segunda', 0.05), name='segunda'))
+
+    with PerfilCProfile(str(tmp_path), amostragem=1) as perfil:
+        finalizar = perfil._finalizar
+
+        def espiar_finalizar(estagio, estado):
+            finalizadas_por.append(asyncio.current_task().get_name())
+            finalizar(estagio, estado)
+
+        perfil._finalizar = espiar_finalizar
+        asyncio.run(executar())
+    # a amostra da primeira tarefa termina com ela, e não quando a segunda sai do estágio
+    assert finalizadas_por == ['primeira']
+    assert perfil.amostras == {'requisicao': 1}
+
+
+def test_erro_de_gancho_nao_interrompe_o_estagio(tmp_path, caplog):
+    # perfil registrado com o estágio em andamento: a saída chega sem a entrada
+    PerfilCProfile(str(tmp_path), amostragem=1)._depois('analise', 0.1, False)
+    gancho = livros.registrar_gancho('analise', antes=lambda estagio: 1 / 0)
+    try:
+        assert Resposta(CONTEUDO).num_docs == 2
+        assert Resposta(CONTEUDO).dados['num_docs'] == 2
+    finally:
+        livros.remover_gancho(gancho)
+    assert 'Gancho do estágio analise falhou' in caplog.text
@@ -0,0 +1,179 @@
+import asyncio
+import socket
+import threading
+import time
+from unittest.mock import Mock, patch
+from urllib.error import HTTPError, URLError
+
+import pytest
+
+from colecao.tentativas import PoliticaDeTentativas, erro_transitorio
+
+
+def test_erro_transitorio():
+    assert erro_transitorio(HTTPError('https://buscarlivros', 502, 'Bad Gateway', {}, None))
+    assert not erro_transitorio(HTTPError('https://buscarlivros', 404, 'Not Found', {}, None))
+    assert erro_transitorio(URLError(ConnectionResetError()))
+    assert erro_transitorio(socket.timeout())
+    assert not erro_transitorio(ValueError())
+
+
+@patch('colecao.tentativas.time.sleep')
+def test_politica_repete_erros_transitorios_com_espera_exponencial(spy_sleep):
+    politica = PoliticaDeTentativas(tentativas=4, espera_base=0.5, espera_maxima=1.5)
+    requisitar = Mock(side_effect=[socket.timeout(), ConnectionResetError(), URLError('recusada'), 'pagina'])
+    with patch('colecao.tentativas.random.uniform', side_effect=lambda inicio, fim: fim):
+        assert politica.executar(requisitar) == 'pagina'
+    assert [chamada.args[0] for chamada in spy_sleep.call_args_list] == [0.5, 1.0, 1.5]
+    assert politica.estatisticas['repeticoes'] == 3
+
+
+@patch('colecao.tentativas.time.sleep')
+def test_politica_nao_repete_erro_permanente(spy_sleep):
+    politica = PoliticaDeTentativas()
+    requisitar = Mock(side_effect=HTTPError('https://buscarlivros', 404, 'Not Found', {}, None))
+    with pytest.raises(HTTPError):
+        politica.executar(requisitar)
+    assert requisitar.call_count == 1
+
+
+@patch('colecao.tentativas.time.sleep')
+def test_politica_desiste_apos_tentativas(spy_sleep):
+    politica = PoliticaDeTentativas(tentativas=2)
+    requisitar = Mock(side_effect=socket.timeout())
+    with pytest.raises(socket.timeout):
+        politica.executar(requisitar)
+    assert requisitar.call_count == 2
+
+
+def test_politica_com_hedge_usa_a_copia_quando_a_original_falha():
+    politica = PoliticaDeTentativas(hedge=True, amostras_minimas=5)
+    politica._latencias.extend([0.01] * 5)
+    copia_respondeu = threading.Event()
+    threads = []
+
+    def requisitar():
+        threads.append(threading.current_thread())
+        if len(threads) == 1:
+            copia_respondeu.wait(5)
+            raise socket.timeout()
+        copia_respondeu.set()
+        return 'copia'
+
+    assert politica.executar(requisitar) == 'copia'
+    assert politica.estatisticas['hedges'] == 1
+    assert politica.estatisticas['repeticoes'] == 0
+
+
+def test_politica_com_hedge_retorna_a_copia_mais_rapida_sem_esperar_a_original():
+    politica = PoliticaDeTentativas(hedge=True, amostras_minimas=5)
+    politica._latencias.extend([0.05] * 5)
+    liberar_original = threading.Event()
+    chamadas = []
+
+    def requisitar():
+        chamadas.append(1)
+        if len(chamadas) == 1:
+            liberar_original.wait(5)
+            return 'original'
+        return 'copia'
+
+    inicio = time.perf_counter()
+    try:
+        assert politica.executar(requisitar) == 'copia'
+        assert time.perf_counter() - inicio < 0.5
+    finally:
+        liberar_original.set()
+    assert politica.estatisticas['hedges'] == 1
+
+
+def test_politica_com_hedge_falha_so_quando_as_duas_falham():
+    politica = PoliticaDeTentativas(tentativas=1, hedge=True, amostras_minimas=5)
+    politica._latencias.extend([0.01] * 5)
+
+    def requisitar():
+        time.sleep(0.05)
+        raise socket.timeout('lenta')
+
+    with pytest.raises(socket.timeout):
+        politica.executar(requisitar)
+    assert politica.estatisticas['hedges'] == 1
+
+
+def test_politica_com_hedge_nao_limita_a_concorrencia_e_respeita_o_orcamento():
+    politica = PoliticaDeTentativas(hedge=True, amostras_minimas=5, orcamento_de_hedge=0.05)
+    politica._latencias.extend([0.001] * 5)
+    lock = threading.Lock()
+    em_andamento = [0]
+    maximo = [0]
+    chamadas = [0]
+    todos_comecaram = threading.Barrier(64)
+
+    def requisitar():
+        with lock:
+            chamadas[0] += 1
+            em_andamento[0] += 1
+            maximo[0] = max(maximo[0], em_andamento[0])
+        time.sleep(0.02)
+        with lock:
+            em_andamento[0] -= 1
+        return 'pagina'
+
+    def cliente():
+        todos_comecaram.wait(5)
+        for _ in range(4):
+            assert politica.executar(requisitar) == 'pagina'
+
+    clientes = [threading.Thread(target=cliente) for _ in range(64)]
+    for thread in clientes:
+        thread.start()
+    for thread in clientes:
+        thread.join(10)
+    assert maximo[0] >= 64
+    # a primeira cópia já cabe no orçamento
+    assert politica.estatisticas['hedges'] <= 0.05 * 256 + 1
+    assert chamadas[0] <= 256 + politica.estatisticas['hedges']
+
+
+def test_politica_sem_amostras_suficientes_nao_faz_hedge():
+    politica = PoliticaDeTentativas(hedge=True, amostras_minimas=5)
+    assert politica.executar(lambda: 'pagina') == 'pagina'
+    assert politica.estatisticas == {'repeticoes': 0, 'hedges': 0, 'latencia_limite': None}
+
+
+def test_politica_async_com_hedge_cancela_a_requisicao_lenta():
+    politica = PoliticaDeTentativas(hedge=True, amostras_minimas=5)
+    politica._latencias.extend([0.01] * 5)
+    canceladas = []
+
+    async def executar():
+        chamadas = []
+
+        async def requisitar():
+            chamadas.append(1)
+            if len(chamadas) == 1:
+                try:
+                    await asyncio.sleep(5)
+                except asyncio.CancelledError:
+                    canceladas.append(1)
+                    raise
+                return 'lenta'
+            return 'rapida'
+
+        return await politica.executar_async(requisitar)
+
+    assert asyncio.run(executar()) == 'rapida'
+    assert canceladas == [1]
+
+
+def test_politica_async_repete_erros_transitorios():
+    politica = PoliticaDeTentativas(espera_base=0)
+    respostas = [socket.timeout(), 'pagina']
+
+    async def requisitar():
+        resposta = respostas.pop(0)
+        if isinstance(resposta, Exception):
+            raise resposta
+        return resposta
+
+    assert asyncio.run(politica.executar_async(requisitar)) == 'pagina'